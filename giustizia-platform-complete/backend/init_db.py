@@ -16,6 +16,9 @@ from src.models.query_history import QueryHistory
 from src.models.credential import Credential
 from src.models.notification import Notification
 from src.models.system_config import SystemConfig
+from src.models.payload_blob import PayloadBlob
+from src.models.query_stats import StatsCounter, QueryStatsBucket, StatusCount
+from src.models.status import Status, StatusTransition
 
 def init_database():
     """Inicializa o banco de dados com as tabelas necessárias"""
@@ -52,7 +55,7 @@ def init_database():
             Client(
                 name='João Silva',
                 process_number='12345',
-                process_year='2024',
+                process_year=2024,
                 email='joao.silva@email.com',
                 phone='(11) 99999-1111',
                 current_status='Em Análise',
@@ -61,7 +64,7 @@ def init_database():
             Client(
                 name='Maria Santos',
                 process_number='67890',
-                process_year='2024',
+                process_year=2024,
                 email='maria.santos@email.com',
                 phone='(11) 99999-2222',
                 current_status='Pendente',
@@ -70,7 +73,7 @@ def init_database():
             Client(
                 name='Carlos Oliveira',
                 process_number='11111',
-                process_year='2024',
+                process_year=2024,
                 email='carlos.oliveira@email.com',
                 phone='(11) 99999-3333',
                 current_status='Deferido',
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Comandos de manutenção do banco de dados da plataforma Giustizia Civile
+"""
+
+import argparse
+import os
+import sys
+
+# Adiciona o diretório src ao path
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'src')
+sys.path.insert(0, SRC_DIR)
+
+from models.database import Database
+from services.retention import HistoryRetentionJob
+from services.analytics_export import AnalyticsExportJob
+
+DEFAULT_DB_PATH = os.environ.get('DATABASE_PATH', os.path.join(SRC_DIR, 'giustizia.db'))
+
+def rebuild_stats(db, args):
+    """Reconstrói os agregados do dashboard a partir das tabelas base"""
+    print("Reconstruindo agregados...")
+    if not db.rebuild_aggregates():
+        print("Erro ao reconstruir agregados")
+        return 1
+    print("Agregados reconstruídos com sucesso!")
+    return 0
+
+def compact_payloads(db, args):
+    """Move os payloads em texto para a tabela de blobs comprimidos"""
+    size_before = os.path.getsize(db.db_path)
+    print("Migrando payloads brutos...")
+    result = db.migrate_raw_payloads(args.batch_size)
+    print(f"- Linhas migradas: {result['migrated_rows']}")
+    
+    print("Executando VACUUM...")
+    db.vacuum()
+    size_after = os.path.getsize(db.db_path)
+    print(f"- Tamanho antes: {size_before / 1024 / 1024:.1f} MB")
+    print(f"- Tamanho depois: {size_after / 1024 / 1024:.1f} MB")
+    print(f"- Espaço recuperado: {(size_before - size_after) / 1024 / 1024:.1f} MB")
+    return 0
+
+def apply_retention(db, args):
+    """Aplica a política de retenção e arquiva o histórico antigo"""
+    job = HistoryRetentionJob.from_settings(db)
+    if args.days is not None:
+        job.retention_days = args.days
+    job.batch_size = args.batch_size
+    
+    print(f"Aplicando retenção de {job.retention_days} dias (arquivo em {job.archive_dir})...")
+    result = job.run(vacuum=args.vacuum)
+    print(f"- Linhas arquivadas: {result['archived_rows']}")
+    print(f"- Bytes gravados no arquivo: {result['archive_bytes']}")
+    print(f"- Snapshots de payload removidos: {result['pruned_snapshots']}")
+    print(f"- Blobs de payload removidos: {result['pruned_blobs']}")
+    print(f"- Bytes recuperados: {result['bytes_reclaimed']}")
+    print(f"- Entradas removidas do log de mudanças: {result['pruned_changes']}")
+    return 0
+
+def rebuild_process_index(db, args):
+    """Reconstrói estado, documentos, audiências e partes dos processos a partir dos snapshots"""
+    print("Reconstruindo índice dos processos...")
+    processes = db.rebuild_process_index()
+    print(f"- Processos indexados: {processes}")
+    return 0
+
+def dedup_clients(db, args):
+    """Une clientes cadastrados mais de uma vez para o mesmo processo"""
+    print("Unindo clientes duplicados...")
+    result = db.merge_duplicate_clients()
+    print(f"- Processos com duplicatas: {result['duplicate_groups']}")
+    print(f"- Clientes removidos: {result['merged_clients']}")
+    return 0
+
+def export_analytics(db, args):
+    """Exporta histórico, transições e agregados para Parquet a partir da marca d'água"""
+    job = AnalyticsExportJob.from_settings(db)
+    if args.output:
+        job.export_dir = os.path.abspath(args.output)
+    job.batch_size = args.batch_size
+    
+    print(f"Exportando para {job.export_dir}...")
+    result = job.run()
+    for table, rows in result['exported_rows'].items():
+        print(f"- {table}: {rows} linhas")
+    return 0
+
+def main():
+    parser = argparse.ArgumentParser(description='Manutenção do banco de dados')
+    parser.add_argument('--db', default=DEFAULT_DB_PATH, help='Caminho do arquivo SQLite')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    
+    rebuild_parser = subparsers.add_parser('rebuild-stats', help='Reconstrói os agregados do dashboard')
+    rebuild_parser.set_defaults(func=rebuild_stats)
+    
+    compact_parser = subparsers.add_parser('compact-payloads', help='Comprime e deduplica os payloads brutos')
+    compact_parser.add_argument('--batch-size', type=int, default=500)
+    compact_parser.set_defaults(func=compact_payloads)
+    
+    retention_parser = subparsers.add_parser('retention', help='Compacta e arquiva o histórico antigo')
+    retention_parser.add_argument('--days', type=int, help='Dias mantidos completos (padrão: configuração)')
+    retention_parser.add_argument('--batch-size', type=int, default=500)
+    retention_parser.add_argument('--vacuum', action='store_true', help='Executa VACUUM ao final')
+    retention_parser.set_defaults(func=apply_retention)
+    
+    process_parser = subparsers.add_parser(
+        'rebuild-process-index', help='Reconstrói estado, documentos, audiências e partes dos processos'
+    )
+    process_parser.set_defaults(func=rebuild_process_index)
+    
+    dedup_parser = subparsers.add_parser('dedup-clients', help='Une clientes duplicados pelo número do processo')
+    dedup_parser.set_defaults(func=dedup_clients)
+    
+    export_parser = subparsers.add_parser('export-analytics', help='Exporta dados analíticos para Parquet')
+    export_parser.add_argument('--output', help='Diretório de saída (padrão: configuração)')
+    export_parser.add_argument('--batch-size', type=int, default=50000)
+    export_parser.set_defaults(func=export_analytics)
+    
+    args = parser.parse_args()
+    db = Database(args.db)
+    return args.func(db, args)
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,13 +1,25 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, make_response, Response, stream_with_context
 from flask_cors import CORS
 import os
+import json
+import hashlib
 import logging
-from datetime import datetime
+import time
+from datetime import datetime, timedelta
+from functools import wraps
 
 # Importar serviços e modelos
 from models.database import Database
 from services.giustizia_api import GiustiziaAPI
 from services.scheduler import QueryScheduler
+from services.status_analytics import time_in_status
+from services.analytics_export import AnalyticsExportJob, read_export
+from services.events import event_bus, format_sse
+from services.jobs import job_manager
+from services.idempotency import idempotency_store
+from services.offload import run_blocking, iterate_blocking
+from services.response_cache import response_cache
+from services.table_export import csv_chunks, xlsx_chunks
 
 # Configurar logging
 logging.basicConfig(level=logging.INFO)
@@ -31,6 +43,102 @@ scheduler = QueryScheduler(db)
 # Iniciar scheduler
 scheduler.start()
 
+# Paginação por cursor
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+def wants_page():
+    """Paginação por cursor é usada quando page_size ou cursor são informados"""
+    return 'page_size' in request.args or 'cursor' in request.args
+
+def page_args():
+    """Extrai tamanho da página, cursor e se o total deve ser incluído"""
+    page_size = request.args.get('page_size', DEFAULT_PAGE_SIZE, type=int)
+    return {
+        'limit': min(max(page_size, 1), MAX_PAGE_SIZE),
+        'cursor': request.args.get('cursor') or None,
+        'include_total': request.args.get('include_total', 'false').lower() == 'true'
+    }
+
+# Operações em lote
+def bulk_selection(data: dict) -> dict:
+    """Extrai a seleção de uma operação em lote: ids, filtros e all"""
+    ids = data.get('ids')
+    if ids is not None and not isinstance(ids, list):
+        raise ValueError("'ids' deve ser uma lista")
+    filters = data.get('filters') or {}
+    if not isinstance(filters, dict):
+        raise ValueError("'filters' deve ser um objeto")
+    return {'ids': ids, 'filters': filters, 'select_all': data.get('all') is True}
+
+# GET condicional (ETag / Last-Modified) e cache de respostas
+
+def conditional_get(*tables, daily: bool = False):
+    """
+    Responde 304 quando as tabelas da rota não mudaram desde a versão do cliente
+    
+    O ETag vem dos contadores de versão das tabelas (mais a URL), então a rota
+    só é executada quando há algo novo. As versões são lidas antes da consulta:
+    uma escrita concorrente gera no máximo um 200 extra, nunca um 304 indevido.
+    
+    As respostas 200 ficam no cache em memória sob o mesmo ETag: enquanto as
+    tabelas não mudam, outros clientes recebem o corpo pronto sem tocar no banco.
+    
+    Args:
+        tables: Tabelas das quais a resposta depende
+        daily: A resposta também muda com a data (ex.: consultas de hoje)
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            versions = db.get_table_versions(tables)
+            if not versions:
+                return view(*args, **kwargs)
+            
+            parts = [request.full_path] + [
+                f"{name}:{version['version']}:{version['updated_at']}"
+                for name, version in sorted(versions.items())
+            ]
+            last_modified = max(
+                datetime.strptime(version['updated_at'], '%Y-%m-%d %H:%M:%S') for version in versions.values()
+            )
+            if daily:
+                today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+                parts.append(today.strftime('%Y-%m-%d'))
+                last_modified = max(last_modified, today)
+            etag = hashlib.sha1('|'.join(parts).encode('utf-8')).hexdigest()
+            
+            # Com If-None-Match o ETag decide e If-Modified-Since é ignorado (RFC 9110 §13.1.3).
+            # Sem ele, a data tem resolução de 1s: uma escrita no mesmo segundo da
+            # resposta anterior não muda Last-Modified, então só datas estritamente
+            # posteriores à última escrita recebem 304
+            if request.if_none_match:
+                not_modified = request.if_none_match.contains(etag)
+            else:
+                since = request.if_modified_since
+                not_modified = since is not None and last_modified < since.replace(tzinfo=None)
+            
+            if not_modified:
+                response = make_response('', 304)
+            else:
+                cached = response_cache.get(request.full_path, etag)
+                if cached:
+                    response = make_response(cached[0])
+                    response.mimetype = cached[1]
+                    response.headers['X-Cache'] = 'HIT'
+                else:
+                    response = make_response(view(*args, **kwargs))
+                    if response.status_code != 200:
+                        return response
+                    response_cache.put(request.full_path, etag, response.get_data(), response.mimetype)
+                    response.headers['X-Cache'] = 'MISS'
+            response.set_etag(etag)
+            response.last_modified = last_modified
+            response.headers['Cache-Control'] = 'no-cache'
+            return response
+        return wrapper
+    return decorator
+
 # ROTAS DE HEALTH CHECK
 
 @app.route('/api/health', methods=['GET'])
@@ -42,19 +150,112 @@ def health_check():
         'version': '1.0.0'
     })
 
+# Idempotency-Key em POSTs
+
+def request_fingerprint() -> str:
+    """Hash do conteúdo da requisição (corpo, ou campos e arquivos de um formulário)"""
+    digest = hashlib.sha256(f'{request.method} {request.path}'.encode('utf-8'))
+    if request.mimetype == 'multipart/form-data':
+        for name, value in sorted(request.form.items(multi=True)):
+            digest.update(f'{name}={value}'.encode('utf-8'))
+        for name, upload in sorted(request.files.items(multi=True), key=lambda item: item[0]):
+            digest.update(f'{name}:{upload.filename}'.encode('utf-8'))
+            digest.update(upload.stream.read())
+            upload.stream.seek(0)
+    else:
+        digest.update(request.get_data(cache=True))
+    return digest.hexdigest()
+
+def idempotent(view):
+    """
+    Aceita o cabeçalho Idempotency-Key
+    
+    A primeira requisição com a chave executa normalmente e sua resposta é
+    guardada; repetições com o mesmo corpo recebem a mesma resposta (com
+    Idempotent-Replayed: true) sem executar de novo. Erros 5xx não são
+    guardados, para que a repetição tente outra vez.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        key = request.headers.get('Idempotency-Key')
+        if not key:
+            return view(*args, **kwargs)
+        if len(key) > 255:
+            return jsonify({'error': 'Idempotency-Key muito longa (máximo 255 caracteres)'}), 400
+        
+        scoped_key = f'{request.method} {request.path} {key}'
+        state, stored = idempotency_store.begin(scoped_key, request_fingerprint())
+        if state == 'mismatch':
+            return jsonify({'error': 'Idempotency-Key já usada com outro conteúdo'}), 422
+        if state == 'in_progress':
+            return jsonify({'error': 'Requisição com esta Idempotency-Key ainda em andamento'}), 409
+        if state == 'replay':
+            response = make_response(stored['body'], stored['status'])
+            for name, value in stored['headers']:
+                response.headers[name] = value
+            response.headers['Idempotent-Replayed'] = 'true'
+            return response
+        
+        try:
+            response = make_response(view(*args, **kwargs))
+        except Exception:
+            idempotency_store.abandon(scoped_key)
+            raise
+        if response.status_code >= 500:
+            idempotency_store.abandon(scoped_key)
+        else:
+            idempotency_store.complete(scoped_key, {
+                'status': response.status_code,
+                'body': response.get_data(),
+                'headers': [(name, value) for name, value in response.headers.items()
+                            if name in ('Content-Type', 'Location')]
+            })
+        return response
+    return wrapper
+
 # ROTAS DE CLIENTES
 
 @app.route('/api/clients', methods=['GET'])
+@conditional_get('clients', 'statuses')
 def get_clients():
-    """Retorna todos os clientes"""
+    """Retorna os clientes (lista completa ou página por cursor)"""
     try:
-        clients = db.get_all_clients()
+        status = request.args.get('status') or None
+        if wants_page():
+            return jsonify(db.get_clients_page(status=status, **page_args()))
+        
+        clients = db.get_all_clients(status)
         return jsonify(clients)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logger.error(f"Erro ao buscar clientes: {str(e)}")
+        return jsonify({'error': 'Erro interno do servidor'}), 500
+
+@app.route('/api/statuses', methods=['GET'])
+@conditional_get('clients', 'statuses')
+def get_statuses():
+    """Retorna os status conhecidos com o número de clientes em cada um"""
+    try:
+        return jsonify(db.get_statuses())
+    except Exception as e:
+        logger.error(f"Erro ao buscar status: {str(e)}")
+        return jsonify({'error': 'Erro interno do servidor'}), 500
+
+@app.route('/api/clients/search', methods=['GET'])
+def search_clients():
+    """Busca clientes por nome, processo, e-mail, documento ou observações"""
+    try:
+        term = request.args.get('q', '')
+        limit = min(max(request.args.get('limit', 20, type=int), 1), MAX_PAGE_SIZE)
+        
+        return jsonify(db.search_clients(term, limit))
     except Exception as e:
         logger.error(f"Erro ao buscar clientes: {str(e)}")
         return jsonify({'error': 'Erro interno do servidor'}), 500
 
 @app.route('/api/clients', methods=['POST'])
+@idempotent
 def create_client():
     """Cria um novo cliente"""
     try:
@@ -75,6 +276,18 @@ def create_client():
         logger.error(f"Erro ao criar cliente: {str(e)}")
         return jsonify({'error': 'Erro interno do servidor'}), 500
 
+@app.route('/api/clients/<int:client_id>', methods=['GET'])
+def get_client(client_id):
+    """Retorna um cliente com o resumo de consultas e notificações"""
+    try:
+        client = db.get_client(client_id)
+        if not client:
+            return jsonify({'error': 'Cliente não encontrado'}), 404
+        return jsonify(client)
+    except Exception as e:
+        logger.error(f"Erro ao buscar cliente: {str(e)}")
+        return jsonify({'error': 'Erro interno do servidor'}), 500
+
 @app.route('/api/clients/<int:client_id>', methods=['PUT'])
 def update_client(client_id):
     """Atualiza um cliente"""
@@ -86,6 +299,8 @@ def update_client(client_id):
         else:
             return jsonify({'error': 'Cliente não encontrado'}), 404
             
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         logger.error(f"Erro ao atualizar cliente: {str(e)}")
         return jsonify({'error': 'Erro interno do servidor'}), 500
@@ -103,7 +318,38 @@ def delete_client(client_id):
         logger.error(f"Erro ao excluir cliente: {str(e)}")
         return jsonify({'error': 'Erro interno do servidor'}), 500
 
+@app.route('/api/clients/bulk', methods=['POST'])
+def bulk_clients():
+    """
+    Operação em lote sobre clientes, em uma única transação
+    
+    Corpo: {"action": "delete", "ids": [...]} ou {"action": "delete",
+    "filters": {"status": ..., "process_year": ...}}; sem ids nem filtros é
+    preciso "all": true. Ações: delete, deactivate, reactivate e
+    set_priority (com "priority": n).
+    """
+    try:
+        data = request.get_json() or {}
+        action = data.get('action')
+        selection = bulk_selection(data)
+        if action == 'delete':
+            affected = db.delete_clients(**selection)
+        elif action in ('deactivate', 'reactivate'):
+            affected = db.set_clients_active(action == 'reactivate', **selection)
+        elif action == 'set_priority':
+            affected = db.set_clients_priority(data.get('priority'), **selection)
+        else:
+            return jsonify({'error': "Ação inválida (use 'delete', 'deactivate', 'reactivate' ou 'set_priority')"}), 400
+        
+        return jsonify({'action': action, 'affected': affected})
+    except (ValueError, TypeError) as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logger.error(f"Erro na operação em lote de clientes: {str(e)}")
+        return jsonify({'error': 'Erro interno do servidor'}), 500
+
 @app.route('/api/clients/bulk-import', methods=['POST'])
+@idempotent
 def bulk_import_clients():
     """Importa clientes em lote via CSV/Excel"""
     try:
@@ -114,58 +360,9 @@ def bulk_import_clients():
         if file.filename == '':
             return jsonify({'error': 'Nenhum arquivo selecionado'}), 400
         
-        # Processar arquivo
-        import pandas as pd
-        import io
-        
-        # Ler arquivo
-        if file.filename.endswith('.csv'):
-            df = pd.read_csv(io.StringIO(file.read().decode('utf-8')))
-        else:
-            df = pd.read_excel(file)
-        
-        # Mapear colunas
-        column_mapping = {
-            'nome': 'name',
-            'name': 'name',
-            'processo': 'process_number',
-            'process_number': 'process_number',
-            'numero_processo': 'process_number',
-            'ano': 'process_year',
-            'process_year': 'process_year',
-            'email': 'email',
-            'telefone': 'phone',
-            'phone': 'phone',
-            'documento': 'document',
-            'document': 'document',
-            'observacoes': 'notes',
-            'notes': 'notes',
-            'observações': 'notes'
-        }
-        
-        # Renomear colunas
-        df.columns = df.columns.str.lower()
-        df = df.rename(columns=column_mapping)
-        
-        # Converter para lista de dicionários
-        clients_data = []
-        for _, row in df.iterrows():
-            client_data = {
-                'name': str(row.get('name', '')).strip(),
-                'process_number': str(row.get('process_number', '')).strip(),
-                'process_year': int(row.get('process_year', 0)) if pd.notna(row.get('process_year')) else 0,
-                'email': str(row.get('email', '')).strip() if pd.notna(row.get('email')) else None,
-                'phone': str(row.get('phone', '')).strip() if pd.notna(row.get('phone')) else None,
-                'document': str(row.get('document', '')).strip() if pd.notna(row.get('document')) else None,
-                'notes': str(row.get('notes', '')).strip() if pd.notna(row.get('notes')) else None
-            }
-            
-            # Validar dados obrigatórios
-            if client_data['name'] and client_data['process_number'] and client_data['process_year']:
-                clients_data.append(client_data)
-        
-        # Importar clientes
-        result = db.bulk_import_clients(clients_data)
+        # Leitura com pandas e gravação linha a linha fora do loop do servidor
+        clients_data = run_blocking(parse_import_file, file.filename, file.read())
+        result = run_blocking(db.bulk_import_clients, clients_data)
         
         return jsonify({
             'message': f'Importação concluída: {result["success"]} sucessos, {result["errors"]} erros',
@@ -178,6 +375,59 @@ def bulk_import_clients():
         logger.error(f"Erro na importação em lote: {str(e)}")
         return jsonify({'error': f'Erro na importação: {str(e)}'}), 500
 
+def parse_import_file(filename: str, content: bytes) -> list:
+    """Lê o CSV/Excel da importação e retorna os clientes com os campos obrigatórios"""
+    import pandas as pd
+    import io
+    
+    # Ler arquivo
+    if filename.endswith('.csv'):
+        df = pd.read_csv(io.StringIO(content.decode('utf-8')))
+    else:
+        df = pd.read_excel(io.BytesIO(content))
+    
+    # Mapear colunas
+    column_mapping = {
+        'nome': 'name',
+        'name': 'name',
+        'processo': 'process_number',
+        'process_number': 'process_number',
+        'numero_processo': 'process_number',
+        'ano': 'process_year',
+        'process_year': 'process_year',
+        'email': 'email',
+        'telefone': 'phone',
+        'phone': 'phone',
+        'documento': 'document',
+        'document': 'document',
+        'observacoes': 'notes',
+        'notes': 'notes',
+        'observações': 'notes'
+    }
+    
+    # Renomear colunas
+    df.columns = df.columns.str.lower()
+    df = df.rename(columns=column_mapping)
+    
+    # Converter para lista de dicionários
+    clients_data = []
+    for _, row in df.iterrows():
+        client_data = {
+            'name': str(row.get('name', '')).strip(),
+            'process_number': str(row.get('process_number', '')).strip(),
+            'process_year': int(row.get('process_year', 0)) if pd.notna(row.get('process_year')) else 0,
+            'email': str(row.get('email', '')).strip() if pd.notna(row.get('email')) else None,
+            'phone': str(row.get('phone', '')).strip() if pd.notna(row.get('phone')) else None,
+            'document': str(row.get('document', '')).strip() if pd.notna(row.get('document')) else None,
+            'notes': str(row.get('notes', '')).strip() if pd.notna(row.get('notes')) else None
+        }
+        
+        # Validar dados obrigatórios
+        if client_data['name'] and client_data['process_number'] and client_data['process_year']:
+            clients_data.append(client_data)
+    
+    return clients_data
+
 # ROTAS DE CREDENCIAIS
 
 @app.route('/api/credentials', methods=['GET'])
@@ -194,7 +444,18 @@ def get_credentials():
         logger.error(f"Erro ao buscar credenciais: {str(e)}")
         return jsonify({'error': 'Erro interno do servidor'}), 500
 
+@app.route('/api/credentials/stats', methods=['GET'])
+@conditional_get('credentials', 'query_history')
+def get_credentials_stats():
+    """Retorna os totais do pool de credenciais"""
+    try:
+        return jsonify(db.get_credential_stats())
+    except Exception as e:
+        logger.error(f"Erro ao buscar estatísticas das credenciais: {str(e)}")
+        return jsonify({'error': 'Erro interno do servidor'}), 500
+
 @app.route('/api/credentials', methods=['POST'])
+@idempotent
 def create_credential():
     """Cria uma nova credencial"""
     try:
@@ -270,11 +531,17 @@ def test_credential(credential_id):
 # ROTAS DE NOTIFICAÇÕES
 
 @app.route('/api/notifications', methods=['GET'])
+@conditional_get('notifications')
 def get_notifications():
-    """Retorna todas as notificações"""
+    """Retorna as notificações (lista completa ou página por cursor)"""
     try:
+        if wants_page():
+            return jsonify(db.get_notifications_page(**page_args()))
+        
         notifications = db.get_all_notifications()
         return jsonify(notifications)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         logger.error(f"Erro ao buscar notificações: {str(e)}")
         return jsonify({'error': 'Erro interno do servidor'}), 500
@@ -284,6 +551,7 @@ def mark_notification_read(notification_id):
     """Marca notificação como lida"""
     try:
         if db.mark_notification_read(notification_id):
+            publish_unread_count()
             return jsonify({'message': 'Notificação marcada como lida'})
         else:
             return jsonify({'error': 'Notificação não encontrada'}), 404
@@ -296,6 +564,7 @@ def delete_notification(notification_id):
     """Exclui uma notificação"""
     try:
         if db.delete_notification(notification_id):
+            publish_unread_count()
             return jsonify({'message': 'Notificação excluída'})
         else:
             return jsonify({'error': 'Notificação não encontrada'}), 404
@@ -308,14 +577,94 @@ def clear_notifications():
     """Limpa todas as notificações"""
     try:
         db.clear_all_notifications()
+        publish_unread_count()
         return jsonify({'message': 'Todas as notificações foram removidas'})
     except Exception as e:
         logger.error(f"Erro ao limpar notificações: {str(e)}")
         return jsonify({'error': 'Erro interno do servidor'}), 500
 
+@app.route('/api/notifications/bulk', methods=['POST'])
+def bulk_notifications():
+    """
+    Operação em lote sobre notificações, em uma única transação
+    
+    Corpo: {"action": "mark_read" | "delete", "ids": [...], "filters":
+    {"client_id", "type", "read", "before"}}; sem ids nem filtros é preciso
+    "all": true.
+    """
+    try:
+        data = request.get_json() or {}
+        action = data.get('action')
+        operations = {
+            'mark_read': db.mark_notifications_read,
+            'delete': db.delete_notifications
+        }
+        if action not in operations:
+            return jsonify({'error': "Ação inválida (use 'mark_read' ou 'delete')"}), 400
+        
+        affected = operations[action](**bulk_selection(data))
+        if affected:
+            publish_unread_count()
+        return jsonify({'action': action, 'affected': affected})
+    except (ValueError, TypeError) as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logger.error(f"Erro na operação em lote de notificações: {str(e)}")
+        return jsonify({'error': 'Erro interno do servidor'}), 500
+
+# EVENTOS (SERVER-SENT EVENTS)
+
+# Intervalo do keep-alive e duração máxima de uma conexão (o navegador reconecta sozinho)
+SSE_KEEPALIVE_SECONDS = 15
+SSE_MAX_CONNECTION_SECONDS = 300
+
+def publish_unread_count():
+    """Publica o total atual de notificações não lidas"""
+    event_bus.publish('unread_count', {'unread': db.get_unread_count()})
+
+@app.route('/api/events', methods=['GET'])
+def stream_events():
+    """
+    Stream SSE de notificações, não lidas e progresso das execuções
+    
+    Com Last-Event-ID (cabeçalho ou ?last_event_id=) os eventos perdidos são
+    reenviados do buffer; se já não estiverem lá, um evento 'reset' avisa o
+    cliente para recarregar as listas. Sem id, o stream começa no momento atual.
+    
+    No worker gevent a espera em event_bus.wait é cooperativa: um assinante
+    ocioso é uma greenlet parada, não uma thread do servidor.
+    """
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    
+    def generate():
+        cursor = last_event_id or event_bus.last_event_id
+        replay, reset = event_bus.events_after(cursor)
+        yield f'retry: 2000\n\n'
+        if reset:
+            cursor = event_bus.last_event_id
+            yield format_sse({'id': cursor, 'type': 'reset', 'data': {'unread': db.get_unread_count()}})
+        for event in replay:
+            cursor = event['id']
+            yield format_sse(event)
+        
+        deadline = time.monotonic() + SSE_MAX_CONNECTION_SECONDS
+        while time.monotonic() < deadline:
+            events = event_bus.wait(cursor, SSE_KEEPALIVE_SECONDS)
+            if not events:
+                yield ': keep-alive\n\n'
+            for event in events:
+                cursor = event['id']
+                yield format_sse(event)
+    
+    return Response(stream_with_context(generate()), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
 # ROTAS DE CONFIGURAÇÕES
 
 @app.route('/api/settings', methods=['GET'])
+@conditional_get('settings')
 def get_settings():
     """Retorna configurações do sistema"""
     try:
@@ -331,10 +680,20 @@ def update_settings():
     try:
         data = request.get_json()
         
+        if 'notification_flush_seconds' in data:
+            try:
+                delay = float(data['notification_flush_seconds'])
+            except (TypeError, ValueError):
+                delay = -1
+            if not 0 <= delay <= 60:
+                return jsonify({'error': 'notification_flush_seconds deve estar entre 0 e 60'}), 400
+        
         if db.update_settings(data):
             # Atualizar agendamento se necessário
             if 'query_time' in data:
                 scheduler.update_schedule(data['query_time'])
+            if 'notification_flush_seconds' in data:
+                scheduler.set_notification_delay(data['notification_flush_seconds'])
             
             return jsonify({'message': 'Configurações atualizadas com sucesso'})
         else:
@@ -346,41 +705,345 @@ def update_settings():
 
 # ROTAS DE CONSULTAS
 
+def job_response(job, status: int, **extra):
+    """Resposta com o estado do job e os links para acompanhá-lo"""
+    response = jsonify(dict(job.to_dict(), links={
+        'status': f'/api/jobs/{job.id}',
+        'results': f'/api/jobs/{job.id}/results',
+        'cancel': f'/api/jobs/{job.id}/cancel'
+    }, **extra))
+    response.headers['Location'] = f'/api/jobs/{job.id}'
+    return response, status
+
+def enqueue_query_job(kind: str, client_ids):
+    """
+    Enfileira uma consulta manual como job e responde 202 com o id
+    
+    Se um job na fila ou em execução já cobre todos os clientes pedidos, a
+    requisição é incorporada a ele (200 com merged=true). Sobreposições
+    parciais, inclusive com a consulta diária, são resolvidas na execução:
+    processos já consultados por outra execução não são repetidos.
+    """
+    if client_ids is not None and (
+        not isinstance(client_ids, list) or not all(isinstance(client_id, int) for client_id in client_ids)
+    ):
+        return jsonify({'error': 'client_ids deve ser uma lista de IDs'}), 400
+    if not db.get_active_credentials():
+        return jsonify({'success': False, 'message': 'Nenhuma credencial ativa encontrada'}), 400
+    
+    existing = job_manager.find_covering(client_ids)
+    if existing:
+        return job_response(existing, 200, merged=True)
+    
+    job = job_manager.submit(
+        kind,
+        {'client_ids': client_ids},
+        lambda job: scheduler.run_manual_query(client_ids, job=job)
+    )
+    return job_response(job, 202, merged=False)
+
 @app.route('/api/manual-query', methods=['POST'])
+@idempotent
 def manual_query():
-    """Executa consulta manual"""
+    """Enfileira consulta manual (todos os clientes ou client_ids)"""
     try:
         data = request.get_json() or {}
         client_ids = data.get('client_ids')  # Lista de IDs ou None para todos
         
-        result = scheduler.run_manual_query(client_ids)
-        
-        if result['success']:
-            return jsonify(result)
-        else:
-            return jsonify(result), 400
+        return enqueue_query_job('manual', client_ids or None)
             
     except Exception as e:
         logger.error(f"Erro na consulta manual: {str(e)}")
         return jsonify({'error': 'Erro interno do servidor'}), 500
 
+@app.route('/api/clients/bulk-query', methods=['POST'])
+@idempotent
+def bulk_query_clients():
+    """Enfileira consulta de uma lista de clientes, sem limite de tamanho"""
+    try:
+        data = request.get_json() or {}
+        client_ids = data.get('client_ids')
+        
+        if not client_ids:
+            return jsonify({'error': 'Lista de IDs de clientes é obrigatória'}), 400
+        
+        return enqueue_query_job('bulk', client_ids)
+        
+    except Exception as e:
+        logger.error(f"Erro na consulta em lote: {str(e)}")
+        return jsonify({'error': 'Erro interno do servidor'}), 500
+
+# ROTAS DE JOBS
+
+@app.route('/api/jobs', methods=['GET'])
+def get_jobs():
+    """Lista os jobs recentes (mais novos primeiro)"""
+    return jsonify(job_manager.list())
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """Progresso do job: done/total, contadores e ETA"""
+    job = job_manager.get(job_id)
+    if not job:
+        return jsonify({'error': 'Job não encontrado'}), 404
+    return jsonify(job.to_dict())
+
+@app.route('/api/jobs/<job_id>/results', methods=['GET'])
+def get_job_results(job_id):
+    """
+    Resultados por item em NDJSON (uma linha JSON por consulta)
+    
+    ?offset= pula os itens já lidos. Com follow=true (padrão) a resposta
+    acompanha o job até ele terminar; a última linha traz o resumo do job.
+    """
+    job = job_manager.get(job_id)
+    if not job:
+        return jsonify({'error': 'Job não encontrado'}), 404
+    offset = max(request.args.get('offset', 0, type=int), 0)
+    follow = request.args.get('follow', 'true').lower() == 'true'
+    
+    def generate():
+        position = offset
+        while True:
+            items, finished = job.results_after(position, SSE_KEEPALIVE_SECONDS if follow else 0)
+            for item in items:
+                yield json.dumps(dict(item, index=position), default=str) + '\n'
+                position += 1
+            if finished or not follow:
+                yield json.dumps({'job': job.to_dict()}, default=str) + '\n'
+                return
+    
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+@app.route('/api/jobs/<job_id>/cancel', methods=['POST'])
+def cancel_job(job_id):
+    """Cancela o job; a consulta em andamento termina antes de parar"""
+    job = job_manager.get(job_id)
+    if not job:
+        return jsonify({'error': 'Job não encontrado'}), 404
+    if job.finished:
+        return jsonify({'error': 'Job já terminou', 'job': job.to_dict()}), 409
+    job.cancel()
+    return jsonify(job.to_dict()), 202
+
 @app.route('/api/query-history', methods=['GET'])
 def get_query_history():
     """Retorna histórico de consultas"""
     try:
         client_id = request.args.get('client_id', type=int)
+        include_raw = request.args.get('include_raw', 'true').lower() == 'true'
+        
+        if wants_page():
+            return jsonify(db.get_query_history_page(client_id, include_raw=include_raw, **page_args()))
+        
         limit = request.args.get('limit', 100, type=int)
         
-        history = db.get_query_history(client_id, limit)
+        history = db.get_query_history(client_id, limit, include_raw)
         return jsonify(history)
         
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         logger.error(f"Erro ao buscar histórico: {str(e)}")
         return jsonify({'error': 'Erro interno do servidor'}), 500
 
+@app.route('/api/payloads/<payload_hash>', methods=['GET'])
+def get_payload(payload_hash):
+    """Retorna o payload bruto de uma consulta pelo hash"""
+    try:
+        payload = db.get_payload(payload_hash)
+        if payload is None:
+            return jsonify({'error': 'Payload não encontrado'}), 404
+        return jsonify(payload)
+        
+    except Exception as e:
+        logger.error(f"Erro ao buscar payload: {str(e)}")
+        return jsonify({'error': 'Erro interno do servidor'}), 500
+
+@app.route('/api/processes/<process_number>/<int:process_year>/payload', methods=['GET'])
+def get_process_payload(process_number, process_year):
+    """Retorna o payload do processo como estava em uma data (padrão: agora)"""
+    try:
+        as_of = request.args.get('as_of') or datetime.utcnow().isoformat()
+        
+        snapshot = db.get_payload_as_of(process_number, process_year, as_of)
+        if not snapshot:
+            return jsonify({'error': 'Nenhum snapshot encontrado para a data informada'}), 404
+        return jsonify(snapshot)
+        
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logger.error(f"Erro ao buscar snapshot do processo: {str(e)}")
+        return jsonify({'error': 'Erro interno do servidor'}), 500
+
+@app.route('/api/processes/<process_number>/<int:process_year>', methods=['GET'])
+def get_process_state(process_number, process_year):
+    """Retorna o estado atual do processo, com documentos e audiências"""
+    try:
+        state = db.get_process_state(process_number, process_year)
+        if not state:
+            return jsonify({'error': 'Processo ainda não consultado'}), 404
+        return jsonify(state)
+    
+    except Exception as e:
+        logger.error(f"Erro ao buscar estado do processo: {str(e)}")
+        return jsonify({'error': 'Erro interno do servidor'}), 500
+
+@app.route('/api/documents/recent', methods=['GET'])
+def get_recent_documents():
+    """Retorna os documentos que apareceram nos processos desde uma data (padrão: hoje)"""
+    try:
+        since = request.args.get('since') or datetime.utcnow().strftime('%Y-%m-%d')
+        limit = min(max(request.args.get('limit', 100, type=int), 1), MAX_PAGE_SIZE)
+        
+        return jsonify(db.get_recent_documents(since, limit))
+    
+    except Exception as e:
+        logger.error(f"Erro ao buscar documentos recentes: {str(e)}")
+        return jsonify({'error': 'Erro interno do servidor'}), 500
+
+@app.route('/api/hearings', methods=['GET'])
+def get_hearings_calendar():
+    """Retorna as audiências de um período agrupadas por dia (padrão: próximos 30 dias)"""
+    try:
+        start = request.args.get('from') or datetime.utcnow().strftime('%Y-%m-%d')
+        end = request.args.get('to')
+        if not end:
+            end = (datetime.strptime(start, '%Y-%m-%d') + timedelta(days=30)).strftime('%Y-%m-%d')
+        args = page_args()
+        
+        return jsonify(db.get_hearings_calendar(start, end, args['limit'], args['cursor']))
+    
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logger.error(f"Erro ao buscar calendário de audiências: {str(e)}")
+        return jsonify({'error': 'Erro interno do servidor'}), 500
+
+@app.route('/api/parties/search', methods=['GET'])
+def search_parties():
+    """Busca os processos que envolvem uma parte pelo nome"""
+    try:
+        name = request.args.get('q', '')
+        limit = min(max(request.args.get('limit', 50, type=int), 1), MAX_PAGE_SIZE)
+        
+        return jsonify(db.search_parties(name, limit))
+    except Exception as e:
+        logger.error(f"Erro ao buscar partes: {str(e)}")
+        return jsonify({'error': 'Erro interno do servidor'}), 500
+
+@app.route('/api/clients/<int:client_id>/status-timeline', methods=['GET'])
+def get_status_timeline(client_id):
+    """Retorna as mudanças de status de um cliente em ordem cronológica"""
+    try:
+        return jsonify(db.get_status_transitions(client_id))
+    except Exception as e:
+        logger.error(f"Erro ao buscar transições de status: {str(e)}")
+        return jsonify({'error': 'Erro interno do servidor'}), 500
+
+@app.route('/api/analytics/time-in-status', methods=['GET'])
+def get_time_in_status():
+    """Retorna a distribuição do tempo gasto em cada status (em dias)"""
+    try:
+        since = request.args.get('since')
+        since = datetime.strptime(since, '%Y-%m-%d') if since else None
+        client_id = request.args.get('client_id', type=int)
+        
+        return jsonify(time_in_status(db, since, client_id))
+    
+    except ValueError:
+        return jsonify({'error': 'Data inválida. Use YYYY-MM-DD'}), 400
+    except Exception as e:
+        logger.error(f"Erro ao calcular tempo em cada status: {str(e)}")
+        return jsonify({'error': 'Erro interno do servidor'}), 500
+
+@app.route('/api/changes', methods=['GET'])
+def get_changes():
+    """Retorna as mudanças em clientes, notificações e consultas desde um seq"""
+    try:
+        since = max(request.args.get('since', 0, type=int), 0)
+        limit = min(max(request.args.get('limit', DEFAULT_PAGE_SIZE * 10, type=int), 1), MAX_PAGE_SIZE * 2)
+        
+        return jsonify(db.get_changes(since, limit))
+    except Exception as e:
+        logger.error(f"Erro ao buscar mudanças: {str(e)}")
+        return jsonify({'error': 'Erro interno do servidor'}), 500
+
+@app.route('/api/analytics/export/<dataset>', methods=['GET'])
+def get_exported_dataset(dataset):
+    """Lê um conjunto da exportação Parquet (não consulta o banco de produção)"""
+    try:
+        columns = request.args.get('columns')
+        limit = min(max(request.args.get('limit', 1000, type=int), 1), 10000)
+        frame = run_blocking(
+            read_export, AnalyticsExportJob.from_settings(db).export_dir, dataset,
+            request.args.get('from'), request.args.get('to'),
+            columns.split(',') if columns else None
+        )
+        
+        rows = run_blocking(frame.head(limit).to_json, orient='records', date_format='iso')
+        return jsonify({
+            'dataset': dataset,
+            'total': len(frame),
+            'rows': json.loads(rows)
+        })
+    
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logger.error(f"Erro ao ler exportação analítica: {str(e)}")
+        return jsonify({'error': 'Erro interno do servidor'}), 500
+
+# Formatos da exportação em tabela
+EXPORT_MIMETYPES = {
+    'csv': 'text/csv',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+}
+
+@app.route('/api/export/<dataset>', methods=['GET'])
+def export_dataset(dataset):
+    """
+    Exporta clientes, histórico ou notificações como CSV ou XLSX, em stream
+    
+    ?format=csv (padrão) ou xlsx; os demais parâmetros são filtros do
+    conjunto (status, since, until, client_id, ...). As linhas são lidas em
+    lotes, então a memória não depende do tamanho da exportação.
+    """
+    try:
+        file_format = request.args.get('format', 'csv').lower()
+        if file_format not in EXPORT_MIMETYPES:
+            return jsonify({'error': "Formato inválido (use 'csv' ou 'xlsx')"}), 400
+        
+        filters = {name: value for name, value in request.args.items() if name != 'format'}
+        export = db.prepare_export(dataset, filters)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logger.error(f"Erro ao preparar exportação: {str(e)}")
+        return jsonify({'error': 'Erro interno do servidor'}), 500
+    
+    # Lotes do SQLite e montagem do arquivo no threadpool, um bloco por vez
+    batches = db.iter_export_rows(export)
+    if file_format == 'csv':
+        body = (chunk.encode('utf-8') for chunk in iterate_blocking(csv_chunks(export['columns'], batches)))
+    else:
+        body = iterate_blocking(xlsx_chunks(export['columns'], batches, dataset))
+    
+    filename = f"{dataset}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{file_format}"
+    return Response(stream_with_context(body), mimetype=EXPORT_MIMETYPES[file_format], headers={
+        'Content-Disposition': f'attachment; filename="{filename}"',
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
 # ROTAS DO DASHBOARD
 
 @app.route('/api/dashboard/stats', methods=['GET'])
+@conditional_get('clients', 'notifications', 'query_history', 'statuses', daily=True)
 def get_dashboard_stats():
     """Retorna estatísticas do dashboard"""
     try:
@@ -391,6 +1054,7 @@ def get_dashboard_stats():
         return jsonify({'error': 'Erro interno do servidor'}), 500
 
 @app.route('/api/recent-updates', methods=['GET'])
+@conditional_get('query_history', 'clients', 'statuses')
 def get_recent_updates():
     """Retorna atualizações recentes"""
     try:
@@ -433,6 +1097,11 @@ def get_scheduler_status():
         logger.error(f"Erro ao buscar status do scheduler: {str(e)}")
         return jsonify({'error': 'Erro interno do servidor'}), 500
 
+@app.route('/api/cache/stats', methods=['GET'])
+def get_cache_stats():
+    """Métricas do cache de respostas (entradas, bytes, hits, misses e hit rate)"""
+    return jsonify(response_cache.stats())
+
 # TRATAMENTO DE ERROS
 
 @app.errorhandler(404)
@@ -0,0 +1,163 @@
+from datetime import datetime
+from sqlalchemy.dialects.sqlite import insert
+from src.models.user import db
+from src.models.client import Client
+from src.models.notification import Notification
+from src.models.status import Status
+from src.models.query_stats import StatusCount, _bump_counter
+
+# Valores aceitos ao repriorizar notificações
+NOTIFICATION_SEVERITIES = ('info', 'warning', 'error', 'success')
+
+# Operações em lote: cada uma é um número fixo de instruções SQL, qualquer que
+# seja o número de linhas. Como não passam pelos listeners de query_stats, os
+# agregados são ajustados aqui, também com instruções únicas, na mesma transação.
+
+def client_scope(ids=None, filters=None, select_all=False):
+    """Condição dos clientes selecionados por ids e/ou filtros ('status', 'process_year')"""
+    filters = filters or {}
+    conditions = []
+    if ids is not None:
+        conditions.append(Client.id.in_([int(client_id) for client_id in ids]))
+    if filters.get('status'):
+        status_id = Status.id_for(filters['status'])
+        conditions.append(Client.status_id == status_id if status_id is not None else db.false())
+    if filters.get('process_year') is not None:
+        conditions.append(Client.process_year == int(filters['process_year']))
+    return _scope(conditions, select_all)
+
+def notification_scope(ids=None, filters=None, select_all=False):
+    """
+    Condição das notificações selecionadas por ids e/ou filtros
+    ('client_id', 'notification_type', 'severity', 'is_read', 'before')
+    """
+    filters = filters or {}
+    conditions = []
+    if ids is not None:
+        conditions.append(Notification.id.in_([int(notification_id) for notification_id in ids]))
+    if filters.get('client_id') is not None:
+        conditions.append(Notification.client_id == int(filters['client_id']))
+    if filters.get('notification_type'):
+        conditions.append(Notification.notification_type == filters['notification_type'])
+    if filters.get('severity'):
+        conditions.append(Notification.severity == filters['severity'])
+    if filters.get('is_read') is not None:
+        conditions.append(Notification.is_read == bool(filters['is_read']))
+    if filters.get('before'):
+        try:
+            before = datetime.fromisoformat(str(filters['before']))
+        except ValueError:
+            raise ValueError("Filtro 'before' deve ser uma data ISO")
+        conditions.append(Notification.created_at < before)
+    return _scope(conditions, select_all)
+
+def _scope(conditions, select_all):
+    # Seleção vazia só com confirmação explícita
+    if not conditions and not select_all:
+        raise ValueError('Informe ids, filtros ou all=true')
+    return db.and_(db.true(), *conditions)
+
+def set_clients_active(scope, active):
+    """
+    Ativa ou desativa os clientes selecionados (desativar é o soft delete)
+
+    Returns:
+        Número de clientes que mudaram de estado
+    """
+    # Clientes com is_active nulo contam como ativos, como em _status_key
+    changing = db.and_(scope, Client.is_active == False if active else Client.is_active.isnot(False))
+    try:
+        # Distribuição por status primeiro: é a primeira escrita da transação
+        counts = db.session.query(
+            Client.status_id,
+            db.func.count(Client.id) if active else -db.func.count(Client.id)
+        ).filter(changing, Client.status_id.isnot(None)).group_by(Client.status_id)
+        table = StatusCount.__table__
+        stmt = insert(table).from_select(['status_id', 'client_count'], counts.statement)
+        db.session.execute(stmt.on_conflict_do_update(
+            index_elements=['status_id'],
+            set_={'client_count': table.c.client_count + stmt.excluded.client_count}
+        ))
+
+        changed = Client.query.filter(changing).update(
+            {Client.is_active: active, Client.updated_at: datetime.utcnow()},
+            synchronize_session=False
+        )
+        _bump_counter(db.session.connection(), 'active_clients', changed if active else -changed)
+        db.session.commit()
+        return changed
+    except Exception:
+        db.session.rollback()
+        raise
+
+def mark_notifications_read(scope):
+    """
+    Marca como lidas as notificações selecionadas
+
+    Returns:
+        Número de notificações marcadas (as já lidas não contam)
+    """
+    unread = db.and_(scope, Notification.is_read == False)
+    try:
+        _shift_client_unread(unread)
+        marked = Notification.query.filter(unread).update(
+            {Notification.is_read: True, Notification.read_at: datetime.utcnow()},
+            synchronize_session=False
+        )
+        _bump_counter(db.session.connection(), 'unread_notifications', -marked)
+        db.session.commit()
+        return marked
+    except Exception:
+        db.session.rollback()
+        raise
+
+def delete_notifications(scope):
+    """
+    Exclui as notificações selecionadas
+
+    Returns:
+        Número de notificações excluídas
+    """
+    unread = db.and_(scope, Notification.is_read == False)
+    try:
+        _shift_client_unread(unread)
+        unread_count = Notification.query.filter(unread).count()
+        deleted = Notification.query.filter(scope).delete(synchronize_session=False)
+        _bump_counter(db.session.connection(), 'unread_notifications', -unread_count)
+        db.session.commit()
+        return deleted
+    except Exception:
+        db.session.rollback()
+        raise
+
+def set_notifications_severity(scope, severity):
+    """
+    Define a severidade (prioridade) das notificações selecionadas
+
+    Returns:
+        Número de notificações alteradas
+    """
+    if severity not in NOTIFICATION_SEVERITIES:
+        raise ValueError(f"Severidade inválida (use {', '.join(NOTIFICATION_SEVERITIES)})")
+    try:
+        changed = Notification.query.filter(scope).update(
+            {Notification.severity: severity},
+            synchronize_session=False
+        )
+        db.session.commit()
+        return changed
+    except Exception:
+        db.session.rollback()
+        raise
+
+def _shift_client_unread(unread):
+    """Desconta de cada cliente as não lidas selecionadas, em uma instrução"""
+    per_client = db.session.query(db.func.count(Notification.id)).filter(
+        unread, Notification.client_id == Client.id
+    ).correlate(Client).scalar_subquery()
+    Client.query.filter(
+        Client.id.in_(db.session.query(Notification.client_id).filter(unread))
+    ).update(
+        {Client.unread_notifications: db.func.max(Client.unread_notifications - per_client, 0)},
+        synchronize_session=False
+    )
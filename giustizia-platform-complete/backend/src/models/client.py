@@ -1,6 +1,13 @@
 from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime
+from sqlalchemy import event, DDL
 from src.models.user import db
+from src.models.status import Status, StatusTransition
+from src.models.search import build_fts_query, collect_highlights, HIGHLIGHT_START, HIGHLIGHT_END
+from src.models.process_state import canonical_process, process_key
+
+# Colunas indexadas na busca textual, na ordem da tabela FTS
+SEARCH_COLUMNS = ['name', 'process_number', 'process_year', 'email', 'document_number', 'notes']
 
 class Client(db.Model):
     __tablename__ = 'clients'
@@ -12,9 +19,16 @@ class Client(db.Model):
     document_number = db.Column(db.String(50), nullable=True)
     process_number = db.Column(db.String(20), nullable=False, index=True)
     process_year = db.Column(db.Integer, nullable=False, index=True)
-    current_status = db.Column(db.Text, nullable=True)
+    process_key = db.Column(db.String(80), nullable=True)  # 'número/ano' canônico, calculado na escrita
+    status_id = db.Column(db.Integer, db.ForeignKey('statuses.id'), nullable=True)
     last_status_check = db.Column(db.DateTime, nullable=True)
     last_status_change = db.Column(db.DateTime, nullable=True)
+    
+    # Resumo mantido nas escritas de histórico e notificações (lista sem joins)
+    last_error = db.Column(db.Text, nullable=True)
+    last_error_at = db.Column(db.DateTime, nullable=True)
+    change_count = db.Column(db.Integer, nullable=False, default=0)
+    unread_notifications = db.Column(db.Integer, nullable=False, default=0)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     is_active = db.Column(db.Boolean, default=True)
@@ -26,8 +40,20 @@ class Client(db.Model):
     # Índice composto para otimizar consultas por processo
     __table_args__ = (
         db.Index('idx_process_number_year', 'process_number', 'process_year'),
+        db.Index('idx_client_name_id', 'name', 'id'),
+        db.Index('idx_client_status_name_id', 'status_id', 'name', 'id'),
+        db.Index('idx_client_process_key', 'process_key', unique=True),
     )
     
+    @property
+    def current_status(self):
+        """Texto do status atual, resolvido pelo dicionário de status"""
+        return Status.name_for(self.status_id)
+    
+    @current_status.setter
+    def current_status(self, value):
+        self.status_id = Status.intern(value)
+    
     def __repr__(self):
         return f'<Client {self.name} - Process {self.process_number}/{self.process_year}>'
     
@@ -40,20 +66,104 @@ class Client(db.Model):
             'document_number': self.document_number,
             'process_number': self.process_number,
             'process_year': self.process_year,
+            'status_id': self.status_id,
             'current_status': self.current_status,
             'last_status_check': self.last_status_check.isoformat() if self.last_status_check else None,
             'last_status_change': self.last_status_change.isoformat() if self.last_status_change else None,
+            'last_error': self.last_error,
+            'last_error_at': self.last_error_at.isoformat() if self.last_error_at else None,
+            'change_count': self.change_count or 0,
+            'unread_notifications': self.unread_notifications or 0,
             'created_at': self.created_at.isoformat() if self.created_at else None,
             'updated_at': self.updated_at.isoformat() if self.updated_at else None,
             'is_active': self.is_active,
             'notes': self.notes
         }
     
+    @staticmethod
+    def search(term, limit=20, active_only=True):
+        """
+        Busca por prefixo no índice FTS5, ordenada por relevância
+        
+        Returns:
+            Lista de tuplas (cliente, trechos destacados por campo)
+        """
+        fts_query = build_fts_query(term)
+        if not fts_query:
+            return []
+        
+        highlights = ', '.join(
+            f"highlight(clients_fts, {index}, '{HIGHLIGHT_START}', '{HIGHLIGHT_END}') AS {column}_highlight"
+            for index, column in enumerate(SEARCH_COLUMNS)
+        )
+        rows = db.session.execute(db.text(f'''
+            SELECT clients_fts.rowid AS id, {highlights}
+            FROM clients_fts
+            JOIN clients c ON c.id = clients_fts.rowid
+            WHERE clients_fts MATCH :query {'AND c.is_active = 1' if active_only else ''}
+            ORDER BY rank
+            LIMIT :limit
+        '''), {'query': fts_query, 'limit': limit}).mappings().all()
+        
+        clients = {client.id: client for client in Client.query.filter(Client.id.in_([row['id'] for row in rows]))}
+        return [
+            (clients[row['id']], collect_highlights(row, SEARCH_COLUMNS))
+            for row in rows if row['id'] in clients
+        ]
+    
+    @staticmethod
+    def find_by_process(process_number, process_year):
+        """Busca o cliente de um processo pela chave canônica (índice único)"""
+        return Client.query.filter_by(process_key=process_key(process_number, process_year)).first()
+    
     def update_status(self, new_status):
         """Atualiza o status do cliente e registra a mudança se necessário"""
-        if self.current_status != new_status:
-            self.current_status = new_status
+        status_id = Status.intern(new_status)
+        if self.status_id != status_id:
+            if status_id is not None:
+                if self.id is None:
+                    db.session.flush()
+                db.session.add(StatusTransition(
+                    client_id=self.id,
+                    from_status_id=self.status_id,
+                    to_status_id=status_id
+                ))
+            self.status_id = status_id
             self.last_status_change = datetime.utcnow()
         self.last_status_check = datetime.utcnow()
         self.updated_at = datetime.utcnow()
 
+
+@event.listens_for(Client, 'before_insert')
+@event.listens_for(Client, 'before_update')
+def _set_process_key(mapper, connection, target):
+    """Normaliza o ano e recalcula a chave canônica do processo a cada escrita"""
+    target.process_number = str(target.process_number).strip()
+    target.process_year = canonical_process(target.process_number, target.process_year)[1]
+    target.process_key = process_key(target.process_number, target.process_year)
+
+
+# Índice FTS5 mantido em sincronia com a tabela de clientes por triggers
+_search_columns = ', '.join(SEARCH_COLUMNS)
+_new_values = ', '.join(f'new.{column}' for column in SEARCH_COLUMNS)
+_old_values = ', '.join(f'old.{column}' for column in SEARCH_COLUMNS)
+
+for _statement in (
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS clients_fts USING fts5(
+        {_search_columns},
+        content='clients', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS clients_fts_insert AFTER INSERT ON clients BEGIN
+        INSERT INTO clients_fts (rowid, {_search_columns}) VALUES (new.id, {_new_values});
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS clients_fts_delete AFTER DELETE ON clients BEGIN
+        INSERT INTO clients_fts (clients_fts, rowid, {_search_columns}) VALUES ('delete', old.id, {_old_values});
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS clients_fts_update AFTER UPDATE OF {_search_columns} ON clients BEGIN
+        INSERT INTO clients_fts (clients_fts, rowid, {_search_columns}) VALUES ('delete', old.id, {_old_values});
+        INSERT INTO clients_fts (rowid, {_search_columns}) VALUES (new.id, {_new_values});
+    END""",
+    "INSERT INTO clients_fts (clients_fts) VALUES ('rebuild')",
+):
+    event.listen(Client.__table__, 'after_create', DDL(_statement))
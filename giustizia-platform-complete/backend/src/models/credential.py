@@ -1,6 +1,7 @@
 from flask_sqlalchemy import SQLAlchemy
-from datetime import datetime, timedelta
+from datetime import datetime
 from src.models.user import db
+from src.models.rate_limit import rate_limits
 import json
 
 class Credential(db.Model):
@@ -42,6 +43,7 @@ class Credential(db.Model):
         return f'<Credential {self.name} - {self.uuid[:8]}...>'
     
     def to_dict(self, include_sensitive=False):
+        counters = self.live_counters()
         data = {
             'id': self.id,
             'name': self.name,
@@ -50,18 +52,18 @@ class Credential(db.Model):
             'device_height': self.device_height,
             'platform': self.platform,
             'version': self.version,
-            'last_used': self.last_used.isoformat() if self.last_used else None,
-            'requests_this_minute': self.requests_this_minute,
+            'last_used': counters['last_used'].isoformat() if counters['last_used'] else None,
+            'requests_this_minute': rate_limits.requests_in_window(self),
             'max_requests_per_minute': self.max_requests_per_minute,
             'is_active': self.is_active,
-            'total_requests': self.total_requests,
-            'successful_requests': self.successful_requests,
-            'failed_requests': self.failed_requests,
-            'average_response_time': self.average_response_time,
+            'total_requests': counters['total_requests'],
+            'successful_requests': counters['successful_requests'],
+            'failed_requests': counters['failed_requests'],
+            'average_response_time': counters['average_response_time'],
             'created_at': self.created_at.isoformat() if self.created_at else None,
             'updated_at': self.updated_at.isoformat() if self.updated_at else None,
-            'last_error': self.last_error,
-            'last_error_at': self.last_error_at.isoformat() if self.last_error_at else None
+            'last_error': counters['last_error'],
+            'last_error_at': counters['last_error_at'].isoformat() if counters['last_error_at'] else None
         }
         
         if include_sensitive:
@@ -72,48 +74,89 @@ class Credential(db.Model):
         
         return data
     
-    def can_make_request(self):
+    def live_counters(self):
+        """Contadores de uso somando o que ainda não foi gravado no checkpoint"""
+        counters = {
+            'total_requests': self.total_requests or 0,
+            'successful_requests': self.successful_requests or 0,
+            'failed_requests': self.failed_requests or 0,
+            'average_response_time': self.average_response_time or 0.0,
+            'last_used': self.last_used,
+            'last_error': self.last_error,
+            'last_error_at': self.last_error_at
+        }
+        pending = rate_limits.pending_for(self.id)
+        if not pending:
+            return counters
+        
+        counters['total_requests'] += pending['total']
+        counters['successful_requests'] += pending['successful']
+        counters['failed_requests'] += pending['failed']
+        counters['last_used'] = pending['last_used']
+        if pending['last_error_at']:
+            counters['last_error'] = pending['last_error']
+            counters['last_error_at'] = pending['last_error_at']
+        if pending['first_response_time'] is not None:
+            if counters['average_response_time'] == 0:
+                counters['average_response_time'] = pending['first_response_time']
+            else:
+                counters['average_response_time'] = (
+                    counters['average_response_time'] * pending['decay'] + pending['contribution']
+                )
+        return counters
+    
+    @classmethod
+    def available_clause(cls, now=None):
+        """Condição SQL equivalente a can_make_request(), para contar sem gravar"""
+        return db.and_(
+            cls.is_active == True,
+            cls.id.notin_(rate_limits.saturated_ids(now))
+        )
+    
+    @classmethod
+    def pool_stats(cls, now=None):
+        """Totais do pool de credenciais em uma única consulta agregada (somente leitura)"""
+        row = db.session.query(
+            db.func.count(cls.id),
+            db.func.sum(db.case([(cls.is_active == True, 1)], else_=0)),
+            db.func.sum(db.case([(cls.available_clause(now), 1)], else_=0)),
+            db.func.sum(cls.total_requests),
+            db.func.sum(cls.successful_requests),
+            db.func.sum(cls.failed_requests),
+            db.func.avg(db.case([(cls.average_response_time > 0, cls.average_response_time)]))
+        ).one()
+        
+        return {
+            'total_credentials': row[0],
+            'active_credentials': int(row[1] or 0),
+            'available_now': int(row[2] or 0),
+            'total_requests': int(row[3] or 0),
+            'successful_requests': int(row[4] or 0),
+            'failed_requests': int(row[5] or 0),
+            'average_response_time': float(row[6] or 0)
+        }
+    
+    def is_available(self, now=None):
+        """Mesma regra de can_make_request() (nenhuma das duas grava no banco)"""
+        return self.can_make_request(now)
+    
+    def can_make_request(self, now=None):
         """Verifica se a credencial pode fazer uma nova requisição"""
         if not self.is_active:
             return False
         
-        now = datetime.utcnow()
-        
-        # Reset contador se passou mais de 1 minuto
-        if (self.minute_window_start is None or 
-            now - self.minute_window_start >= timedelta(minutes=1)):
-            self.minute_window_start = now
-            self.requests_this_minute = 0
-            db.session.commit()
-        
-        return self.requests_this_minute < self.max_requests_per_minute
+        # Janela de um minuto mantida em memória (ver RateLimitRegistry)
+        return rate_limits.can_request(self, now)
     
     def record_request(self, success=True, response_time=None, error_message=None):
-        """Registra uma requisição feita com esta credencial"""
-        now = datetime.utcnow()
-        
-        # Atualiza contadores
-        self.last_used = now
-        self.total_requests += 1
-        self.requests_this_minute += 1
-        
-        if success:
-            self.successful_requests += 1
-        else:
-            self.failed_requests += 1
-            self.last_error = error_message
-            self.last_error_at = now
-        
-        # Atualiza tempo médio de resposta
-        if response_time is not None and success:
-            if self.average_response_time == 0:
-                self.average_response_time = response_time
-            else:
-                # Média móvel simples
-                self.average_response_time = (self.average_response_time * 0.9) + (response_time * 0.1)
+        """
+        Registra uma requisição feita com esta credencial
         
-        self.updated_at = now
-        db.session.commit()
+        Os contadores ficam em memória e vão para o banco no próximo checkpoint
+        do registro (no máximo a cada CHECKPOINT_INTERVAL segundos), sem commit
+        por requisição. live_counters() já inclui o que está pendente.
+        """
+        rate_limits.record(self, success, response_time, error_message)
     
     def get_request_parameters(self, process_number, process_year):
         """Retorna os parâmetros formatados para requisição à API"""
@@ -1,9 +1,42 @@
 import sqlite3
 import json
 import logging
-from datetime import datetime
-from typing import Dict, List, Optional, Any
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Any, Tuple, Iterator
 from contextlib import contextmanager
+from .pagination import decode_cursor, build_page, cached_count
+from .export import EXPORT_DATASETS, EXPORT_BATCH_SIZE
+from .payload_codec import encode_payload, decode_payload
+from .json_patch import make_patch, apply_patch
+from .search import (
+    build_fts_query, collect_highlights, name_tokens, extract_parties,
+    CLIENT_SEARCH_COLUMNS, HIGHLIGHT_START, HIGHLIGHT_END
+)
+from .process_state import (
+    extract_state, extract_documents, extract_hearings, canonical_status, canonical_process, process_key
+)
+
+# Número máximo de deltas encadeados antes de gravar um novo keyframe
+SNAPSHOT_KEYFRAME_INTERVAL = 30
+
+# Tabelas registradas no log de mudanças: tabela -> (entidade, operações registradas)
+# O histórico de consultas só recebe inserções; as demais escritas nele são
+# manutenção interna (compactação de payloads, retenção).
+CHANGE_LOG_TABLES = {
+    'clients': ('client', ('insert', 'update', 'delete')),
+    'notifications': ('notification', ('insert', 'update', 'delete')),
+    'query_history': ('query_result', ('insert',))
+}
+
+# Tabelas com contador de versão, usado nos ETags das respostas da API
+VERSIONED_TABLES = ('clients', 'notifications', 'settings', 'query_history', 'statuses', 'credentials')
+
+# Colunas devolvidas para os resultados de consulta no feed (sem o payload bruto)
+QUERY_RESULT_COLUMNS = (
+    'id, client_id, credential_id, process_number, process_year, status_id, '
+    'success, error, has_changes, payload_hash, query_timestamp'
+)
 
 class Database:
     """
@@ -13,6 +46,15 @@ class Database:
     def __init__(self, db_path: str = "giustizia.db"):
         self.db_path = db_path
         self.logger = logging.getLogger(__name__)
+        self.fts_enabled = False
+        # Cache do dicionário de status (chave normalizada -> id e id -> nome)
+        self._status_ids = {}
+        self._status_names = {}
+        # Versões das tabelas, relidas só quando outra conexão grava (PRAGMA data_version)
+        self._versions_conn = None
+        self._versions_seen = None
+        self._versions = {}
+        self._versions_lock = threading.Lock()
         self._init_database()
     
     def _init_database(self):
@@ -28,10 +70,20 @@ class Database:
                         name TEXT NOT NULL,
                         process_number TEXT NOT NULL,
                         process_year INTEGER NOT NULL,
+                        process_key TEXT,
                         email TEXT,
                         phone TEXT,
                         document TEXT,
                         notes TEXT,
+                        status_id INTEGER REFERENCES statuses (id),
+                        last_status_check TIMESTAMP,
+                        last_status_change TIMESTAMP,
+                        last_error TEXT,
+                        last_error_at TIMESTAMP,
+                        change_count INTEGER NOT NULL DEFAULT 0,
+                        unread_notifications INTEGER NOT NULL DEFAULT 0,
+                        active INTEGER NOT NULL DEFAULT 1,
+                        priority INTEGER NOT NULL DEFAULT 0,
                         created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                         updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                         UNIQUE(process_number, process_year)
@@ -58,18 +110,128 @@ class Database:
                     CREATE TABLE IF NOT EXISTS query_history (
                         id INTEGER PRIMARY KEY AUTOINCREMENT,
                         client_id INTEGER,
+                        credential_id INTEGER,
                         process_number TEXT NOT NULL,
                         process_year INTEGER NOT NULL,
-                        status TEXT,
+                        status_id INTEGER REFERENCES statuses (id),
                         success BOOLEAN NOT NULL,
                         error TEXT,
                         has_changes BOOLEAN DEFAULT FALSE,
                         raw_data TEXT,
+                        payload_hash TEXT,
                         query_timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                         FOREIGN KEY (client_id) REFERENCES clients (id)
                     )
                 ''')
                 
+                # Dicionário de status: cada texto distinto é gravado uma única vez
+                cursor.execute('''
+                    CREATE TABLE IF NOT EXISTS statuses (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        name TEXT NOT NULL,
+                        normalized TEXT NOT NULL UNIQUE,
+                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                    )
+                ''')
+                
+                # Colunas adicionadas depois da primeira versão do schema
+                self._ensure_column(cursor, 'clients', 'status_id', 'INTEGER REFERENCES statuses (id)')
+                self._ensure_column(cursor, 'query_history', 'status_id', 'INTEGER REFERENCES statuses (id)')
+                self._ensure_column(cursor, 'query_history', 'credential_id', 'INTEGER')
+                self._ensure_column(cursor, 'query_history', 'payload_hash', 'TEXT')
+                self._ensure_column(cursor, 'clients', 'process_key', 'TEXT')
+                # Clientes desativados ficam fora das consultas diárias; priority ordena a execução
+                self._ensure_column(cursor, 'clients', 'active', 'INTEGER NOT NULL DEFAULT 1')
+                self._ensure_column(cursor, 'clients', 'priority', 'INTEGER NOT NULL DEFAULT 0')
+                
+                # Resumo por cliente mantido nas escritas (lista de clientes sem joins)
+                summary_added = False
+                for column, definition in [
+                    ('last_status_check', 'TIMESTAMP'),
+                    ('last_status_change', 'TIMESTAMP'),
+                    ('last_error', 'TEXT'),
+                    ('last_error_at', 'TIMESTAMP'),
+                    ('change_count', 'INTEGER NOT NULL DEFAULT 0'),
+                    ('unread_notifications', 'INTEGER NOT NULL DEFAULT 0')
+                ]:
+                    summary_added = self._ensure_column(cursor, 'clients', column, definition) or summary_added
+                
+                # Payloads brutos armazenados uma única vez, comprimidos e endereçados pelo hash
+                cursor.execute('''
+                    CREATE TABLE IF NOT EXISTS payload_blobs (
+                        hash TEXT PRIMARY KEY,
+                        codec TEXT NOT NULL,
+                        data BLOB NOT NULL,
+                        size INTEGER NOT NULL,
+                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                    )
+                ''')
+                
+                # Histórico de payloads por processo: keyframes completos + deltas JSON Patch
+                cursor.execute('''
+                    CREATE TABLE IF NOT EXISTS payload_snapshots (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        process_number TEXT NOT NULL,
+                        process_year INTEGER NOT NULL,
+                        payload_hash TEXT NOT NULL,
+                        keyframe_id INTEGER,
+                        chain_length INTEGER NOT NULL DEFAULT 0,
+                        codec TEXT,
+                        delta BLOB,
+                        captured_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                    )
+                ''')
+                cursor.execute('''
+                    CREATE INDEX IF NOT EXISTS idx_payload_snapshots_process
+                    ON payload_snapshots (process_number, process_year, captured_at, id)
+                ''')
+                cursor.execute('''
+                    CREATE INDEX IF NOT EXISTS idx_payload_snapshots_hash
+                    ON payload_snapshots (payload_hash)
+                ''')
+                # Deltas de uma cadeia, lidos na reconstrução a partir do keyframe
+                cursor.execute('''
+                    CREATE INDEX IF NOT EXISTS idx_payload_snapshots_keyframe
+                    ON payload_snapshots (keyframe_id, id)
+                ''')
+                
+                cursor.execute('''
+                    CREATE INDEX IF NOT EXISTS idx_query_history_client_ts
+                    ON query_history (client_id, query_timestamp)
+                ''')
+                # Referências ao payload, consultadas pela retenção antes de remover snapshots e blobs
+                cursor.execute('''
+                    CREATE INDEX IF NOT EXISTS idx_query_history_payload_hash
+                    ON query_history (payload_hash)
+                ''')
+                
+                # Índice de busca textual dos clientes
+                self._init_client_search(cursor)
+                
+                # Índices das chaves de ordenação usadas na paginação por cursor
+                cursor.execute('CREATE INDEX IF NOT EXISTS idx_clients_name_id ON clients (name, id)')
+                cursor.execute('''
+                    CREATE INDEX IF NOT EXISTS idx_clients_status_name_id
+                    ON clients (status_id, name, id)
+                ''')
+                # Ordem das consultas diárias (ver get_active_clients)
+                cursor.execute('''
+                    CREATE INDEX IF NOT EXISTS idx_clients_active_priority
+                    ON clients (active, priority DESC, name)
+                ''')
+                
+                # Chave canônica do processo (número/ano normalizados)
+                self._backfill_process_keys(cursor)
+                self._ensure_process_key_index(cursor)
+                cursor.execute('''
+                    CREATE INDEX IF NOT EXISTS idx_query_history_ts_id
+                    ON query_history (query_timestamp, id)
+                ''')
+                cursor.execute('''
+                    CREATE INDEX IF NOT EXISTS idx_query_history_client_ts_id
+                    ON query_history (client_id, query_timestamp, id)
+                ''')
+                
                 # Tabela de notificações
                 cursor.execute('''
                     CREATE TABLE IF NOT EXISTS notifications (
@@ -77,6 +239,7 @@ class Database:
                         type TEXT NOT NULL,
                         title TEXT NOT NULL,
                         message TEXT NOT NULL,
+                        client_id INTEGER,
                         client_name TEXT,
                         process_number TEXT,
                         read BOOLEAN DEFAULT FALSE,
@@ -84,6 +247,12 @@ class Database:
                     )
                 ''')
                 
+                cursor.execute('''
+                    CREATE INDEX IF NOT EXISTS idx_notifications_created_id
+                    ON notifications (created_at, id)
+                ''')
+                self._ensure_column(cursor, 'notifications', 'client_id', 'INTEGER')
+                
                 # Tabela de configurações
                 cursor.execute('''
                     CREATE TABLE IF NOT EXISTS settings (
@@ -101,7 +270,14 @@ class Database:
                     'query_time': '08:00',
                     'max_retries': '3',
                     'timeout_seconds': '30',
-                    'batch_size': '10'
+                    'batch_size': '10',
+                    'history_retention_days': '90',
+                    'history_archive_dir': 'archive',
+                    'change_log_retention_days': '30',
+                    'notification_flush_seconds': '1',
+                    'analytics_export_dir': 'analytics',
+                    'analytics_export_time': '02:00',
+                    'retention_time': '03:00'
                 }
                 
                 for key, value in default_settings.items():
@@ -109,6 +285,175 @@ class Database:
                         INSERT OR IGNORE INTO settings (key, value) VALUES (?, ?)
                     ''', (key, value))
                 
+                # Tabelas de agregados mantidas incrementalmente
+                cursor.execute('''
+                    CREATE TABLE IF NOT EXISTS stats_counters (
+                        name TEXT PRIMARY KEY,
+                        value INTEGER NOT NULL DEFAULT 0,
+                        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                    )
+                ''')
+                
+                cursor.execute('''
+                    CREATE TABLE IF NOT EXISTS daily_query_stats (
+                        day TEXT PRIMARY KEY,
+                        total_queries INTEGER NOT NULL DEFAULT 0,
+                        successful_queries INTEGER NOT NULL DEFAULT 0,
+                        failed_queries INTEGER NOT NULL DEFAULT 0,
+                        changes_detected INTEGER NOT NULL DEFAULT 0
+                    )
+                ''')
+                
+                cursor.execute('''
+                    CREATE TABLE IF NOT EXISTS credential_query_stats (
+                        credential_id INTEGER PRIMARY KEY,
+                        total_queries INTEGER NOT NULL DEFAULT 0,
+                        successful_queries INTEGER NOT NULL DEFAULT 0,
+                        failed_queries INTEGER NOT NULL DEFAULT 0,
+                        last_query_at TIMESTAMP
+                    )
+                ''')
+                
+                # Estado atual de cada processo, atualizado no lugar a cada consulta
+                cursor.execute('''
+                    CREATE TABLE IF NOT EXISTS process_state (
+                        process_number TEXT NOT NULL,
+                        process_year INTEGER NOT NULL,
+                        status_id INTEGER REFERENCES statuses (id),
+                        tribunal TEXT,
+                        judge TEXT,
+                        last_update TIMESTAMP,
+                        next_hearing_at TIMESTAMP,
+                        document_count INTEGER NOT NULL DEFAULT 0,
+                        payload_hash TEXT,
+                        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                        PRIMARY KEY (process_number, process_year)
+                    )
+                ''')
+                self._ensure_column(cursor, 'process_state', 'status_id', 'INTEGER REFERENCES statuses (id)')
+                cursor.execute('''
+                    CREATE INDEX IF NOT EXISTS idx_process_state_next_hearing
+                    ON process_state (next_hearing_at)
+                ''')
+                
+                # Documentos de cada processo; first_seen_at marca quando apareceram
+                cursor.execute('''
+                    CREATE TABLE IF NOT EXISTS process_documents (
+                        process_number TEXT NOT NULL,
+                        process_year INTEGER NOT NULL,
+                        doc_key TEXT NOT NULL,
+                        title TEXT,
+                        doc_type TEXT,
+                        filed_at TIMESTAMP,
+                        first_seen_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                        PRIMARY KEY (process_number, process_year, doc_key)
+                    )
+                ''')
+                cursor.execute('''
+                    CREATE INDEX IF NOT EXISTS idx_process_documents_first_seen
+                    ON process_documents (first_seen_at)
+                ''')
+                cursor.execute('''
+                    CREATE INDEX IF NOT EXISTS idx_process_documents_filed
+                    ON process_documents (filed_at)
+                ''')
+                
+                # Audiências de cada processo, com a data já interpretada
+                cursor.execute('''
+                    CREATE TABLE IF NOT EXISTS process_hearings (
+                        process_number TEXT NOT NULL,
+                        process_year INTEGER NOT NULL,
+                        hearing_key TEXT NOT NULL,
+                        hearing_at TIMESTAMP,
+                        description TEXT,
+                        raw_value TEXT,
+                        first_seen_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                        PRIMARY KEY (process_number, process_year, hearing_key)
+                    )
+                ''')
+                cursor.execute('''
+                    CREATE INDEX IF NOT EXISTS idx_process_hearings_at
+                    ON process_hearings (hearing_at, process_number, process_year, hearing_key)
+                ''')
+                
+                # Partes de cada processo extraídas dos payloads na ingestão
+                cursor.execute('''
+                    CREATE TABLE IF NOT EXISTS process_parties (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        process_number TEXT NOT NULL,
+                        process_year INTEGER NOT NULL,
+                        name TEXT NOT NULL,
+                        normalized_name TEXT NOT NULL,
+                        role TEXT,
+                        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                    )
+                ''')
+                cursor.execute('''
+                    CREATE INDEX IF NOT EXISTS idx_process_parties_process
+                    ON process_parties (process_number, process_year)
+                ''')
+                
+                # Palavras normalizadas de cada parte, para busca por prefixo
+                cursor.execute('''
+                    CREATE TABLE IF NOT EXISTS process_party_tokens (
+                        token TEXT NOT NULL,
+                        party_id INTEGER NOT NULL,
+                        PRIMARY KEY (token, party_id)
+                    ) WITHOUT ROWID
+                ''')
+                
+                # Transições de status (somente mudanças reais), apenas acrescentadas
+                cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'status_transitions'")
+                transitions_exist = cursor.fetchone() is not None
+                cursor.execute('''
+                    CREATE TABLE IF NOT EXISTS status_transitions (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        client_id INTEGER NOT NULL,
+                        from_status_id INTEGER REFERENCES statuses (id),
+                        to_status_id INTEGER NOT NULL REFERENCES statuses (id),
+                        changed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                    )
+                ''')
+                cursor.execute('''
+                    CREATE INDEX IF NOT EXISTS idx_status_transitions_client
+                    ON status_transitions (client_id, changed_at, id)
+                ''')
+                
+                # Totais das linhas de histórico removidas pela retenção
+                cursor.execute('''
+                    CREATE TABLE IF NOT EXISTS archived_query_stats (
+                        day TEXT NOT NULL,
+                        credential_id INTEGER NOT NULL DEFAULT 0,
+                        total_queries INTEGER NOT NULL DEFAULT 0,
+                        successful_queries INTEGER NOT NULL DEFAULT 0,
+                        failed_queries INTEGER NOT NULL DEFAULT 0,
+                        PRIMARY KEY (day, credential_id)
+                    )
+                ''')
+                
+                cursor.execute('''
+                    CREATE TABLE IF NOT EXISTS status_counts (
+                        status_id INTEGER PRIMARY KEY REFERENCES statuses (id),
+                        client_count INTEGER NOT NULL DEFAULT 0
+                    )
+                ''')
+                
+                # Status em texto de versões anteriores passam para o dicionário
+                cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'status_distribution'")
+                legacy_distribution = cursor.fetchone() is not None
+                cursor.execute('DROP TABLE IF EXISTS status_distribution')
+                migrated = self._intern_legacy_statuses(cursor)
+                if not transitions_exist:
+                    self._backfill_status_transitions(cursor)
+                
+                # Bancos criados antes dos agregados precisam ser preenchidos uma vez
+                cursor.execute('SELECT COUNT(*) FROM stats_counters')
+                if cursor.fetchone()[0] == 0 or legacy_distribution or migrated or summary_added:
+                    self._rebuild_aggregates(cursor)
+                
+                self._init_change_log(cursor)
+                self._init_table_versions(cursor)
+                
                 conn.commit()
                 self.logger.info("Banco de dados inicializado com sucesso")
                 
@@ -116,6 +461,217 @@ class Database:
             self.logger.error(f"Erro ao inicializar banco de dados: {str(e)}")
             raise
     
+    def _init_client_search(self, cursor):
+        """
+        Cria o índice FTS5 dos clientes, mantido em sincronia por triggers
+        
+        Se o SQLite não tiver FTS5 a busca cai para LIKE.
+        """
+        columns = ', '.join(CLIENT_SEARCH_COLUMNS)
+        new_values = ', '.join(f'new.{column}' for column in CLIENT_SEARCH_COLUMNS)
+        old_values = ', '.join(f'old.{column}' for column in CLIENT_SEARCH_COLUMNS)
+        
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'clients_fts'")
+        exists = cursor.fetchone() is not None
+        
+        try:
+            cursor.execute(f'''
+                CREATE VIRTUAL TABLE IF NOT EXISTS clients_fts USING fts5(
+                    {columns},
+                    content='clients', content_rowid='id',
+                    tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+                )
+            ''')
+        except sqlite3.OperationalError as e:
+            self.logger.warning(f"FTS5 indisponível, busca de clientes usará LIKE: {str(e)}")
+            return
+        
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS clients_fts_insert AFTER INSERT ON clients BEGIN
+                INSERT INTO clients_fts (rowid, {columns}) VALUES (new.id, {new_values});
+            END
+        ''')
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS clients_fts_delete AFTER DELETE ON clients BEGIN
+                INSERT INTO clients_fts (clients_fts, rowid, {columns}) VALUES ('delete', old.id, {old_values});
+            END
+        ''')
+        # Só reindexa quando um campo pesquisável muda (não a cada consulta de status)
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS clients_fts_update AFTER UPDATE OF {columns} ON clients BEGIN
+                INSERT INTO clients_fts (clients_fts, rowid, {columns}) VALUES ('delete', old.id, {old_values});
+                INSERT INTO clients_fts (rowid, {columns}) VALUES (new.id, {new_values});
+            END
+        ''')
+        
+        if not exists:
+            cursor.execute("INSERT INTO clients_fts (clients_fts) VALUES ('rebuild')")
+        self.fts_enabled = True
+    
+    def _init_change_log(self, cursor):
+        """
+        Cria o log de mudanças e os triggers que o alimentam
+        
+        Os triggers são recriados a cada inicialização porque a condição de
+        UPDATE compara todas as colunas atuais da tabela: escritas que não
+        alteram nada (como a reconstrução dos agregados) não geram entradas.
+        """
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS change_log (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                entity TEXT NOT NULL,
+                entity_id INTEGER NOT NULL,
+                operation TEXT NOT NULL,
+                changed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_change_log_changed_at ON change_log (changed_at)')
+        
+        for table, (entity, operations) in CHANGE_LOG_TABLES.items():
+            cursor.execute(f'PRAGMA table_info({table})')
+            columns = [row['name'] for row in cursor.fetchall() if row['name'] != 'updated_at']
+            changed = ' OR '.join(f'old.{column} IS NOT new.{column}' for column in columns)
+            
+            for operation in ('insert', 'update', 'delete'):
+                trigger = f'{table}_change_log_{operation}'
+                cursor.execute(f'DROP TRIGGER IF EXISTS {trigger}')
+                if operation not in operations:
+                    continue
+                row = 'old' if operation == 'delete' else 'new'
+                condition = f'WHEN {changed}' if operation == 'update' else ''
+                cursor.execute(f'''
+                    CREATE TRIGGER {trigger} AFTER {operation.upper()} ON {table} {condition} BEGIN
+                        INSERT INTO change_log (entity, entity_id, operation)
+                        VALUES ('{entity}', {row}.id, '{operation}');
+                    END
+                ''')
+    
+    def _init_table_versions(self, cursor):
+        """Cria os contadores de versão por tabela, incrementados por triggers"""
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS table_versions (
+                name TEXT PRIMARY KEY,
+                version INTEGER NOT NULL DEFAULT 0,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        for table in VERSIONED_TABLES:
+            cursor.execute('INSERT OR IGNORE INTO table_versions (name) VALUES (?)', (table,))
+            for operation in ('INSERT', 'UPDATE', 'DELETE'):
+                cursor.execute(f'''
+                    CREATE TRIGGER IF NOT EXISTS {table}_version_{operation.lower()}
+                    AFTER {operation} ON {table} BEGIN
+                        UPDATE table_versions SET version = version + 1, updated_at = CURRENT_TIMESTAMP
+                        WHERE name = '{table}';
+                    END
+                ''')
+    
+    def get_table_versions(self, tables) -> Dict[str, Dict]:
+        """
+        Versão e horário da última escrita de cada tabela (vazio em caso de erro)
+        
+        Usa uma conexão dedicada que nunca grava: o PRAGMA data_version dela
+        muda a cada commit de qualquer outra conexão (inclusive de outros
+        processos), então table_versions só é relida quando houve escrita.
+        """
+        try:
+            with self._versions_lock:
+                if self._versions_conn is None:
+                    self._versions_conn = sqlite3.connect(self.db_path, check_same_thread=False)
+                    self._versions_conn.row_factory = sqlite3.Row
+                data_version = self._versions_conn.execute('PRAGMA data_version').fetchone()[0]
+                if data_version != self._versions_seen:
+                    rows = self._versions_conn.execute('SELECT name, version, updated_at FROM table_versions').fetchall()
+                    self._versions = {
+                        row['name']: {'version': row['version'], 'updated_at': row['updated_at']} for row in rows
+                    }
+                    self._versions_seen = data_version
+                return {name: self._versions[name] for name in tables if name in self._versions}
+        except Exception as e:
+            self.logger.error(f"Erro ao buscar versões das tabelas: {str(e)}")
+            return {}
+    
+    def _ensure_column(self, cursor, table: str, column: str, definition: str) -> bool:
+        """Adiciona uma coluna a uma tabela existente se ela ainda não existir"""
+        cursor.execute(f'PRAGMA table_info({table})')
+        if column in [row['name'] for row in cursor.fetchall()]:
+            return False
+        cursor.execute(f'ALTER TABLE {table} ADD COLUMN {column} {definition}')
+        return True
+    
+    def _intern_status(self, cursor, status: Any) -> Optional[int]:
+        """Retorna o id do status no dicionário, criando a entrada se necessário"""
+        canonical = canonical_status(status)
+        if not canonical:
+            return None
+        normalized, name = canonical
+        
+        status_id = self._status_ids.get(normalized)
+        if status_id is not None:
+            return status_id
+        
+        cursor.execute('''
+            INSERT INTO statuses (name, normalized) VALUES (?, ?)
+            ON CONFLICT(normalized) DO NOTHING
+        ''', (name, normalized))
+        created = cursor.rowcount > 0
+        cursor.execute('SELECT id, name FROM statuses WHERE normalized = ?', (normalized,))
+        row = cursor.fetchone()
+        # Entradas novas só entram no cache depois de confirmadas por outra leitura
+        if not created:
+            self._status_ids[normalized] = row['id']
+            self._status_names[row['id']] = row['name']
+        return row['id']
+    
+    def _status_id_for(self, cursor, status: Any) -> Optional[int]:
+        """Retorna o id de um status existente, sem criá-lo"""
+        canonical = canonical_status(status)
+        if not canonical:
+            return None
+        if canonical[0] not in self._status_ids:
+            cursor.execute('SELECT id, name FROM statuses WHERE normalized = ?', (canonical[0],))
+            row = cursor.fetchone()
+            if not row:
+                return None
+            self._status_ids[canonical[0]] = row['id']
+            self._status_names[row['id']] = row['name']
+        return self._status_ids[canonical[0]]
+    
+    def _resolve_statuses(self, cursor, rows: List[Dict], name_column: str = 'status',
+                          id_column: str = 'status_id') -> List[Dict]:
+        """Preenche o texto do status das linhas a partir do id no dicionário"""
+        missing = {row[id_column] for row in rows if row.get(id_column) is not None} - set(self._status_names)
+        if missing:
+            placeholders = ', '.join('?' * len(missing))
+            cursor.execute(f'SELECT id, name FROM statuses WHERE id IN ({placeholders})', list(missing))
+            self._status_names.update({row['id']: row['name'] for row in cursor.fetchall()})
+        for row in rows:
+            row[name_column] = self._status_names.get(row.get(id_column))
+        return rows
+    
+    def _intern_legacy_statuses(self, cursor) -> bool:
+        """
+        Converte status gravados como texto por versões anteriores em status_id
+        
+        O texto é apagado depois da conversão. Retorna True se algo mudou.
+        """
+        migrated = False
+        for table, column in (('query_history', 'status'), ('clients', 'current_status'), ('process_state', 'status')):
+            cursor.execute(f'PRAGMA table_info({table})')
+            if column not in [row['name'] for row in cursor.fetchall()]:
+                continue
+            cursor.execute(f'''
+                SELECT DISTINCT {column} FROM {table}
+                WHERE {column} IS NOT NULL AND status_id IS NULL
+            ''')
+            for (value,) in cursor.fetchall():
+                cursor.execute(f'''
+                    UPDATE {table} SET status_id = ?, {column} = NULL
+                    WHERE {column} = ? AND status_id IS NULL
+                ''', (self._intern_status(cursor, value), value))
+                migrated = True
+        return migrated
+    
     @contextmanager
     def get_connection(self):
         """Context manager para conexões com o banco"""
@@ -126,40 +682,179 @@ class Database:
         finally:
             conn.close()
     
+    def _fetch_page(self, cursor, table: str, sort_columns: List[str], descending: bool,
+                    limit: int, page_cursor: Optional[str] = None,
+                    where: str = '', params: tuple = ()) -> Dict:
+        """
+        Busca uma página pela chave de ordenação (keyset), sem OFFSET
+        
+        Args:
+            table: Tabela consultada
+            sort_columns: Colunas da chave de ordenação (a última deve ser única)
+            descending: Se a ordem natural da listagem é decrescente
+            limit: Tamanho da página
+            page_cursor: Cursor opaco recebido da página anterior
+            where: Filtro adicional (SQL com placeholders)
+            params: Parâmetros do filtro adicional
+        """
+        direction = None
+        conditions = [where] if where else []
+        query_params = list(params)
+        
+        if page_cursor:
+            values, direction = decode_cursor(page_cursor)
+            if len(values) != len(sort_columns):
+                raise ValueError("Cursor inválido")
+            forward = (direction == 'next') != descending
+            conditions.append(
+                f"({', '.join(sort_columns)}) {'>' if forward else '<'} ({', '.join('?' * len(values))})"
+            )
+            query_params.extend(values)
+        
+        order = 'ASC' if descending == (direction == 'prev') else 'DESC'
+        sql = f'SELECT * FROM {table}'
+        if conditions:
+            sql += ' WHERE ' + ' AND '.join(conditions)
+        sql += ' ORDER BY ' + ', '.join(f'{column} {order}' for column in sort_columns)
+        sql += ' LIMIT ?'
+        query_params.append(limit + 1)
+        
+        cursor.execute(sql, query_params)
+        rows = [dict(row) for row in cursor.fetchall()]
+        return build_page(rows, limit, direction, lambda row: [row[column] for column in sort_columns])
+    
     # MÉTODOS PARA CLIENTES
     
     def create_client(self, client_data: Dict) -> int:
         """Cria um novo cliente"""
         try:
+            key = process_key(client_data['process_number'], client_data['process_year'])
             with self.get_connection() as conn:
                 cursor = conn.cursor()
+                if self._process_key_taken(cursor, key):
+                    raise ValueError("Processo já cadastrado")
                 cursor.execute('''
-                    INSERT INTO clients (name, process_number, process_year, email, phone, document, notes)
-                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                    INSERT INTO clients (name, process_number, process_year, process_key, email, phone, document, notes)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
                 ''', (
                     client_data['name'],
-                    client_data['process_number'],
-                    client_data['process_year'],
+                    str(client_data['process_number']).strip(),
+                    canonical_process(client_data['process_number'], client_data['process_year'])[1],
+                    key,
                     client_data.get('email'),
                     client_data.get('phone'),
                     client_data.get('document'),
                     client_data.get('notes')
                 ))
+                client_id = cursor.lastrowid
+                self._bump_counter(cursor, 'total_clients')
                 conn.commit()
-                return cursor.lastrowid
+                return client_id
         except sqlite3.IntegrityError:
             raise ValueError("Processo já cadastrado")
+        except ValueError:
+            raise
         except Exception as e:
             self.logger.error(f"Erro ao criar cliente: {str(e)}")
             raise
     
-    def get_all_clients(self) -> List[Dict]:
-        """Retorna todos os clientes"""
+    def get_all_clients(self, status: str = None) -> List[Dict]:
+        """Retorna todos os clientes, opcionalmente apenas os de um status"""
         try:
             with self.get_connection() as conn:
                 cursor = conn.cursor()
-                cursor.execute('SELECT * FROM clients ORDER BY name')
-                return [dict(row) for row in cursor.fetchall()]
+                if status:
+                    cursor.execute(
+                        'SELECT * FROM clients WHERE status_id = ? ORDER BY name',
+                        (self._status_id_for(cursor, status),)
+                    )
+                else:
+                    cursor.execute('SELECT * FROM clients ORDER BY name')
+                return self._resolve_statuses(cursor, [dict(row) for row in cursor.fetchall()], 'current_status')
+        except Exception as e:
+            self.logger.error(f"Erro ao buscar clientes: {str(e)}")
+            return []
+    
+    def get_active_clients(self) -> List[Dict]:
+        """Retorna os clientes ativos, dos de maior prioridade para os de menor"""
+        try:
+            with self.get_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute('SELECT * FROM clients WHERE active = 1 ORDER BY priority DESC, name')
+                return self._resolve_statuses(cursor, [dict(row) for row in cursor.fetchall()], 'current_status')
+        except Exception as e:
+            self.logger.error(f"Erro ao buscar clientes ativos: {str(e)}")
+            return []
+    
+    def get_clients_page(self, limit: int = 50, cursor: str = None, include_total: bool = False,
+                         status: str = None) -> Dict:
+        """Retorna uma página de clientes ordenada por nome, opcionalmente de um status"""
+        try:
+            with self.get_connection() as conn:
+                db_cursor = conn.cursor()
+                where, params = ('', ())
+                if status:
+                    # Igualdade no status_id: percorre idx_clients_status_name_id
+                    where, params = ('status_id = ?', (self._status_id_for(db_cursor, status),))
+                page = self._fetch_page(db_cursor, 'clients', ['name', 'id'], False, limit, cursor, where, params)
+                self._resolve_statuses(db_cursor, page['items'], 'current_status')
+                if status and include_total:
+                    page['total'] = db_cursor.execute(
+                        'SELECT COALESCE(SUM(client_count), 0) FROM status_counts WHERE status_id = ?', params
+                    ).fetchone()[0]
+                elif include_total:
+                    db_cursor.execute("SELECT value FROM stats_counters WHERE name = 'total_clients'")
+                    row = db_cursor.fetchone()
+                    page['total'] = row[0] if row else 0
+                return page
+        except ValueError:
+            raise
+        except Exception as e:
+            self.logger.error(f"Erro ao buscar página de clientes: {str(e)}")
+            raise
+    
+    def search_clients(self, term: str, limit: int = 20) -> List[Dict]:
+        """
+        Busca clientes por prefixo em nome, processo, e-mail, documento e observações
+        
+        Resultados ordenados por relevância (bm25), com os trechos encontrados
+        destacados em 'highlights'.
+        """
+        fts_query = build_fts_query(term)
+        if not fts_query:
+            return []
+        
+        try:
+            with self.get_connection() as conn:
+                cursor = conn.cursor()
+                if self.fts_enabled:
+                    highlights = ', '.join(
+                        f"highlight(clients_fts, {index}, '{HIGHLIGHT_START}', '{HIGHLIGHT_END}') AS {column}_highlight"
+                        for index, column in enumerate(CLIENT_SEARCH_COLUMNS)
+                    )
+                    cursor.execute(f'''
+                        SELECT c.*, {highlights}
+                        FROM clients_fts
+                        JOIN clients c ON c.id = clients_fts.rowid
+                        WHERE clients_fts MATCH ?
+                        ORDER BY rank
+                        LIMIT ?
+                    ''', (fts_query, limit))
+                else:
+                    like = f'%{term}%'
+                    conditions = ' OR '.join(f'{column} LIKE ?' for column in CLIENT_SEARCH_COLUMNS)
+                    cursor.execute(f'''
+                        SELECT * FROM clients WHERE {conditions} ORDER BY name, id LIMIT ?
+                    ''', [like] * len(CLIENT_SEARCH_COLUMNS) + [limit])
+                
+                results = []
+                for row in cursor.fetchall():
+                    client = dict(row)
+                    client['highlights'] = collect_highlights(client, CLIENT_SEARCH_COLUMNS)
+                    for column in CLIENT_SEARCH_COLUMNS:
+                        client.pop(f'{column}_highlight', None)
+                    results.append(client)
+                return self._resolve_statuses(cursor, results, 'current_status')
         except Exception as e:
             self.logger.error(f"Erro ao buscar clientes: {str(e)}")
             return []
@@ -171,26 +866,35 @@ class Database:
                 cursor = conn.cursor()
                 cursor.execute('SELECT * FROM clients WHERE id = ?', (client_id,))
                 row = cursor.fetchone()
-                return dict(row) if row else None
+                return self._resolve_statuses(cursor, [dict(row)], 'current_status')[0] if row else None
         except Exception as e:
             self.logger.error(f"Erro ao buscar cliente: {str(e)}")
             return None
     
     def update_client(self, client_id: int, client_data: Dict) -> bool:
-        """Atualiza um cliente"""
+        """
+        Atualiza um cliente
+        
+        Raises:
+            ValueError: Se o processo for inválido ou já pertencer a outro cliente
+        """
         try:
+            key = process_key(client_data['process_number'], client_data['process_year'])
             with self.get_connection() as conn:
                 cursor = conn.cursor()
+                if self._process_key_taken(cursor, key, client_id):
+                    raise ValueError("Processo já cadastrado")
                 cursor.execute('''
                     UPDATE clients 
-                    SET name = ?, process_number = ?, process_year = ?, 
+                    SET name = ?, process_number = ?, process_year = ?, process_key = ?,
                         email = ?, phone = ?, document = ?, notes = ?,
                         updated_at = CURRENT_TIMESTAMP
                     WHERE id = ?
                 ''', (
                     client_data['name'],
-                    client_data['process_number'],
-                    client_data['process_year'],
+                    str(client_data['process_number']).strip(),
+                    canonical_process(client_data['process_number'], client_data['process_year'])[1],
+                    key,
                     client_data.get('email'),
                     client_data.get('phone'),
                     client_data.get('document'),
@@ -199,6 +903,10 @@ class Database:
                 ))
                 conn.commit()
                 return cursor.rowcount > 0
+        except sqlite3.IntegrityError:
+            raise ValueError("Processo já cadastrado")
+        except ValueError:
+            raise
         except Exception as e:
             self.logger.error(f"Erro ao atualizar cliente: {str(e)}")
             return False
@@ -208,13 +916,137 @@ class Database:
         try:
             with self.get_connection() as conn:
                 cursor = conn.cursor()
+                cursor.execute('SELECT status_id FROM clients WHERE id = ?', (client_id,))
+                row = cursor.fetchone()
+                if not row:
+                    return False
+                
                 cursor.execute('DELETE FROM clients WHERE id = ?', (client_id,))
+                self._bump_counter(cursor, 'total_clients', -1)
+                self._shift_status(cursor, row['status_id'], None)
                 conn.commit()
-                return cursor.rowcount > 0
+                return True
         except Exception as e:
             self.logger.error(f"Erro ao excluir cliente: {str(e)}")
             return False
     
+    def delete_clients(self, ids: List[int] = None, filters: Dict = None, select_all: bool = False) -> int:
+        """
+        Exclui em lote os clientes selecionados por ids e/ou filtros
+        
+        Três instruções na mesma transação, qualquer que seja o número de
+        clientes: ajuste da distribuição por status, DELETE e total de clientes.
+        
+        Args:
+            ids: Ids dos clientes
+            filters: 'status' e/ou 'process_year'
+            select_all: Sem ids nem filtros, confirma que todos serão excluídos
+        
+        Returns:
+            Número de clientes excluídos
+        """
+        try:
+            with self.get_connection() as conn:
+                cursor = conn.cursor()
+                where, params = self._client_scope(cursor, ids, filters, select_all)
+                cursor.execute(f'''
+                    INSERT INTO status_counts (status_id, client_count)
+                    SELECT status_id, -COUNT(*) FROM clients
+                    WHERE status_id IS NOT NULL AND {where}
+                    GROUP BY status_id
+                    ON CONFLICT(status_id) DO UPDATE SET client_count = client_count + excluded.client_count
+                ''', params)
+                cursor.execute(f'DELETE FROM clients WHERE {where}', params)
+                deleted = cursor.rowcount
+                self._bump_counter(cursor, 'total_clients', -deleted)
+                conn.commit()
+                return deleted
+        except ValueError:
+            raise
+        except Exception as e:
+            self.logger.error(f"Erro ao excluir clientes em lote: {str(e)}")
+            raise
+    
+    def set_clients_active(self, active: bool, ids: List[int] = None, filters: Dict = None,
+                           select_all: bool = False) -> int:
+        """
+        Ativa ou desativa em lote os clientes selecionados, em uma instrução
+        
+        Clientes desativados continuam cadastrados (e nos totais do dashboard),
+        mas não entram nas consultas diárias.
+        
+        Returns:
+            Número de clientes que mudaram de estado
+        """
+        try:
+            with self.get_connection() as conn:
+                cursor = conn.cursor()
+                where, params = self._client_scope(cursor, ids, filters, select_all)
+                cursor.execute(f'''
+                    UPDATE clients SET active = ?, updated_at = CURRENT_TIMESTAMP
+                    WHERE active != ? AND {where}
+                ''', [int(active), int(active)] + params)
+                changed = cursor.rowcount
+                conn.commit()
+                return changed
+        except ValueError:
+            raise
+        except Exception as e:
+            self.logger.error(f"Erro ao alterar estado dos clientes em lote: {str(e)}")
+            raise
+    
+    def set_clients_priority(self, priority: int, ids: List[int] = None, filters: Dict = None,
+                             select_all: bool = False) -> int:
+        """
+        Define em lote a prioridade dos clientes selecionados, em uma instrução
+        
+        Returns:
+            Número de clientes alterados
+        """
+        if isinstance(priority, bool) or not isinstance(priority, int):
+            raise ValueError("'priority' deve ser um número inteiro")
+        try:
+            with self.get_connection() as conn:
+                cursor = conn.cursor()
+                where, params = self._client_scope(cursor, ids, filters, select_all)
+                cursor.execute(f'''
+                    UPDATE clients SET priority = ?, updated_at = CURRENT_TIMESTAMP
+                    WHERE priority != ? AND {where}
+                ''', [priority, priority] + params)
+                changed = cursor.rowcount
+                conn.commit()
+                return changed
+        except ValueError:
+            raise
+        except Exception as e:
+            self.logger.error(f"Erro ao alterar prioridade dos clientes em lote: {str(e)}")
+            raise
+    
+    def _client_scope(self, cursor, ids: Optional[List[int]], filters: Optional[Dict],
+                      select_all: bool) -> Tuple[str, list]:
+        """Condição WHERE de uma operação em lote de clientes"""
+        filters = filters or {}
+        conditions, params = self._ids_condition(ids)
+        if filters.get('status'):
+            status_id = self._status_id_for(cursor, filters['status'])
+            conditions.append('status_id = ?' if status_id is not None else '0')
+            params.extend([status_id] if status_id is not None else [])
+        if filters.get('process_year') is not None:
+            conditions.append('process_year = ?')
+            params.append(int(filters['process_year']))
+        return self._scope_clause(conditions, params, select_all)
+    
+    def _ids_condition(self, ids: Optional[List[int]]) -> Tuple[List[str], list]:
+        """Lista de ids como um único parâmetro JSON (sem limite de variáveis do SQLite)"""
+        if ids is None:
+            return [], []
+        return ['id IN (SELECT value FROM json_each(?))'], [json.dumps([int(i) for i in ids])]
+    
+    def _scope_clause(self, conditions: List[str], params: list, select_all: bool) -> Tuple[str, list]:
+        if not conditions and not select_all:
+            raise ValueError('Informe ids, filtros ou all=true')
+        return ' AND '.join(conditions) or '1', params
+    
     def bulk_import_clients(self, clients_data: List[Dict]) -> Dict:
         """Importa múltiplos clientes"""
         success_count = 0
@@ -235,24 +1067,131 @@ class Database:
             'error_details': errors
         }
     
-    # MÉTODOS PARA CREDENCIAIS
+    def _process_key_taken(self, cursor, key: str, client_id: int = None) -> bool:
+        """Verifica pelo índice da chave canônica se o processo já tem cliente"""
+        cursor.execute(
+            'SELECT 1 FROM clients WHERE process_key = ? AND id IS NOT ? LIMIT 1',
+            (key, client_id)
+        )
+        return cursor.fetchone() is not None
     
-    def create_credential(self, credential_data: Dict) -> int:
-        """Cria uma nova credencial"""
+    def _backfill_process_keys(self, cursor):
+        """Calcula a chave canônica dos clientes gravados antes dela existir"""
+        cursor.execute('SELECT id, process_number, process_year FROM clients WHERE process_key IS NULL')
+        updates = []
+        for row in cursor.fetchall():
+            try:
+                updates.append((process_key(row['process_number'], row['process_year']), row['id']))
+            except ValueError:
+                self.logger.warning(f"Cliente {row['id']} com processo inválido: {row['process_number']}/{row['process_year']}")
+        cursor.executemany('UPDATE clients SET process_key = ? WHERE id = ?', updates)
+    
+    def _ensure_process_key_index(self, cursor) -> bool:
+        """
+        Garante o índice único da chave canônica
+        
+        Enquanto houver duplicatas antigas o índice fica não único (apenas
+        para consulta) até que merge_duplicate_clients seja executado.
+        
+        Returns:
+            True se o índice é único
+        """
+        cursor.execute('''
+            SELECT 1 FROM clients WHERE process_key IS NOT NULL
+            GROUP BY process_key HAVING COUNT(*) > 1 LIMIT 1
+        ''')
+        if cursor.fetchone():
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_clients_process_key ON clients (process_key)')
+            self.logger.warning("Há clientes duplicados pelo processo; execute 'manage.py dedup-clients'")
+            return False
+        
+        cursor.execute('PRAGMA index_list(clients)')
+        unique = {row['name']: row['unique'] for row in cursor.fetchall()}
+        if unique.get('idx_clients_process_key') == 0:
+            cursor.execute('DROP INDEX idx_clients_process_key')
+        cursor.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_clients_process_key ON clients (process_key)')
+        return True
+    
+    def merge_duplicate_clients(self) -> Dict:
+        """
+        Une clientes que apontam para o mesmo processo canônico
+        
+        Mantém o cliente mais antigo de cada grupo, completa os contatos vazios
+        com os das duplicatas, transfere histórico, notificações e transições
+        e remove as duplicatas. Ao final recalcula os agregados e torna único o
+        índice da chave canônica.
+        
+        Returns:
+            Dicionário com o número de grupos e de clientes removidos
+        """
         try:
             with self.get_connection() as conn:
                 cursor = conn.cursor()
+                self._backfill_process_keys(cursor)
                 cursor.execute('''
-                    INSERT INTO credentials (name, uuid, token, device_type)
-                    VALUES (?, ?, ?, ?)
-                ''', (
-                    credential_data['name'],
-                    credential_data['uuid'],
-                    credential_data['token'],
-                    credential_data.get('device_type', 'iPhone')
-                ))
-                conn.commit()
-                return cursor.lastrowid
+                    SELECT * FROM clients
+                    WHERE process_key IN (
+                        SELECT process_key FROM clients WHERE process_key IS NOT NULL
+                        GROUP BY process_key HAVING COUNT(*) > 1
+                    )
+                    ORDER BY process_key, id
+                ''')
+                groups = {}
+                for row in cursor.fetchall():
+                    groups.setdefault(row['process_key'], []).append(dict(row))
+                
+                merged = 0
+                for clients in groups.values():
+                    keeper, duplicates = clients[0], clients[1:]
+                    duplicate_ids = [client['id'] for client in duplicates]
+                    placeholders = ', '.join('?' * len(duplicate_ids))
+                    
+                    for table in ('query_history', 'notifications', 'status_transitions'):
+                        cursor.execute(
+                            f'UPDATE {table} SET client_id = ? WHERE client_id IN ({placeholders})',
+                            [keeper['id']] + duplicate_ids
+                        )
+                    
+                    contacts = {
+                        column: next((client[column] for client in clients if client[column]), None)
+                        for column in ('email', 'phone', 'document', 'notes')
+                    }
+                    cursor.execute('''
+                        UPDATE clients SET email = ?, phone = ?, document = ?, notes = ?,
+                                           updated_at = CURRENT_TIMESTAMP
+                        WHERE id = ?
+                    ''', (contacts['email'], contacts['phone'], contacts['document'], contacts['notes'], keeper['id']))
+                    cursor.execute(f'DELETE FROM clients WHERE id IN ({placeholders})', duplicate_ids)
+                    merged += len(duplicate_ids)
+                
+                if merged:
+                    self._rebuild_aggregates(cursor)
+                self._ensure_process_key_index(cursor)
+                conn.commit()
+                self.logger.info(f"Clientes duplicados unidos: {merged} em {len(groups)} processos")
+                return {'duplicate_groups': len(groups), 'merged_clients': merged}
+        except Exception as e:
+            self.logger.error(f"Erro ao unir clientes duplicados: {str(e)}")
+            raise
+    
+    # MÉTODOS PARA CREDENCIAIS
+    
+    def create_credential(self, credential_data: Dict) -> int:
+        """Cria uma nova credencial"""
+        try:
+            with self.get_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    INSERT INTO credentials (name, uuid, token, device_type)
+                    VALUES (?, ?, ?, ?)
+                ''', (
+                    credential_data['name'],
+                    credential_data['uuid'],
+                    credential_data['token'],
+                    credential_data.get('device_type', 'iPhone')
+                ))
+                conn.commit()
+                return cursor.lastrowid
         except sqlite3.IntegrityError:
             raise ValueError("UUID já cadastrado")
         except Exception as e:
@@ -281,6 +1220,38 @@ class Database:
             self.logger.error(f"Erro ao buscar credenciais ativas: {str(e)}")
             return []
     
+    def get_credential_stats(self) -> Dict:
+        """Totais do pool de credenciais em uma única consulta agregada (somente leitura)"""
+        try:
+            with self.get_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    SELECT
+                        COUNT(c.id) AS total_credentials,
+                        COALESCE(SUM(c.status = 'active'), 0) AS active_credentials,
+                        COALESCE(SUM(cs.total_queries), 0) AS total_queries,
+                        COALESCE(SUM(cs.successful_queries), 0) AS successful_queries,
+                        COALESCE(SUM(cs.failed_queries), 0) AS failed_queries,
+                        MAX(cs.last_query_at) AS last_query_at
+                    FROM credentials c
+                    LEFT JOIN credential_query_stats cs ON cs.credential_id = c.id
+                ''')
+                stats = dict(cursor.fetchone())
+                total = stats['total_queries']
+                stats['success_rate'] = round(stats['successful_queries'] / total * 100, 2) if total else 0
+                return stats
+        except Exception as e:
+            self.logger.error(f"Erro ao buscar estatísticas das credenciais: {str(e)}")
+            return {
+                'total_credentials': 0,
+                'active_credentials': 0,
+                'total_queries': 0,
+                'successful_queries': 0,
+                'failed_queries': 0,
+                'last_query_at': None,
+                'success_rate': 0
+            }
+    
     def update_credential(self, credential_id: int, credential_data: Dict) -> bool:
         """Atualiza uma credencial"""
         try:
@@ -337,25 +1308,37 @@ class Database:
         try:
             with self.get_connection() as conn:
                 cursor = conn.cursor()
+                payload_hash = self._store_snapshot(
+                    cursor, query_data['process_number'], query_data['process_year'],
+                    query_data.get('raw_data')
+                )
+                status_id = self._intern_status(cursor, query_data.get('status'))
                 cursor.execute('''
                     INSERT INTO query_history 
-                    (client_id, process_number, process_year, status, success, error, has_changes, raw_data)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                    (client_id, credential_id, process_number, process_year, status_id, success, error, has_changes, payload_hash)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
                 ''', (
                     query_data.get('client_id'),
+                    query_data.get('credential_id'),
                     query_data['process_number'],
                     query_data['process_year'],
-                    query_data.get('status'),
+                    status_id,
                     query_data['success'],
                     query_data.get('error'),
                     query_data.get('has_changes', False),
-                    json.dumps(query_data.get('raw_data')) if query_data.get('raw_data') else None
+                    payload_hash
                 ))
+                if payload_hash:
+                    self._index_process(
+                        cursor, query_data['process_number'], query_data['process_year'],
+                        query_data['raw_data'], payload_hash
+                    )
+                self._record_query_stats(cursor, query_data, status_id)
                 conn.commit()
         except Exception as e:
             self.logger.error(f"Erro ao salvar histórico: {str(e)}")
     
-    def get_query_history(self, client_id: int = None, limit: int = 100) -> List[Dict]:
+    def get_query_history(self, client_id: int = None, limit: int = 100, include_raw: bool = True) -> List[Dict]:
         """Retorna histórico de consultas"""
         try:
             with self.get_connection() as conn:
@@ -374,19 +1357,570 @@ class Database:
                         LIMIT ?
                     ''', (limit,))
                 
-                results = []
-                for row in cursor.fetchall():
-                    result = dict(row)
-                    if result['raw_data']:
+                results = self._resolve_statuses(cursor, [dict(row) for row in cursor.fetchall()])
+                return self._attach_payloads(cursor, results, include_raw)
+        except Exception as e:
+            self.logger.error(f"Erro ao buscar histórico: {str(e)}")
+            return []
+    
+    def get_query_history_page(self, client_id: int = None, limit: int = 100, cursor: str = None,
+                               include_total: bool = False, include_raw: bool = True) -> Dict:
+        """Retorna uma página do histórico de consultas, mais recentes primeiro"""
+        where, params = ('client_id = ?', (client_id,)) if client_id else ('', ())
+        try:
+            with self.get_connection() as conn:
+                db_cursor = conn.cursor()
+                page = self._fetch_page(
+                    db_cursor, 'query_history', ['query_timestamp', 'id'], True,
+                    limit, cursor, where, params
+                )
+                self._resolve_statuses(db_cursor, page['items'])
+                page['items'] = self._attach_payloads(db_cursor, page['items'], include_raw)
+                if include_total:
+                    page['total'] = cached_count(
+                        f'{self.db_path}:query_history:{client_id}',
+                        lambda: db_cursor.execute(
+                            f"SELECT COUNT(*) FROM query_history {'WHERE ' + where if where else ''}", params
+                        ).fetchone()[0]
+                    )
+                return page
+        except ValueError:
+            raise
+        except Exception as e:
+            self.logger.error(f"Erro ao buscar página do histórico: {str(e)}")
+            raise
+    
+    def get_statuses(self) -> List[Dict]:
+        """Retorna o dicionário de status com o número de clientes em cada um"""
+        try:
+            with self.get_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    SELECT s.id, s.name, COALESCE(sc.client_count, 0) AS client_count
+                    FROM statuses s
+                    LEFT JOIN status_counts sc ON sc.status_id = s.id
+                    ORDER BY s.name
+                ''')
+                return [dict(row) for row in cursor.fetchall()]
+        except Exception as e:
+            self.logger.error(f"Erro ao buscar status: {str(e)}")
+            return []
+    
+    # MÉTODOS PARA PAYLOADS BRUTOS
+    
+    def _store_payload(self, cursor, payload: Any) -> Optional[str]:
+        """Grava o payload uma única vez e retorna o hash que o identifica"""
+        if not payload:
+            return None
+        payload_hash, codec, data, size = encode_payload(payload)
+        cursor.execute('''
+            INSERT OR IGNORE INTO payload_blobs (hash, codec, data, size)
+            VALUES (?, ?, ?, ?)
+        ''', (payload_hash, codec, data, size))
+        return payload_hash
+    
+    def _load_payloads(self, cursor, hashes: List[str]) -> Dict[str, Any]:
+        """Carrega e descomprime vários payloads em uma única consulta"""
+        if not hashes:
+            return {}
+        placeholders = ', '.join('?' * len(hashes))
+        cursor.execute(f'SELECT hash, codec, data FROM payload_blobs WHERE hash IN ({placeholders})', hashes)
+        payloads = {row['hash']: decode_payload(row['codec'], row['data']) for row in cursor.fetchall()}
+        
+        # Estados guardados apenas como delta são reconstruídos a partir do keyframe
+        for payload_hash in hashes:
+            if payload_hash not in payloads:
+                cursor.execute('''
+                    SELECT * FROM payload_snapshots WHERE payload_hash = ?
+                    ORDER BY id DESC LIMIT 1
+                ''', (payload_hash,))
+                snapshot = cursor.fetchone()
+                if snapshot:
+                    payloads[payload_hash] = self._reconstruct_snapshot(cursor, snapshot)
+        return payloads
+    
+    def _store_snapshot(self, cursor, process_number: str, process_year: int, payload: Any) -> Optional[str]:
+        """
+        Acrescenta o payload à cadeia de snapshots do processo
+        
+        Payload igual ao último snapshot não grava nada. Caso contrário é
+        gravado um delta em relação ao snapshot anterior, ou um keyframe
+        completo quando a cadeia atinge SNAPSHOT_KEYFRAME_INTERVAL ou o
+        delta não é menor que metade do payload comprimido.
+        """
+        if not payload:
+            return None
+        
+        payload_hash, codec, data, size = encode_payload(payload)
+        cursor.execute('''
+            SELECT * FROM payload_snapshots
+            WHERE process_number = ? AND process_year = ?
+            ORDER BY captured_at DESC, id DESC LIMIT 1
+        ''', (process_number, process_year))
+        last = cursor.fetchone()
+        
+        if last and last['payload_hash'] == payload_hash:
+            return payload_hash
+        
+        if last and last['chain_length'] + 1 < SNAPSHOT_KEYFRAME_INTERVAL:
+            patch = make_patch(self._reconstruct_snapshot(cursor, last), payload)
+            _, delta_codec, delta, _ = encode_payload(patch)
+            if len(delta) * 2 < len(data):
+                cursor.execute('''
+                    INSERT INTO payload_snapshots 
+                    (process_number, process_year, payload_hash, keyframe_id, chain_length, codec, delta)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                ''', (
+                    process_number, process_year, payload_hash,
+                    last['keyframe_id'] or last['id'], last['chain_length'] + 1,
+                    delta_codec, delta
+                ))
+                return payload_hash
+        
+        # Keyframe: o payload completo vai para a tabela de blobs
+        cursor.execute('''
+            INSERT OR IGNORE INTO payload_blobs (hash, codec, data, size)
+            VALUES (?, ?, ?, ?)
+        ''', (payload_hash, codec, data, size))
+        cursor.execute('''
+            INSERT INTO payload_snapshots (process_number, process_year, payload_hash, chain_length)
+            VALUES (?, ?, ?, 0)
+        ''', (process_number, process_year, payload_hash))
+        return payload_hash
+    
+    def _reconstruct_snapshot(self, cursor, snapshot) -> Any:
+        """Reconstrói um snapshot aplicando os deltas a partir do seu keyframe"""
+        keyframe_id = snapshot['keyframe_id'] or snapshot['id']
+        cursor.execute('''
+            SELECT b.codec, b.data FROM payload_snapshots s
+            JOIN payload_blobs b ON b.hash = s.payload_hash
+            WHERE s.id = ?
+        ''', (keyframe_id,))
+        keyframe = cursor.fetchone()
+        if not keyframe:
+            return None
+        
+        payload = decode_payload(keyframe['codec'], keyframe['data'])
+        cursor.execute('''
+            SELECT codec, delta FROM payload_snapshots
+            WHERE keyframe_id = ? AND id <= ?
+            ORDER BY id
+        ''', (keyframe_id, snapshot['id']))
+        for delta in cursor.fetchall():
+            payload = apply_patch(payload, decode_payload(delta['codec'], delta['delta']))
+        return payload
+    
+    def get_payload_as_of(self, process_number: str, process_year: int, as_of: str) -> Optional[Dict]:
+        """
+        Retorna o payload de um processo como estava em um determinado momento
+        
+        Args:
+            process_number: Número do processo
+            process_year: Ano do processo
+            as_of: Data (YYYY-MM-DD, inclui o dia inteiro) ou data/hora ISO em UTC
+        """
+        try:
+            if len(as_of) == 10:
+                as_of = f'{as_of} 23:59:59'
+            as_of = datetime.fromisoformat(as_of).strftime('%Y-%m-%d %H:%M:%S')
+        except ValueError:
+            raise ValueError("Data inválida. Use YYYY-MM-DD ou data/hora ISO")
+        
+        try:
+            with self.get_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    SELECT * FROM payload_snapshots
+                    WHERE process_number = ? AND process_year = ? AND captured_at <= ?
+                    ORDER BY captured_at DESC, id DESC LIMIT 1
+                ''', (process_number, process_year, as_of))
+                snapshot = cursor.fetchone()
+                if not snapshot:
+                    return None
+                
+                return {
+                    'process_number': process_number,
+                    'process_year': process_year,
+                    'captured_at': snapshot['captured_at'],
+                    'payload_hash': snapshot['payload_hash'],
+                    'payload': self._reconstruct_snapshot(cursor, snapshot)
+                }
+        except Exception as e:
+            self.logger.error(f"Erro ao reconstruir payload: {str(e)}")
+            return None
+    
+    def _attach_payloads(self, cursor, rows: List[Dict], include_raw: bool = True) -> List[Dict]:
+        """
+        Preenche raw_data das linhas do histórico
+        
+        Os payloads só são descomprimidos quando include_raw é True; caso
+        contrário as linhas trazem apenas o payload_hash, que pode ser
+        resolvido depois com get_payload.
+        """
+        if not include_raw:
+            for row in rows:
+                row.pop('raw_data', None)
+            return rows
+        
+        payloads = self._load_payloads(cursor, list({row['payload_hash'] for row in rows if row.get('payload_hash')}))
+        for row in rows:
+            if row.get('payload_hash'):
+                row['raw_data'] = payloads.get(row['payload_hash'])
+            elif row.get('raw_data'):
+                # Linhas antigas, anteriores ao armazenamento por hash
+                try:
+                    row['raw_data'] = json.loads(row['raw_data'])
+                except:
+                    pass
+        return rows
+    
+    def get_payload(self, payload_hash: str) -> Optional[Any]:
+        """Retorna um payload bruto pelo hash"""
+        try:
+            with self.get_connection() as conn:
+                cursor = conn.cursor()
+                return self._load_payloads(cursor, [payload_hash]).get(payload_hash)
+        except Exception as e:
+            self.logger.error(f"Erro ao buscar payload: {str(e)}")
+            return None
+    
+    def migrate_raw_payloads(self, batch_size: int = 500) -> Dict:
+        """
+        Move o raw_data em texto das linhas antigas para a tabela de blobs
+        
+        Processa em lotes curtos para não segurar o lock de escrita.
+        """
+        migrated = 0
+        try:
+            while True:
+                with self.get_connection() as conn:
+                    cursor = conn.cursor()
+                    cursor.execute('''
+                        SELECT id, raw_data FROM query_history
+                        WHERE raw_data IS NOT NULL
+                        LIMIT ?
+                    ''', (batch_size,))
+                    rows = cursor.fetchall()
+                    if not rows:
+                        break
+                    
+                    for row in rows:
                         try:
-                            result['raw_data'] = json.loads(result['raw_data'])
-                        except:
-                            pass
-                    results.append(result)
+                            payload = json.loads(row['raw_data'])
+                        except ValueError:
+                            payload = row['raw_data']
+                        cursor.execute('''
+                            UPDATE query_history SET payload_hash = ?, raw_data = NULL
+                            WHERE id = ?
+                        ''', (self._store_payload(cursor, payload), row['id']))
+                    conn.commit()
+                    migrated += len(rows)
+            
+            return {'migrated_rows': migrated}
+        except Exception as e:
+            self.logger.error(f"Erro ao migrar payloads: {str(e)}")
+            raise
+    
+    def vacuum(self):
+        """Devolve ao sistema de arquivos o espaço livre do banco"""
+        with self.get_connection() as conn:
+            conn.execute('VACUUM')
+    
+    # MÉTODOS PARA ESTADO DOS PROCESSOS
+    
+    def _index_process(self, cursor, process_number: str, process_year: int, payload: Dict, payload_hash: str):
+        """
+        Atualiza as tabelas normalizadas do processo a partir do payload
+        
+        Nada é gravado quando o payload é o mesmo já indexado.
+        """
+        cursor.execute('''
+            SELECT payload_hash FROM process_state
+            WHERE process_number = ? AND process_year = ?
+        ''', (process_number, process_year))
+        row = cursor.fetchone()
+        if row and row['payload_hash'] == payload_hash:
+            return
+        
+        key = (process_number, process_year)
+        documents = extract_documents(payload)
+        hearings = extract_hearings(payload)
+        state = extract_state(payload)
+        
+        cursor.execute('''
+            INSERT INTO process_state
+            (process_number, process_year, status_id, tribunal, judge, last_update,
+             next_hearing_at, document_count, payload_hash, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+            ON CONFLICT(process_number, process_year) DO UPDATE SET
+                status_id = excluded.status_id,
+                tribunal = excluded.tribunal,
+                judge = excluded.judge,
+                last_update = excluded.last_update,
+                next_hearing_at = excluded.next_hearing_at,
+                document_count = excluded.document_count,
+                payload_hash = excluded.payload_hash,
+                updated_at = CURRENT_TIMESTAMP
+        ''', key + (
+            self._intern_status(cursor, state['status']), state['tribunal'], state['judge'], state['last_update'],
+            state['next_hearing_at'], len(documents), payload_hash
+        ))
+        
+        # Documentos e audiências existentes mantêm first_seen_at
+        cursor.executemany('''
+            INSERT INTO process_documents
+            (process_number, process_year, doc_key, title, doc_type, filed_at)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT(process_number, process_year, doc_key) DO UPDATE SET
+                title = excluded.title,
+                doc_type = excluded.doc_type,
+                filed_at = excluded.filed_at
+        ''', [key + (doc['doc_key'], doc['title'], doc['doc_type'], doc['filed_at']) for doc in documents])
+        self._delete_missing(cursor, 'process_documents', 'doc_key', key, [doc['doc_key'] for doc in documents])
+        
+        cursor.executemany('''
+            INSERT INTO process_hearings
+            (process_number, process_year, hearing_key, hearing_at, description, raw_value)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT(process_number, process_year, hearing_key) DO UPDATE SET
+                hearing_at = excluded.hearing_at,
+                description = excluded.description,
+                raw_value = excluded.raw_value
+        ''', [
+            key + (hearing['hearing_key'], hearing['hearing_at'], hearing['description'], hearing['raw_value'])
+            for hearing in hearings
+        ])
+        self._delete_missing(cursor, 'process_hearings', 'hearing_key', key, [h['hearing_key'] for h in hearings])
+        
+        self._index_parties(cursor, process_number, process_year, payload)
+    
+    def _delete_missing(self, cursor, table: str, key_column: str, process_key: tuple, keys: List[str]):
+        """Remove os itens do processo que não vieram no payload atual"""
+        placeholders = ', '.join('?' * len(keys))
+        condition = f' AND {key_column} NOT IN ({placeholders})' if keys else ''
+        cursor.execute(
+            f'DELETE FROM {table} WHERE process_number = ? AND process_year = ?{condition}',
+            list(process_key) + keys
+        )
+    
+    def get_process_state(self, process_number: str, process_year: int) -> Optional[Dict]:
+        """Retorna o estado atual do processo com documentos e audiências"""
+        try:
+            with self.get_connection() as conn:
+                cursor = conn.cursor()
+                key = (process_number, process_year)
+                cursor.execute('''
+                    SELECT * FROM process_state WHERE process_number = ? AND process_year = ?
+                ''', key)
+                state = cursor.fetchone()
+                if not state:
+                    return None
                 
-                return results
+                result = self._resolve_statuses(cursor, [dict(state)])[0]
+                cursor.execute('''
+                    SELECT doc_key, title, doc_type, filed_at, first_seen_at FROM process_documents
+                    WHERE process_number = ? AND process_year = ?
+                    ORDER BY filed_at DESC, first_seen_at DESC
+                ''', key)
+                result['documents'] = [dict(row) for row in cursor.fetchall()]
+                cursor.execute('''
+                    SELECT hearing_key, hearing_at, description, raw_value, first_seen_at FROM process_hearings
+                    WHERE process_number = ? AND process_year = ?
+                    ORDER BY hearing_at
+                ''', key)
+                result['hearings'] = [dict(row) for row in cursor.fetchall()]
+                return result
         except Exception as e:
-            self.logger.error(f"Erro ao buscar histórico: {str(e)}")
+            self.logger.error(f"Erro ao buscar estado do processo: {str(e)}")
+            return None
+    
+    def get_recent_documents(self, since: str, limit: int = 100) -> List[Dict]:
+        """
+        Documentos que apareceram nos processos a partir de uma data
+        
+        Args:
+            since: Data/hora em UTC ('YYYY-MM-DD' ou 'YYYY-MM-DD HH:MM:SS')
+        """
+        try:
+            with self.get_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    SELECT d.*, c.id AS client_id, c.name AS client_name
+                    FROM process_documents d
+                    LEFT JOIN clients c
+                        ON c.process_number = d.process_number AND c.process_year = d.process_year
+                    WHERE d.first_seen_at >= ?
+                    ORDER BY d.first_seen_at DESC
+                    LIMIT ?
+                ''', (since, limit))
+                return [dict(row) for row in cursor.fetchall()]
+        except Exception as e:
+            self.logger.error(f"Erro ao buscar documentos recentes: {str(e)}")
+            return []
+    
+    def get_hearings_calendar(self, start: str, end: str, limit: int = 200, cursor: str = None) -> Dict:
+        """
+        Audiências entre duas datas, agrupadas por dia
+        
+        A busca percorre o índice de hearing_at pela chave (keyset), então o
+        custo depende só do tamanho da página e não do número de processos.
+        
+        Args:
+            start: Primeiro dia (YYYY-MM-DD)
+            end: Último dia, inclusive (YYYY-MM-DD)
+            limit: Número máximo de audiências na página
+            cursor: Cursor opaco da página anterior
+        """
+        try:
+            start_day = datetime.strptime(start, '%Y-%m-%d')
+            end_day = datetime.strptime(end, '%Y-%m-%d') + timedelta(days=1)
+        except ValueError:
+            raise ValueError("Data inválida. Use YYYY-MM-DD")
+        if end_day <= start_day:
+            raise ValueError("A data final deve ser posterior à inicial")
+        
+        try:
+            with self.get_connection() as conn:
+                db_cursor = conn.cursor()
+                page = self._fetch_page(
+                    db_cursor, 'process_hearings',
+                    ['hearing_at', 'process_number', 'process_year', 'hearing_key'], False, limit, cursor,
+                    'hearing_at >= ? AND hearing_at < ?',
+                    (start_day.strftime('%Y-%m-%d %H:%M:%S'), end_day.strftime('%Y-%m-%d %H:%M:%S'))
+                )
+                hearings = page.pop('items')
+                
+                # Nomes dos clientes da página em uma única consulta
+                clients = {}
+                processes = {(h['process_number'], h['process_year']) for h in hearings}
+                if processes:
+                    db_cursor.execute(f'''
+                        SELECT id, name, process_number, process_year FROM clients
+                        WHERE (process_number, process_year) IN (VALUES {', '.join(['(?, ?)'] * len(processes))})
+                    ''', [value for process in processes for value in process])
+                    clients = {(row['process_number'], row['process_year']): row for row in db_cursor.fetchall()}
+                
+                days = []
+                for hearing in hearings:
+                    client = clients.get((hearing['process_number'], hearing['process_year']))
+                    hearing['client_id'] = client['id'] if client else None
+                    hearing['client_name'] = client['name'] if client else None
+                    day = hearing['hearing_at'][:10]
+                    if not days or days[-1]['date'] != day:
+                        days.append({'date': day, 'hearings': []})
+                    days[-1]['hearings'].append(hearing)
+                
+                page['days'] = days
+                return page
+        except ValueError:
+            raise
+        except Exception as e:
+            self.logger.error(f"Erro ao buscar calendário de audiências: {str(e)}")
+            raise
+    
+    def rebuild_process_index(self) -> int:
+        """
+        Reconstrói estado, documentos, audiências e partes a partir do
+        último snapshot de cada processo
+        
+        Returns:
+            Número de processos indexados
+        """
+        try:
+            with self.get_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute('UPDATE process_state SET payload_hash = NULL')
+                cursor.execute('''
+                    SELECT * FROM payload_snapshots
+                    WHERE id IN (
+                        SELECT MAX(id) FROM payload_snapshots
+                        GROUP BY process_number, process_year
+                    )
+                ''')
+                snapshots = cursor.fetchall()
+                for snapshot in snapshots:
+                    payload = self._reconstruct_snapshot(cursor, snapshot)
+                    if payload:
+                        self._index_process(
+                            cursor, snapshot['process_number'], snapshot['process_year'],
+                            payload, snapshot['payload_hash']
+                        )
+                conn.commit()
+                return len(snapshots)
+        except Exception as e:
+            self.logger.error(f"Erro ao reconstruir índice dos processos: {str(e)}")
+            raise
+    
+    # MÉTODOS PARA PARTES DOS PROCESSOS
+    
+    def _index_parties(self, cursor, process_number: str, process_year: int, payload: Any):
+        """Atualiza as partes do processo quando a lista 'parti' muda"""
+        parties = extract_parties(payload)
+        
+        cursor.execute('''
+            SELECT normalized_name, role FROM process_parties
+            WHERE process_number = ? AND process_year = ?
+        ''', (process_number, process_year))
+        current = {(row['normalized_name'], row['role']) for row in cursor.fetchall()}
+        if current == {(normalized, role) for _, normalized, role in parties}:
+            return
+        
+        cursor.execute('''
+            DELETE FROM process_party_tokens WHERE party_id IN (
+                SELECT id FROM process_parties WHERE process_number = ? AND process_year = ?
+            )
+        ''', (process_number, process_year))
+        cursor.execute('''
+            DELETE FROM process_parties WHERE process_number = ? AND process_year = ?
+        ''', (process_number, process_year))
+        
+        for name, normalized, role in parties:
+            cursor.execute('''
+                INSERT INTO process_parties (process_number, process_year, name, normalized_name, role)
+                VALUES (?, ?, ?, ?, ?)
+            ''', (process_number, process_year, name, normalized, role))
+            party_id = cursor.lastrowid
+            cursor.executemany('''
+                INSERT OR IGNORE INTO process_party_tokens (token, party_id) VALUES (?, ?)
+            ''', [(token, party_id) for token in normalized.split()])
+    
+    def search_parties(self, name: str, limit: int = 50) -> List[Dict]:
+        """
+        Busca processos que envolvem uma parte
+        
+        Cada palavra do nome, sem acentos e em minúsculas, é buscada como
+        prefixo no índice de palavras (busca por intervalo), e a parte
+        precisa conter todas elas, em qualquer ordem: 'rossi mar' encontra
+        'ROSSI Mario' e 'Mario Rossi'.
+        """
+        tokens = sorted(set(name_tokens(name)), key=len, reverse=True)
+        if not tokens:
+            return []
+        
+        conditions = []
+        params = []
+        for token in tokens:
+            conditions.append(
+                'p.id IN (SELECT party_id FROM process_party_tokens WHERE token >= ? AND token < ?)'
+            )
+            params.extend([token, token[:-1] + chr(ord(token[-1]) + 1)])
+        
+        try:
+            with self.get_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    SELECT p.name, p.role, p.process_number, p.process_year,
+                           c.id AS client_id, c.name AS client_name
+                    FROM process_parties p
+                    LEFT JOIN clients c
+                        ON c.process_number = p.process_number AND c.process_year = p.process_year
+                    WHERE ''' + ' AND '.join(conditions) + '''
+                    ORDER BY p.normalized_name, p.process_year, p.process_number
+                    LIMIT ?
+                ''', params + [limit])
+                return [dict(row) for row in cursor.fetchall()]
+        except Exception as e:
+            self.logger.error(f"Erro ao buscar partes: {str(e)}")
             return []
     
     # MÉTODOS PARA NOTIFICAÇÕES
@@ -397,22 +1931,69 @@ class Database:
             with self.get_connection() as conn:
                 cursor = conn.cursor()
                 cursor.execute('''
-                    INSERT INTO notifications (type, title, message, client_name, process_number, read)
-                    VALUES (?, ?, ?, ?, ?, ?)
+                    INSERT INTO notifications (type, title, message, client_id, client_name, process_number, read)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
                 ''', (
                     notification_data['type'],
                     notification_data['title'],
                     notification_data['message'],
+                    notification_data.get('client_id'),
                     notification_data.get('client_name'),
                     notification_data.get('process_number'),
                     notification_data.get('read', False)
                 ))
+                notification_id = cursor.lastrowid
+                if not notification_data.get('read', False):
+                    self._shift_unread(cursor, notification_data.get('client_id'), 1)
                 conn.commit()
-                return cursor.lastrowid
+                return notification_id
         except Exception as e:
             self.logger.error(f"Erro ao criar notificação: {str(e)}")
             raise
     
+    def create_notifications(self, notifications: List[Dict]) -> List[int]:
+        """
+        Cria várias notificações em uma única transação
+        
+        Os contadores de não lidas são ajustados uma vez por cliente, não por
+        notificação.
+        
+        Returns:
+            Ids das notificações, na ordem recebida
+        """
+        if not notifications:
+            return []
+        try:
+            with self.get_connection() as conn:
+                cursor = conn.cursor()
+                ids = []
+                unread = {}
+                for notification_data in notifications:
+                    cursor.execute('''
+                        INSERT INTO notifications (type, title, message, client_id, client_name, process_number, read)
+                        VALUES (?, ?, ?, ?, ?, ?, ?)
+                    ''', (
+                        notification_data['type'],
+                        notification_data['title'],
+                        notification_data['message'],
+                        notification_data.get('client_id'),
+                        notification_data.get('client_name'),
+                        notification_data.get('process_number'),
+                        notification_data.get('read', False)
+                    ))
+                    ids.append(cursor.lastrowid)
+                    if not notification_data.get('read', False):
+                        client_id = notification_data.get('client_id')
+                        unread[client_id] = unread.get(client_id, 0) + 1
+                
+                for client_id, count in unread.items():
+                    self._shift_unread(cursor, client_id, count)
+                conn.commit()
+                return ids
+        except Exception as e:
+            self.logger.error(f"Erro ao criar notificações em lote: {str(e)}")
+            raise
+    
     def get_all_notifications(self) -> List[Dict]:
         """Retorna todas as notificações"""
         try:
@@ -424,14 +2005,50 @@ class Database:
             self.logger.error(f"Erro ao buscar notificações: {str(e)}")
             return []
     
+    def get_unread_count(self) -> int:
+        """Total de notificações não lidas (contador agregado)"""
+        try:
+            with self.get_connection() as conn:
+                row = conn.execute("SELECT value FROM stats_counters WHERE name = 'unread_notifications'").fetchone()
+                return row[0] if row else 0
+        except Exception as e:
+            self.logger.error(f"Erro ao contar notificações não lidas: {str(e)}")
+            return 0
+    
+    def get_notifications_page(self, limit: int = 50, cursor: str = None, include_total: bool = False) -> Dict:
+        """Retorna uma página de notificações, mais recentes primeiro"""
+        try:
+            with self.get_connection() as conn:
+                db_cursor = conn.cursor()
+                page = self._fetch_page(db_cursor, 'notifications', ['created_at', 'id'], True, limit, cursor)
+                if include_total:
+                    page['total'] = cached_count(
+                        f'{self.db_path}:notifications',
+                        lambda: db_cursor.execute('SELECT COUNT(*) FROM notifications').fetchone()[0]
+                    )
+                return page
+        except ValueError:
+            raise
+        except Exception as e:
+            self.logger.error(f"Erro ao buscar página de notificações: {str(e)}")
+            raise
+    
     def mark_notification_read(self, notification_id: int) -> bool:
         """Marca notificação como lida"""
         try:
             with self.get_connection() as conn:
                 cursor = conn.cursor()
+                cursor.execute('SELECT read, client_id FROM notifications WHERE id = ?', (notification_id,))
+                row = cursor.fetchone()
+                if not row:
+                    return False
+                if row['read']:
+                    return True
+                
                 cursor.execute('UPDATE notifications SET read = TRUE WHERE id = ?', (notification_id,))
+                self._shift_unread(cursor, row['client_id'], -1)
                 conn.commit()
-                return cursor.rowcount > 0
+                return True
         except Exception as e:
             self.logger.error(f"Erro ao marcar notificação: {str(e)}")
             return False
@@ -441,9 +2058,16 @@ class Database:
         try:
             with self.get_connection() as conn:
                 cursor = conn.cursor()
+                cursor.execute('SELECT read, client_id FROM notifications WHERE id = ?', (notification_id,))
+                row = cursor.fetchone()
+                if not row:
+                    return False
+                
                 cursor.execute('DELETE FROM notifications WHERE id = ?', (notification_id,))
+                if not row['read']:
+                    self._shift_unread(cursor, row['client_id'], -1)
                 conn.commit()
-                return cursor.rowcount > 0
+                return True
         except Exception as e:
             self.logger.error(f"Erro ao excluir notificação: {str(e)}")
             return False
@@ -454,12 +2078,293 @@ class Database:
             with self.get_connection() as conn:
                 cursor = conn.cursor()
                 cursor.execute('DELETE FROM notifications')
+                self._set_counter(cursor, 'unread_notifications', 0)
+                cursor.execute('UPDATE clients SET unread_notifications = 0 WHERE unread_notifications != 0')
                 conn.commit()
                 return True
         except Exception as e:
             self.logger.error(f"Erro ao limpar notificações: {str(e)}")
             return False
     
+    def mark_notifications_read(self, ids: List[int] = None, filters: Dict = None,
+                                select_all: bool = False) -> int:
+        """
+        Marca como lidas, em lote, as notificações selecionadas por ids e/ou filtros
+        
+        Os não lidos dos clientes são ajustados em uma instrução e o UPDATE das
+        notificações é outra, na mesma transação.
+        
+        Args:
+            ids: Ids das notificações
+            filters: 'client_id', 'type', 'read' e/ou 'before' (data ISO)
+            select_all: Sem ids nem filtros, confirma que todas serão afetadas
+        
+        Returns:
+            Número de notificações marcadas (as já lidas não contam)
+        """
+        try:
+            with self.get_connection() as conn:
+                cursor = conn.cursor()
+                where, params = self._notification_scope(ids, filters, select_all)
+                where = f'NOT read AND {where}'
+                self._shift_unread_in_scope(cursor, where, params)
+                cursor.execute(f'UPDATE notifications SET read = TRUE WHERE {where}', params)
+                marked = cursor.rowcount
+                self._bump_counter(cursor, 'unread_notifications', -marked)
+                conn.commit()
+                return marked
+        except ValueError:
+            raise
+        except Exception as e:
+            self.logger.error(f"Erro ao marcar notificações em lote: {str(e)}")
+            raise
+    
+    def delete_notifications(self, ids: List[int] = None, filters: Dict = None,
+                             select_all: bool = False) -> int:
+        """
+        Exclui em lote as notificações selecionadas por ids e/ou filtros
+        
+        Mesmos argumentos de mark_notifications_read().
+        
+        Returns:
+            Número de notificações excluídas
+        """
+        try:
+            with self.get_connection() as conn:
+                cursor = conn.cursor()
+                where, params = self._notification_scope(ids, filters, select_all)
+                self._shift_unread_in_scope(cursor, f'NOT read AND {where}', params)
+                cursor.execute(f'SELECT COUNT(*) FROM notifications WHERE NOT read AND {where}', params)
+                unread = cursor.fetchone()[0]
+                cursor.execute(f'DELETE FROM notifications WHERE {where}', params)
+                deleted = cursor.rowcount
+                self._bump_counter(cursor, 'unread_notifications', -unread)
+                conn.commit()
+                return deleted
+        except ValueError:
+            raise
+        except Exception as e:
+            self.logger.error(f"Erro ao excluir notificações em lote: {str(e)}")
+            raise
+    
+    def _notification_scope(self, ids: Optional[List[int]], filters: Optional[Dict],
+                             select_all: bool) -> Tuple[str, list]:
+        """Condição WHERE de uma operação em lote de notificações"""
+        filters = filters or {}
+        conditions, params = self._ids_condition(ids)
+        if filters.get('client_id') is not None:
+            conditions.append('client_id = ?')
+            params.append(int(filters['client_id']))
+        if filters.get('type'):
+            conditions.append('type = ?')
+            params.append(filters['type'])
+        if filters.get('read') is not None:
+            conditions.append('read = ?')
+            params.append(bool(filters['read']))
+        if filters.get('before'):
+            try:
+                before = datetime.fromisoformat(str(filters['before']))
+            except ValueError:
+                raise ValueError("Filtro 'before' deve ser uma data ISO")
+            conditions.append('created_at < ?')
+            params.append(before.strftime('%Y-%m-%d %H:%M:%S'))
+        return self._scope_clause(conditions, params, select_all)
+    
+    def _shift_unread_in_scope(self, cursor, where: str, params: list):
+        """Desconta dos clientes as não lidas que a condição seleciona (uma instrução)"""
+        # Primeira escrita da transação: as instruções seguintes veem o mesmo estado
+        cursor.execute(f'''
+            UPDATE clients SET unread_notifications = MAX(unread_notifications - (
+                SELECT COUNT(*) FROM notifications WHERE notifications.client_id = clients.id AND {where}
+            ), 0)
+            WHERE id IN (SELECT client_id FROM notifications WHERE {where})
+        ''', params + params)
+    
+    # MÉTODOS DE EXPORTAÇÃO
+    
+    def prepare_export(self, dataset: str, filters: Dict = None) -> Dict:
+        """
+        Valida o conjunto e os filtros de uma exportação, antes de começar o stream
+        
+        Args:
+            dataset: 'clients', 'history' ou 'notifications'
+            filters: Filtros do conjunto (ver EXPORT_DATASETS), 'status' quando o
+                conjunto tem status e 'since'/'until' (datas ISO, until exclusivo)
+        
+        Returns:
+            Exportação pronta para iter_export_rows(), com as colunas em 'columns'
+        """
+        spec = EXPORT_DATASETS.get(dataset)
+        if not spec:
+            raise ValueError(f"Conjunto inválido (use {', '.join(EXPORT_DATASETS)})")
+        
+        conditions, params = [], []
+        for name, value in (filters or {}).items():
+            if value in (None, ''):
+                continue
+            if name == 'status' and spec['status_column']:
+                with self.get_connection() as conn:
+                    status_id = self._status_id_for(conn.cursor(), value)
+                conditions.append(f"{spec['status_column']} = ?" if status_id is not None else '0')
+                params.extend([status_id] if status_id is not None else [])
+            elif name in ('since', 'until'):
+                try:
+                    moment = datetime.fromisoformat(str(value))
+                except ValueError:
+                    raise ValueError(f"Filtro '{name}' deve ser uma data ISO")
+                conditions.append(f"{spec['date_column']} {'>=' if name == 'since' else '<'} ?")
+                params.append(moment.strftime('%Y-%m-%d %H:%M:%S'))
+            elif name in spec['filters']:
+                condition, convert = spec['filters'][name]
+                try:
+                    params.append(convert(value))
+                except (ValueError, TypeError):
+                    raise ValueError(f"Filtro '{name}' inválido")
+                conditions.append(condition)
+            else:
+                raise ValueError(f"Filtro '{name}' não suportado em {dataset}")
+        
+        return {
+            'dataset': dataset,
+            'columns': [label for label, _ in spec['columns']],
+            'sql': f'''
+                SELECT {', '.join(expression for _, expression in spec['columns'])}
+                FROM {spec['from']}
+                WHERE {spec['key']} > ? {''.join(f' AND {condition}' for condition in conditions)}
+                ORDER BY {spec['key']}
+                LIMIT ?
+            ''',
+            'params': params
+        }
+    
+    def iter_export_rows(self, export: Dict, batch_size: int = EXPORT_BATCH_SIZE) -> Iterator[List[tuple]]:
+        """
+        Percorre as linhas de uma exportação em lotes, pela chave primária
+        
+        Cada lote usa uma conexão curta, então o stream não segura uma
+        transação de leitura aberta e a memória não depende do total de linhas.
+        A primeira coluna de cada conjunto é o id.
+        """
+        last_id = 0
+        while True:
+            try:
+                with self.get_connection() as conn:
+                    rows = conn.execute(export['sql'], [last_id, *export['params'], batch_size]).fetchall()
+            except Exception as e:
+                self.logger.error(f"Erro ao exportar {export['dataset']}: {str(e)}")
+                raise
+            if not rows:
+                return
+            yield [tuple(row) for row in rows]
+            if len(rows) < batch_size:
+                return
+            last_id = rows[-1][0]
+    
+    # MÉTODOS DO LOG DE MUDANÇAS
+    
+    def get_changes(self, since: int = 0, limit: int = 500) -> Dict:
+        """
+        Retorna as mudanças posteriores a um número de sequência
+        
+        Várias mudanças da mesma entidade no lote viram uma só, com a última
+        operação e os dados atuais da linha (None para exclusões).
+        
+        Args:
+            since: Último seq já processado pelo consumidor (0 para o início)
+            limit: Máximo de entradas do log lidas por chamada
+        
+        Returns:
+            Dicionário com as mudanças, o próximo 'since' e se há mais entradas.
+            Se o log já foi podado além de 'since', 'reset' vem True e o
+            consumidor deve recarregar tudo e continuar a partir de 'next_since'.
+        """
+        try:
+            with self.get_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    SELECT COALESCE(
+                        (SELECT MIN(seq) FROM change_log),
+                        (SELECT seq + 1 FROM sqlite_sequence WHERE name = 'change_log'),
+                        1
+                    )
+                ''')
+                first_seq = cursor.fetchone()[0]
+                if since + 1 < first_seq:
+                    cursor.execute("SELECT COALESCE(MAX(seq), 0) FROM sqlite_sequence WHERE name = 'change_log'")
+                    return {'reset': True, 'changes': [], 'next_since': cursor.fetchone()[0], 'has_more': False}
+                
+                cursor.execute('''
+                    SELECT seq, entity, entity_id, operation, changed_at FROM change_log
+                    WHERE seq > ?
+                    ORDER BY seq
+                    LIMIT ?
+                ''', (since, limit + 1))
+                entries = [dict(row) for row in cursor.fetchall()]
+                has_more = len(entries) > limit
+                entries = entries[:limit]
+                
+                latest = {}
+                for entry in entries:
+                    latest.pop((entry['entity'], entry['entity_id']), None)
+                    latest[(entry['entity'], entry['entity_id'])] = entry
+                
+                rows = self._changed_rows(cursor, [
+                    entry for entry in latest.values() if entry['operation'] != 'delete'
+                ])
+                changes = []
+                for key, entry in latest.items():
+                    entry['data'] = rows.get(key)
+                    entry['id'] = entry.pop('entity_id')
+                    changes.append(entry)
+                
+                return {
+                    'reset': False,
+                    'changes': changes,
+                    'next_since': entries[-1]['seq'] if entries else since,
+                    'has_more': has_more
+                }
+        except Exception as e:
+            self.logger.error(f"Erro ao buscar mudanças: {str(e)}")
+            raise
+    
+    def _changed_rows(self, cursor, entries: List[Dict]) -> Dict:
+        """Carrega em lote os dados atuais das entidades alteradas"""
+        ids = {}
+        for entry in entries:
+            ids.setdefault(entry['entity'], []).append(entry['entity_id'])
+        
+        rows = {}
+        for entity, entity_ids in ids.items():
+            placeholders = ', '.join('?' * len(entity_ids))
+            if entity == 'client':
+                cursor.execute(f'SELECT * FROM clients WHERE id IN ({placeholders})', entity_ids)
+                items = self._resolve_statuses(cursor, [dict(row) for row in cursor.fetchall()], 'current_status')
+            elif entity == 'notification':
+                cursor.execute(f'SELECT * FROM notifications WHERE id IN ({placeholders})', entity_ids)
+                items = [dict(row) for row in cursor.fetchall()]
+            else:
+                cursor.execute(
+                    f'SELECT {QUERY_RESULT_COLUMNS} FROM query_history WHERE id IN ({placeholders})', entity_ids
+                )
+                items = self._resolve_statuses(cursor, [dict(row) for row in cursor.fetchall()])
+            rows.update({(entity, item['id']): item for item in items})
+        return rows
+    
+    def prune_change_log(self, days: int = 30) -> int:
+        """Remove entradas do log de mudanças mais antigas que 'days' dias"""
+        try:
+            with self.get_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(
+                    "DELETE FROM change_log WHERE changed_at < DATETIME('now', ?)",
+                    (f'-{int(days)} days',)
+                )
+                conn.commit()
+                return cursor.rowcount
+        except Exception as e:
+            self.logger.error(f"Erro ao podar log de mudanças: {str(e)}")
+            return 0
+    
     # MÉTODOS PARA CONFIGURAÇÕES
     
     def get_settings(self) -> Dict:
@@ -509,43 +2414,42 @@ class Database:
     # MÉTODOS PARA ESTATÍSTICAS
     
     def get_dashboard_stats(self) -> Dict:
-        """Retorna estatísticas para o dashboard"""
+        """
+        Retorna estatísticas para o dashboard
+        
+        Uma única consulta, somente leitura, sobre os agregados mantidos nas
+        escritas (stats_counters, daily_query_stats e status_counts).
+        """
         try:
             with self.get_connection() as conn:
                 cursor = conn.cursor()
-                
-                # Total de clientes
-                cursor.execute('SELECT COUNT(*) FROM clients')
-                total_clients = cursor.fetchone()[0]
-                
-                # Consultas hoje
                 cursor.execute('''
-                    SELECT COUNT(*) FROM query_history 
-                    WHERE DATE(query_timestamp) = DATE('now')
+                    SELECT
+                        COALESCE((SELECT value FROM stats_counters WHERE name = 'total_clients'), 0) AS total_clients,
+                        COALESCE((SELECT total_queries FROM daily_query_stats WHERE day = DATE('now')), 0) AS queries_today,
+                        COALESCE((SELECT value FROM stats_counters WHERE name = 'changes_detected'), 0) AS changes_detected,
+                        COALESCE((SELECT value FROM stats_counters WHERE name = 'unread_notifications'), 0) AS unread_notifications,
+                        (
+                            SELECT json_group_array(json_object('status', status, 'count', count)) FROM (
+                                SELECT s.name AS status, sc.client_count AS count
+                                FROM status_counts sc
+                                JOIN statuses s ON s.id = sc.status_id
+                                WHERE sc.client_count > 0
+                                ORDER BY sc.client_count DESC
+                            )
+                        ) AS status_distribution
                 ''')
-                queries_today = cursor.fetchone()[0]
-                
-                # Mudanças detectadas
-                cursor.execute('SELECT COUNT(*) FROM query_history WHERE has_changes = TRUE')
-                changes_detected = cursor.fetchone()[0]
-                
-                # Notificações não lidas
-                cursor.execute('SELECT COUNT(*) FROM notifications WHERE read = FALSE')
-                unread_notifications = cursor.fetchone()[0]
-                
-                return {
-                    'total_clients': total_clients,
-                    'queries_today': queries_today,
-                    'changes_detected': changes_detected,
-                    'unread_notifications': unread_notifications
-                }
+                stats = dict(cursor.fetchone())
+                stats['status_distribution'] = json.loads(stats['status_distribution'])
+                return stats
         except Exception as e:
             self.logger.error(f"Erro ao buscar estatísticas: {str(e)}")
             return {
                 'total_clients': 0,
                 'queries_today': 0,
                 'changes_detected': 0,
-                'unread_notifications': 0
+                'unread_notifications': 0,
+                'status_distribution': []
             }
     
     def get_recent_updates(self, limit: int = 10) -> List[Dict]:
@@ -559,7 +2463,7 @@ class Database:
                         c.name as client_name,
                         qh.process_number,
                         qh.process_year,
-                        qh.status as status_change,
+                        s.name as status_change,
                         qh.query_timestamp as updated_at,
                         CASE 
                             WHEN qh.has_changes THEN 'alta'
@@ -568,6 +2472,7 @@ class Database:
                         END as priority
                     FROM query_history qh
                     LEFT JOIN clients c ON qh.client_id = c.id
+                    LEFT JOIN statuses s ON s.id = qh.status_id
                     WHERE qh.success = TRUE
                     ORDER BY qh.query_timestamp DESC
                     LIMIT ?
@@ -577,4 +2482,264 @@ class Database:
         except Exception as e:
             self.logger.error(f"Erro ao buscar atualizações recentes: {str(e)}")
             return []
-
+    
+    # MÉTODOS PARA AGREGADOS
+    
+    def _bump_counter(self, cursor, name: str, delta: int = 1):
+        """Incrementa um contador agregado na mesma transação da escrita"""
+        cursor.execute('''
+            INSERT INTO stats_counters (name, value) VALUES (?, ?)
+            ON CONFLICT(name) DO UPDATE SET
+                value = value + excluded.value,
+                updated_at = CURRENT_TIMESTAMP
+        ''', (name, delta))
+    
+    def _set_counter(self, cursor, name: str, value: int):
+        """Define o valor absoluto de um contador agregado"""
+        cursor.execute('''
+            INSERT OR REPLACE INTO stats_counters (name, value, updated_at)
+            VALUES (?, ?, CURRENT_TIMESTAMP)
+        ''', (name, value))
+    
+    def _shift_unread(self, cursor, client_id: Optional[int], delta: int):
+        """Ajusta o total de notificações não lidas, global e do cliente"""
+        self._bump_counter(cursor, 'unread_notifications', delta)
+        if client_id:
+            cursor.execute('''
+                UPDATE clients SET unread_notifications = MAX(unread_notifications + ?, 0)
+                WHERE id = ?
+            ''', (delta, client_id))
+    
+    def _shift_status(self, cursor, old_status_id: Optional[int], new_status_id: Optional[int]):
+        """Move um cliente de um status para outro na distribuição"""
+        if old_status_id == new_status_id:
+            return
+        if old_status_id is not None:
+            cursor.execute('''
+                UPDATE status_counts SET client_count = client_count - 1
+                WHERE status_id = ?
+            ''', (old_status_id,))
+        if new_status_id is not None:
+            cursor.execute('''
+                INSERT INTO status_counts (status_id, client_count) VALUES (?, 1)
+                ON CONFLICT(status_id) DO UPDATE SET client_count = client_count + 1
+            ''', (new_status_id,))
+    
+    def _record_query_stats(self, cursor, query_data: Dict, status_id: Optional[int] = None):
+        """Atualiza os agregados a partir de um resultado de consulta"""
+        success = 1 if query_data['success'] else 0
+        changes = 1 if query_data.get('has_changes') else 0
+        
+        cursor.execute('''
+            INSERT INTO daily_query_stats 
+            (day, total_queries, successful_queries, failed_queries, changes_detected)
+            VALUES (DATE('now'), 1, ?, ?, ?)
+            ON CONFLICT(day) DO UPDATE SET
+                total_queries = total_queries + 1,
+                successful_queries = successful_queries + excluded.successful_queries,
+                failed_queries = failed_queries + excluded.failed_queries,
+                changes_detected = changes_detected + excluded.changes_detected
+        ''', (success, 1 - success, changes))
+        
+        if changes:
+            self._bump_counter(cursor, 'changes_detected')
+        
+        if query_data.get('credential_id'):
+            cursor.execute('''
+                INSERT INTO credential_query_stats 
+                (credential_id, total_queries, successful_queries, failed_queries, last_query_at)
+                VALUES (?, 1, ?, ?, CURRENT_TIMESTAMP)
+                ON CONFLICT(credential_id) DO UPDATE SET
+                    total_queries = total_queries + 1,
+                    successful_queries = successful_queries + excluded.successful_queries,
+                    failed_queries = failed_queries + excluded.failed_queries,
+                    last_query_at = excluded.last_query_at
+            ''', (query_data['credential_id'], success, 1 - success))
+        
+        # Resumo do cliente: última verificação, última mudança e último erro
+        if query_data.get('client_id'):
+            cursor.execute('''
+                UPDATE clients SET
+                    last_status_check = CURRENT_TIMESTAMP,
+                    last_status_change = CASE WHEN ? THEN CURRENT_TIMESTAMP ELSE last_status_change END,
+                    change_count = change_count + ?,
+                    last_error = CASE WHEN ? THEN last_error ELSE ? END,
+                    last_error_at = CASE WHEN ? THEN last_error_at ELSE CURRENT_TIMESTAMP END
+                WHERE id = ?
+            ''', (changes, changes, success, query_data.get('error'), success, query_data['client_id']))
+        
+        # Status atual do cliente e distribuição de status
+        if success and query_data.get('client_id') and status_id is not None:
+            cursor.execute('SELECT status_id FROM clients WHERE id = ?', (query_data['client_id'],))
+            row = cursor.fetchone()
+            if row and row['status_id'] != status_id:
+                cursor.execute('''
+                    UPDATE clients SET status_id = ? WHERE id = ?
+                ''', (status_id, query_data['client_id']))
+                self._shift_status(cursor, row['status_id'], status_id)
+                cursor.execute('''
+                    INSERT INTO status_transitions (client_id, from_status_id, to_status_id)
+                    VALUES (?, ?, ?)
+                ''', (query_data['client_id'], row['status_id'], status_id))
+    
+    def _rebuild_aggregates(self, cursor):
+        """Recalcula todos os agregados a partir das tabelas base"""
+        cursor.execute('DELETE FROM stats_counters')
+        cursor.execute('DELETE FROM daily_query_stats')
+        cursor.execute('DELETE FROM credential_query_stats')
+        cursor.execute('DELETE FROM status_counts')
+        
+        cursor.execute('''
+            INSERT INTO stats_counters (name, value)
+            SELECT 'total_clients', COUNT(*) FROM clients
+            UNION ALL
+            SELECT 'changes_detected', COUNT(*) FROM query_history WHERE has_changes = TRUE
+            UNION ALL
+            SELECT 'unread_notifications', COUNT(*) FROM notifications WHERE read = FALSE
+        ''')
+        
+        # Linhas já compactadas pela retenção continuam contando via archived_query_stats
+        cursor.execute('''
+            INSERT INTO daily_query_stats 
+            (day, total_queries, successful_queries, failed_queries, changes_detected)
+            SELECT day, SUM(total), SUM(successful), SUM(failed), SUM(changes) FROM (
+                SELECT DATE(query_timestamp) AS day, COUNT(*) AS total,
+                       SUM(CASE WHEN success THEN 1 ELSE 0 END) AS successful,
+                       SUM(CASE WHEN success THEN 0 ELSE 1 END) AS failed,
+                       SUM(CASE WHEN has_changes THEN 1 ELSE 0 END) AS changes
+                FROM query_history
+                GROUP BY DATE(query_timestamp)
+                UNION ALL
+                SELECT day, total_queries, successful_queries, failed_queries, 0
+                FROM archived_query_stats
+            )
+            GROUP BY day
+        ''')
+        
+        cursor.execute('''
+            INSERT INTO credential_query_stats 
+            (credential_id, total_queries, successful_queries, failed_queries, last_query_at)
+            SELECT credential_id, SUM(total), SUM(successful), SUM(failed), MAX(last_query_at) FROM (
+                SELECT credential_id, COUNT(*) AS total,
+                       SUM(CASE WHEN success THEN 1 ELSE 0 END) AS successful,
+                       SUM(CASE WHEN success THEN 0 ELSE 1 END) AS failed,
+                       MAX(query_timestamp) AS last_query_at
+                FROM query_history
+                WHERE credential_id IS NOT NULL
+                GROUP BY credential_id
+                UNION ALL
+                SELECT credential_id, total_queries, successful_queries, failed_queries, NULL
+                FROM archived_query_stats
+                WHERE credential_id != 0
+            )
+            GROUP BY credential_id
+        ''')
+        
+        # Status atual = último status obtido com sucesso para o cliente
+        cursor.execute('''
+            UPDATE clients SET status_id = COALESCE((
+                SELECT qh.status_id FROM query_history qh
+                WHERE qh.client_id = clients.id AND qh.success = TRUE AND qh.status_id IS NOT NULL
+                ORDER BY qh.query_timestamp DESC, qh.id DESC
+                LIMIT 1
+            ), status_id)
+        ''')
+        
+        cursor.execute('''
+            INSERT INTO status_counts (status_id, client_count)
+            SELECT status_id, COUNT(*) FROM clients
+            WHERE status_id IS NOT NULL
+            GROUP BY status_id
+        ''')
+        
+        # Resumo por cliente; datas de linhas já arquivadas pela retenção são preservadas
+        cursor.execute('''
+            WITH checks AS (
+                SELECT client_id,
+                       MAX(query_timestamp) AS last_check,
+                       MAX(CASE WHEN has_changes THEN query_timestamp END) AS last_change,
+                       SUM(CASE WHEN has_changes THEN 1 ELSE 0 END) AS changes
+                FROM query_history
+                WHERE client_id IS NOT NULL
+                GROUP BY client_id
+            ),
+            errors AS (
+                SELECT client_id, error, query_timestamp,
+                       ROW_NUMBER() OVER (
+                           PARTITION BY client_id ORDER BY query_timestamp DESC, id DESC
+                       ) AS position
+                FROM query_history
+                WHERE client_id IS NOT NULL AND success = FALSE
+            ),
+            unread AS (
+                SELECT client_id, COUNT(*) AS total FROM notifications
+                WHERE client_id IS NOT NULL AND read = FALSE
+                GROUP BY client_id
+            )
+            UPDATE clients SET
+                last_status_check = COALESCE(checks.last_check, clients.last_status_check),
+                last_status_change = COALESCE(checks.last_change, clients.last_status_change),
+                change_count = COALESCE(checks.changes, 0),
+                last_error = COALESCE(errors.error, clients.last_error),
+                last_error_at = COALESCE(errors.query_timestamp, clients.last_error_at),
+                unread_notifications = COALESCE(unread.total, 0)
+            FROM clients AS c
+            LEFT JOIN checks ON checks.client_id = c.id
+            LEFT JOIN errors ON errors.client_id = c.id AND errors.position = 1
+            LEFT JOIN unread ON unread.client_id = c.id
+            WHERE c.id = clients.id
+        ''')
+    
+    def _backfill_status_transitions(self, cursor):
+        """Preenche as transições a partir do histórico existente (uma única vez)"""
+        cursor.execute('''
+            INSERT INTO status_transitions (client_id, from_status_id, to_status_id, changed_at)
+            SELECT client_id, previous_status_id, status_id, query_timestamp FROM (
+                SELECT client_id, status_id, query_timestamp, id,
+                       LAG(status_id) OVER (
+                           PARTITION BY client_id ORDER BY query_timestamp, id
+                       ) AS previous_status_id
+                FROM query_history
+                WHERE client_id IS NOT NULL AND success = TRUE AND status_id IS NOT NULL
+            )
+            WHERE previous_status_id IS NOT status_id
+            ORDER BY query_timestamp, id
+        ''')
+    
+    def get_status_transitions(self, client_id: int = None) -> List[Dict]:
+        """
+        Retorna as transições de status em ordem cronológica
+        
+        Args:
+            client_id: Restringe a um cliente (todas se None)
+        """
+        try:
+            with self.get_connection() as conn:
+                cursor = conn.cursor()
+                if client_id:
+                    cursor.execute('''
+                        SELECT * FROM status_transitions
+                        WHERE client_id = ?
+                        ORDER BY changed_at, id
+                    ''', (client_id,))
+                else:
+                    cursor.execute('SELECT * FROM status_transitions ORDER BY client_id, changed_at, id')
+                rows = [dict(row) for row in cursor.fetchall()]
+                self._resolve_statuses(cursor, rows, 'from_status', 'from_status_id')
+                return self._resolve_statuses(cursor, rows, 'to_status', 'to_status_id')
+        except Exception as e:
+            self.logger.error(f"Erro ao buscar transições de status: {str(e)}")
+            return []
+    
+    def rebuild_aggregates(self) -> bool:
+        """Reconstrói os agregados (comando de reparo)"""
+        try:
+            with self.get_connection() as conn:
+                cursor = conn.cursor()
+                self._rebuild_aggregates(cursor)
+                conn.commit()
+                self.logger.info("Agregados reconstruídos com sucesso")
+                return True
+        except Exception as e:
+            self.logger.error(f"Erro ao reconstruir agregados: {str(e)}")
+            return False
@@ -0,0 +1,94 @@
+# Conjuntos exportáveis como tabela (CSV/XLSX)
+#
+# Cada conjunto é lido em lotes pela chave primária (id > último id), então
+# a exportação não mantém uma transação de leitura aberta nem carrega a tabela
+# inteira. 'filters' mapeia o parâmetro da requisição para a condição SQL e o
+# conversor do valor; 'status' é resolvido pelo dicionário de status.
+
+EXPORT_BATCH_SIZE = 1000
+
+def parse_flag(value) -> bool:
+    """Booleano da query string ('true'/'false' ou '1'/'0')"""
+    normalized = str(value).strip().lower()
+    if normalized in ('true', '1'):
+        return True
+    if normalized in ('false', '0'):
+        return False
+    raise ValueError(value)
+
+EXPORT_DATASETS = {
+    'clients': {
+        'from': 'clients c LEFT JOIN statuses s ON s.id = c.status_id',
+        'key': 'c.id',
+        'columns': [
+            ('id', 'c.id'),
+            ('name', 'c.name'),
+            ('process_number', 'c.process_number'),
+            ('process_year', 'c.process_year'),
+            ('email', 'c.email'),
+            ('phone', 'c.phone'),
+            ('document', 'c.document'),
+            ('notes', 'c.notes'),
+            ('current_status', 's.name'),
+            ('last_status_check', 'c.last_status_check'),
+            ('last_status_change', 'c.last_status_change'),
+            ('change_count', 'c.change_count'),
+            ('unread_notifications', 'c.unread_notifications'),
+            ('active', 'c.active'),
+            ('priority', 'c.priority'),
+            ('last_error', 'c.last_error'),
+            ('created_at', 'c.created_at')
+        ],
+        'status_column': 'c.status_id',
+        'date_column': 'c.created_at',
+        'filters': {
+            'process_year': ('c.process_year = ?', int)
+        }
+    },
+    'history': {
+        'from': 'query_history qh LEFT JOIN statuses s ON s.id = qh.status_id',
+        'key': 'qh.id',
+        'columns': [
+            ('id', 'qh.id'),
+            ('client_id', 'qh.client_id'),
+            ('credential_id', 'qh.credential_id'),
+            ('process_number', 'qh.process_number'),
+            ('process_year', 'qh.process_year'),
+            ('status', 's.name'),
+            ('success', 'qh.success'),
+            ('error', 'qh.error'),
+            ('has_changes', 'qh.has_changes'),
+            ('query_timestamp', 'qh.query_timestamp')
+        ],
+        'status_column': 'qh.status_id',
+        'date_column': 'qh.query_timestamp',
+        'filters': {
+            'client_id': ('qh.client_id = ?', int),
+            'process_year': ('qh.process_year = ?', int),
+            'success': ('qh.success = ?', parse_flag),
+            'has_changes': ('qh.has_changes = ?', parse_flag)
+        }
+    },
+    'notifications': {
+        'from': 'notifications n',
+        'key': 'n.id',
+        'columns': [
+            ('id', 'n.id'),
+            ('type', 'n.type'),
+            ('title', 'n.title'),
+            ('message', 'n.message'),
+            ('client_id', 'n.client_id'),
+            ('client_name', 'n.client_name'),
+            ('process_number', 'n.process_number'),
+            ('read', 'n.read'),
+            ('created_at', 'n.created_at')
+        ],
+        'status_column': None,
+        'date_column': 'n.created_at',
+        'filters': {
+            'client_id': ('n.client_id = ?', int),
+            'type': ('n.type = ?', str),
+            'read': ('n.read = ?', parse_flag)
+        }
+    }
+}
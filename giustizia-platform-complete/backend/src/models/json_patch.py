@@ -0,0 +1,83 @@
+import copy
+from typing import Any, Dict, List
+
+def _escape(token: str) -> str:
+    return token.replace('~', '~0').replace('/', '~1')
+
+def _unescape(token: str) -> str:
+    return token.replace('~1', '/').replace('~0', '~')
+
+def make_patch(old: Any, new: Any, path: str = '') -> List[Dict]:
+    """
+    Gera um JSON Patch (RFC 6902) que transforma old em new
+
+    Dicionários são comparados chave a chave; listas do mesmo tamanho
+    elemento a elemento e listas que apenas cresceram geram operações
+    'add' no final. Qualquer outra diferença vira um 'replace'.
+    """
+    if old == new:
+        return []
+
+    if isinstance(old, dict) and isinstance(new, dict):
+        ops = []
+        for key in old:
+            if key not in new:
+                ops.append({'op': 'remove', 'path': f'{path}/{_escape(key)}'})
+        for key, value in new.items():
+            child_path = f'{path}/{_escape(key)}'
+            if key not in old:
+                ops.append({'op': 'add', 'path': child_path, 'value': value})
+            else:
+                ops.extend(make_patch(old[key], value, child_path))
+        return ops
+
+    if isinstance(old, list) and isinstance(new, list):
+        if len(old) == len(new):
+            ops = []
+            for index, (old_item, new_item) in enumerate(zip(old, new)):
+                ops.extend(make_patch(old_item, new_item, f'{path}/{index}'))
+            return ops
+        if len(new) > len(old) and new[:len(old)] == old:
+            return [{'op': 'add', 'path': f'{path}/-', 'value': item} for item in new[len(old):]]
+
+    return [{'op': 'replace', 'path': path, 'value': new}]
+
+def apply_patch(document: Any, patch: List[Dict]) -> Any:
+    """Aplica um JSON Patch gerado por make_patch e retorna o novo documento"""
+    document = copy.deepcopy(document)
+
+    for operation in patch:
+        path = operation['path']
+        if path == '':
+            document = copy.deepcopy(operation.get('value'))
+            continue
+
+        tokens = [_unescape(token) for token in path.split('/')[1:]]
+        parent = document
+        for token in tokens[:-1]:
+            parent = parent[int(token)] if isinstance(parent, list) else parent[token]
+        last = tokens[-1]
+        op = operation['op']
+
+        if isinstance(parent, list):
+            if op == 'add':
+                value = copy.deepcopy(operation['value'])
+                if last == '-':
+                    parent.append(value)
+                else:
+                    parent.insert(int(last), value)
+            elif op == 'remove':
+                del parent[int(last)]
+            elif op == 'replace':
+                parent[int(last)] = copy.deepcopy(operation['value'])
+            else:
+                raise ValueError(f"Operação de patch não suportada: {op}")
+        else:
+            if op in ('add', 'replace'):
+                parent[last] = copy.deepcopy(operation['value'])
+            elif op == 'remove':
+                del parent[last]
+            else:
+                raise ValueError(f"Operação de patch não suportada: {op}")
+
+    return document
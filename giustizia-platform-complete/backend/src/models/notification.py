@@ -31,6 +31,11 @@ class Notification(db.Model):
     # Relacionamento com cliente
     client = db.relationship('Client', backref='notifications', lazy=True)
     
+    # Índice da chave de ordenação usada na paginação por cursor
+    __table_args__ = (
+        db.Index('idx_notification_created_id', 'created_at', 'id'),
+    )
+    
     def __repr__(self):
         return f'<Notification {self.notification_type} - {self.title}>'
     
@@ -69,8 +74,8 @@ class Notification(db.Model):
         db.session.commit()
     
     @staticmethod
-    def create_status_change_notification(client, previous_status, new_status):
-        """Cria uma notificação de mudança de status"""
+    def create_status_change_notification(client, previous_status, new_status, commit=True):
+        """Cria uma notificação de mudança de status (commit=False só adiciona à sessão, para gravar em lote)"""
         notification = Notification(
             client_id=client.id,
             notification_type='status_change',
@@ -83,12 +88,13 @@ class Notification(db.Model):
             process_year=client.process_year
         )
         db.session.add(notification)
-        db.session.commit()
+        if commit:
+            db.session.commit()
         return notification
     
     @staticmethod
-    def create_error_notification(client, error_message):
-        """Cria uma notificação de erro"""
+    def create_error_notification(client, error_message, commit=True):
+        """Cria uma notificação de erro (commit=False só adiciona à sessão, para gravar em lote)"""
         notification = Notification(
             client_id=client.id if client else None,
             notification_type='error',
@@ -99,12 +105,13 @@ class Notification(db.Model):
             process_year=client.process_year if client else None
         )
         db.session.add(notification)
-        db.session.commit()
+        if commit:
+            db.session.commit()
         return notification
     
     @staticmethod
-    def create_system_alert(title, message, severity='warning'):
-        """Cria um alerta do sistema"""
+    def create_system_alert(title, message, severity='warning', commit=True):
+        """Cria um alerta do sistema (commit=False só adiciona à sessão, para gravar em lote)"""
         notification = Notification(
             notification_type='system_alert',
             title=title,
@@ -112,6 +119,7 @@ class Notification(db.Model):
             severity=severity
         )
         db.session.add(notification)
-        db.session.commit()
+        if commit:
+            db.session.commit()
         return notification
 
@@ -0,0 +1,75 @@
+import base64
+import json
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# Tempo que um total calculado fica em cache (segundos)
+COUNT_CACHE_TTL = 60
+
+_count_cache: Dict[str, Tuple[float, int]] = {}
+_count_cache_lock = threading.Lock()
+
+def encode_cursor(values: List[Any], direction: str = 'next') -> str:
+    """Codifica a chave de ordenação de uma linha em um cursor opaco"""
+    payload = json.dumps({'k': values, 'd': direction}, separators=(',', ':'), default=str)
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor: str) -> Tuple[List[Any], str]:
+    """
+    Decodifica um cursor opaco
+
+    Returns:
+        Tupla (valores da chave de ordenação, direção 'next' ou 'prev')
+
+    Raises:
+        ValueError: se o cursor for inválido
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')).decode('utf-8'))
+        values, direction = payload['k'], payload['d']
+    except Exception:
+        raise ValueError("Cursor inválido")
+
+    if not isinstance(values, list) or direction not in ('next', 'prev'):
+        raise ValueError("Cursor inválido")
+    return values, direction
+
+def build_page(rows: List[Any], limit: int, direction: Optional[str],
+               key: Callable[[Any], List[Any]]) -> Dict:
+    """
+    Monta uma página a partir de até limit + 1 linhas buscadas pela chave
+
+    Args:
+        rows: Linhas na ordem da busca (invertida quando direction == 'prev')
+        limit: Tamanho da página
+        direction: Direção do cursor recebido (None para a primeira página)
+        key: Função que extrai a chave de ordenação de uma linha
+    """
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if direction == 'prev':
+        rows.reverse()
+
+    has_next = has_more if direction != 'prev' else True
+    has_prev = direction == 'next' or (direction == 'prev' and has_more)
+
+    return {
+        'items': rows,
+        'next_cursor': encode_cursor(key(rows[-1]), 'next') if rows and has_next else None,
+        'prev_cursor': encode_cursor(key(rows[0]), 'prev') if rows and has_prev else None
+    }
+
+def cached_count(cache_key: str, count: Callable[[], int], ttl: int = COUNT_CACHE_TTL) -> int:
+    """Retorna um total em cache, recalculando após o TTL"""
+    now = time.monotonic()
+    with _count_cache_lock:
+        cached = _count_cache.get(cache_key)
+        if cached and now - cached[0] < ttl:
+            return cached[1]
+
+    total = count()
+    with _count_cache_lock:
+        _count_cache[cache_key] = (now, total)
+    return total
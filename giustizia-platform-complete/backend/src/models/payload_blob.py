@@ -0,0 +1,35 @@
+from datetime import datetime
+from sqlalchemy.dialects.sqlite import insert
+from src.models.user import db
+from src.models.payload_codec import encode_payload, decode_payload
+
+class PayloadBlob(db.Model):
+    """Payload bruto da API armazenado uma única vez, comprimido e endereçado pelo hash"""
+    __tablename__ = 'payload_blobs'
+    
+    hash = db.Column(db.String(64), primary_key=True)
+    codec = db.Column(db.String(10), nullable=False)
+    data = db.Column(db.LargeBinary, nullable=False)
+    size = db.Column(db.Integer, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<PayloadBlob {self.hash[:12]} - {self.size} bytes>'
+    
+    def decode(self):
+        """Descomprime o payload"""
+        return decode_payload(self.codec, self.data)
+    
+    @staticmethod
+    def store(payload):
+        """Grava o payload se ainda não existir e retorna o hash"""
+        if not payload:
+            return None
+        
+        payload_hash, codec, data, size = encode_payload(payload)
+        db.session.execute(
+            insert(PayloadBlob.__table__)
+            .values(hash=payload_hash, codec=codec, data=data, size=size, created_at=datetime.utcnow())
+            .on_conflict_do_nothing(index_elements=['hash'])
+        )
+        return payload_hash
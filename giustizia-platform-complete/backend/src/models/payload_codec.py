@@ -0,0 +1,35 @@
+import hashlib
+import json
+import zlib
+from typing import Any, Tuple
+
+# Codec usado para novos blobs; o codec de cada blob fica gravado junto dele
+DEFAULT_CODEC = 'zlib'
+COMPRESSION_LEVEL = 6
+
+def canonical_json(payload: Any) -> bytes:
+    """Serialização estável: payloads iguais geram sempre os mesmos bytes"""
+    return json.dumps(payload, sort_keys=True, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+
+def encode_payload(payload: Any) -> Tuple[str, str, bytes, int]:
+    """
+    Prepara um payload para armazenamento endereçado por conteúdo
+
+    Returns:
+        Tupla (hash sha256, codec, dados comprimidos, tamanho original em bytes)
+    """
+    data = canonical_json(payload)
+    return (
+        hashlib.sha256(data).hexdigest(),
+        DEFAULT_CODEC,
+        zlib.compress(data, COMPRESSION_LEVEL),
+        len(data)
+    )
+
+def decode_payload(codec: str, data: bytes) -> Any:
+    """Descomprime e decodifica um blob armazenado"""
+    if codec == 'zlib':
+        return json.loads(zlib.decompress(data).decode('utf-8'))
+    if codec == 'json':
+        return json.loads(data.decode('utf-8'))
+    raise ValueError(f"Codec de payload desconhecido: {codec}")
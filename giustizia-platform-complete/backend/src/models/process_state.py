@@ -0,0 +1,160 @@
+import hashlib
+import re
+import unicodedata
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from .payload_codec import canonical_json
+
+# Formatos de data aceitos nos campos da API (o primeiro que casar vence)
+DATE_FORMATS = [
+    '%d/%m/%Y %H:%M',
+    '%d/%m/%Y %H.%M',
+    '%d/%m/%Y',
+    '%d-%m-%Y %H:%M',
+    '%d-%m-%Y',
+    '%Y-%m-%dT%H:%M:%S',
+    '%Y-%m-%dT%H:%M',
+    '%Y-%m-%d %H:%M:%S',
+    '%Y-%m-%d %H:%M',
+    '%Y-%m-%d',
+]
+
+def parse_datetime(value: Any) -> Optional[str]:
+    """
+    Converte uma data da API para o formato ordenável do banco
+
+    Returns:
+        'YYYY-MM-DD HH:MM:SS', ou None se o valor não for uma data reconhecida
+    """
+    if not isinstance(value, str) or not value.strip():
+        return None
+
+    text = value.strip()
+    for date_format in DATE_FORMATS:
+        try:
+            return datetime.strptime(text, date_format).strftime('%Y-%m-%d %H:%M:%S')
+        except ValueError:
+            continue
+    try:
+        # Datas ISO com fração de segundo ou fuso horário
+        return datetime.fromisoformat(text).strftime('%Y-%m-%d %H:%M:%S')
+    except ValueError:
+        return None
+
+def canonical_status(value: Any) -> Optional[Tuple[str, str]]:
+    """
+    Forma canônica de um status para o dicionário de status
+
+    Returns:
+        Tupla (chave normalizada, nome para exibição), ou None para status vazio.
+        A chave ignora maiúsculas, acentos e espaços repetidos, então
+        'In  corso' e 'IN CORSO' viram o mesmo status.
+    """
+    if not isinstance(value, str):
+        return None
+    name = ' '.join(value.split())
+    if not name:
+        return None
+    key = unicodedata.normalize('NFKD', name)
+    key = ''.join(char for char in key if not unicodedata.combining(char)).casefold()
+    return key, name
+
+def canonical_process(process_number: Any, process_year: Any) -> Tuple[str, int]:
+    """
+    Forma canônica de um processo, usada na chave de unicidade
+
+    Remove espaços, ignora maiúsculas e zeros à esquerda em cada grupo de
+    dígitos e aceita o ano como texto ('2024') ou número de planilha (2024.0).
+
+    Returns:
+        Tupla (número normalizado, ano)
+
+    Raises:
+        ValueError: Se o número estiver vazio ou o ano não for um inteiro
+    """
+    number = re.sub(r'\s+', '', str(process_number or '')).upper()
+    number = re.sub(r'(?<!\d)0+(?=\d)', '', number)
+    if not number:
+        raise ValueError("Número do processo inválido")
+    try:
+        year = float(str(process_year).strip())
+    except ValueError:
+        raise ValueError("Ano do processo inválido")
+    if not year.is_integer():
+        raise ValueError("Ano do processo inválido")
+    return number, int(year)
+
+def process_key(process_number: Any, process_year: Any) -> str:
+    """Chave única do processo: 'número/ano' na forma canônica"""
+    number, year = canonical_process(process_number, process_year)
+    return f'{number}/{year}'
+
+def _item_key(item: Any) -> str:
+    """Identificador estável de um item: o id da API ou o hash do conteúdo"""
+    if isinstance(item, dict) and item.get('id') is not None:
+        return str(item['id'])
+    return hashlib.sha256(canonical_json(item)).hexdigest()[:32]
+
+def _first(item: Dict, *keys: str) -> Any:
+    for key in keys:
+        if item.get(key):
+            return item[key]
+    return None
+
+def extract_state(payload: Dict) -> Dict:
+    """Campos do estado atual do processo"""
+    return {
+        'status': payload.get('stato'),
+        'tribunal': payload.get('tribunale'),
+        'judge': payload.get('giudice'),
+        'last_update': parse_datetime(payload.get('ultimo_aggiornamento')),
+        'next_hearing_at': parse_datetime(payload.get('prossima_udienza'))
+    }
+
+def extract_documents(payload: Dict) -> List[Dict]:
+    """Documentos da lista 'documenti', aceitando textos simples ou objetos"""
+    documents = {}
+    for item in payload.get('documenti') or []:
+        if isinstance(item, dict):
+            title = _first(item, 'descrizione', 'titolo', 'nome')
+            doc_type = _first(item, 'tipo', 'tipologia')
+            filed_at = parse_datetime(_first(item, 'data', 'data_deposito'))
+        else:
+            title, doc_type, filed_at = str(item), None, None
+        documents[_item_key(item)] = {
+            'doc_key': _item_key(item),
+            'title': title,
+            'doc_type': doc_type,
+            'filed_at': filed_at
+        }
+    return list(documents.values())
+
+def extract_hearings(payload: Dict) -> List[Dict]:
+    """
+    Audiências da lista 'udienze' mais a 'prossima_udienza'
+
+    Audiências cuja data não pode ser interpretada são mantidas com
+    hearing_at nulo, para não perder a informação.
+    """
+    items = list(payload.get('udienze') or [])
+    if payload.get('prossima_udienza'):
+        items.append(payload['prossima_udienza'])
+
+    hearings = {}
+    for item in items:
+        if isinstance(item, dict):
+            when = _first(item, 'data', 'data_udienza')
+            description = _first(item, 'descrizione', 'tipo', 'attivita')
+        else:
+            when, description = item, None
+        hearing_at = parse_datetime(when)
+        key = hearing_at or _item_key(item)
+        if key not in hearings or description:
+            hearings[key] = {
+                'hearing_key': key,
+                'hearing_at': hearing_at,
+                'description': description,
+                'raw_value': when if isinstance(when, str) else None
+            }
+    return list(hearings.values())
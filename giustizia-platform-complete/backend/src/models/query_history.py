@@ -1,6 +1,9 @@
 from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime
 from src.models.user import db
+from src.models.payload_blob import PayloadBlob
+from src.models.status import Status
+import json
 
 class QueryHistory(db.Model):
     __tablename__ = 'query_history'
@@ -11,11 +14,15 @@ class QueryHistory(db.Model):
     query_timestamp = db.Column(db.DateTime, default=datetime.utcnow, index=True)
     response_status = db.Column(db.String(20), nullable=False)  # 'success', 'error', 'rate_limited'
     response_time_ms = db.Column(db.Integer, nullable=True)
-    status_result = db.Column(db.Text, nullable=True)
-    raw_response = db.Column(db.Text, nullable=True)
+    status_id = db.Column(db.Integer, db.ForeignKey('statuses.id'), nullable=True)
+    raw_response = db.Column(db.Text, nullable=True)  # Apenas linhas antigas; novas usam payload_hash
+    payload_hash = db.Column(db.String(64), db.ForeignKey('payload_blobs.hash'), nullable=True)
     error_message = db.Column(db.Text, nullable=True)
     status_changed = db.Column(db.Boolean, default=False)
-    previous_status = db.Column(db.Text, nullable=True)
+    previous_status_id = db.Column(db.Integer, db.ForeignKey('statuses.id'), nullable=True)
+    
+    # Carregado apenas quando o payload é acessado
+    payload = db.relationship('PayloadBlob', lazy='select')
     
     # Índices para otimizar consultas
     __table_args__ = (
@@ -24,6 +31,22 @@ class QueryHistory(db.Model):
         db.Index('idx_response_status', 'response_status'),
     )
     
+    @property
+    def status_result(self):
+        return Status.name_for(self.status_id)
+    
+    @status_result.setter
+    def status_result(self, value):
+        self.status_id = Status.intern(value)
+    
+    @property
+    def previous_status(self):
+        return Status.name_for(self.previous_status_id)
+    
+    @previous_status.setter
+    def previous_status(self, value):
+        self.previous_status_id = Status.intern(value)
+    
     def __repr__(self):
         return f'<QueryHistory Client:{self.client_id} - {self.query_timestamp} - {self.response_status}>'
     
@@ -35,9 +58,27 @@ class QueryHistory(db.Model):
             'query_timestamp': self.query_timestamp.isoformat() if self.query_timestamp else None,
             'response_status': self.response_status,
             'response_time_ms': self.response_time_ms,
+            'status_id': self.status_id,
             'status_result': self.status_result,
             'error_message': self.error_message,
             'status_changed': self.status_changed,
-            'previous_status': self.previous_status
+            'previous_status': self.previous_status,
+            'payload_hash': self.payload_hash
         }
+    
+    def set_raw_response(self, payload):
+        """Armazena o payload bruto na tabela de blobs deduplicada"""
+        self.payload_hash = PayloadBlob.store(payload)
+        self.raw_response = None
+    
+    def get_raw_response(self):
+        """Retorna o payload bruto, descomprimindo sob demanda"""
+        if self.payload_hash:
+            return self.payload.decode() if self.payload else None
+        if self.raw_response:
+            try:
+                return json.loads(self.raw_response)
+            except ValueError:
+                return self.raw_response
+        return None
 
@@ -0,0 +1,321 @@
+import threading
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import event, inspect
+from sqlalchemy.dialects.sqlite import insert
+from src.models.user import db
+from src.models.client import Client
+from src.models.credential import Credential
+from src.models.query_history import QueryHistory
+from src.models.notification import Notification
+from src.models.status import Status
+
+class StatsCounter(db.Model):
+    """Contadores globais mantidos incrementalmente nas escritas"""
+    __tablename__ = 'stats_counters'
+
+    name = db.Column(db.String(50), primary_key=True)
+    value = db.Column(db.Integer, nullable=False, default=0)
+
+    @staticmethod
+    def get_all():
+        """Retorna todos os contadores como dicionário"""
+        return {counter.name: counter.value for counter in StatsCounter.query.all()}
+
+class QueryStatsBucket(db.Model):
+    """Totais de consultas agregados por hora"""
+    __tablename__ = 'query_stats_buckets'
+
+    bucket_start = db.Column(db.DateTime, primary_key=True)
+    total_queries = db.Column(db.Integer, nullable=False, default=0)
+    successful_queries = db.Column(db.Integer, nullable=False, default=0)
+    status_changes = db.Column(db.Integer, nullable=False, default=0)
+
+    @staticmethod
+    def bucket_for(timestamp):
+        """Retorna o início da hora à qual o timestamp pertence"""
+        return timestamp.replace(minute=0, second=0, microsecond=0)
+
+    @staticmethod
+    def totals_since(since):
+        """Soma os buckets a partir de um instante (granularidade de uma hora)"""
+        row = db.session.query(
+            db.func.coalesce(db.func.sum(QueryStatsBucket.total_queries), 0),
+            db.func.coalesce(db.func.sum(QueryStatsBucket.successful_queries), 0),
+            db.func.coalesce(db.func.sum(QueryStatsBucket.status_changes), 0)
+        ).filter(QueryStatsBucket.bucket_start >= QueryStatsBucket.bucket_for(since)).one()
+
+        return {
+            'total_queries': int(row[0]),
+            'successful_queries': int(row[1]),
+            'status_changes': int(row[2])
+        }
+
+    @staticmethod
+    def daily_since(since):
+        """Agrupa os buckets horários por dia"""
+        buckets = QueryStatsBucket.query.filter(
+            QueryStatsBucket.bucket_start >= QueryStatsBucket.bucket_for(since)
+        ).order_by(QueryStatsBucket.bucket_start).all()
+
+        days = {}
+        for bucket in buckets:
+            day = days.setdefault(bucket.bucket_start.date(), {'total': 0, 'successful': 0})
+            day['total'] += bucket.total_queries
+            day['successful'] += bucket.successful_queries
+        return days
+
+class StatusCount(db.Model):
+    """Distribuição de status dos clientes ativos"""
+    __tablename__ = 'status_counts'
+
+    status_id = db.Column(db.Integer, db.ForeignKey('statuses.id'), primary_key=True)
+    client_count = db.Column(db.Integer, nullable=False, default=0)
+
+    @staticmethod
+    def distribution():
+        """Retorna a distribuição de status sem varrer a tabela de clientes"""
+        counts = StatusCount.query.filter(StatusCount.client_count > 0)\
+            .order_by(StatusCount.client_count.desc()).all()
+        return [(Status.name_for(count.status_id), count.client_count) for count in counts]
+
+# Validade, em segundos, dos resumos servidos pelas rotas de estatísticas
+SNAPSHOT_TTL = 5
+
+_snapshots = {}
+_snapshots_lock = threading.Lock()
+
+def cached_snapshot(key, build, ttl=SNAPSHOT_TTL):
+    """Retorna um resumo pronto, recalculado no máximo uma vez por TTL"""
+    now = time.monotonic()
+    with _snapshots_lock:
+        cached = _snapshots.get(key)
+        if cached and now - cached[0] < ttl:
+            return cached[1]
+
+    value = build()
+    with _snapshots_lock:
+        _snapshots[key] = (now, value)
+    return value
+
+def overview_totals(since, now=None):
+    """
+    Contadores globais, pool de credenciais e totais desde `since` em uma consulta
+
+    Cada parte é um agregado de uma linha (contadores, buckets horários e
+    credenciais); o SELECT externo só as junta. Nada é gravado.
+    """
+    counters = db.session.query(
+        db.func.sum(db.case([(StatsCounter.name == 'active_clients', StatsCounter.value)], else_=0))
+            .label('active_clients'),
+        db.func.sum(db.case([(StatsCounter.name == 'unread_notifications', StatsCounter.value)], else_=0))
+            .label('unread_notifications')
+    ).subquery()
+    buckets = db.session.query(
+        db.func.sum(QueryStatsBucket.total_queries).label('total_queries'),
+        db.func.sum(QueryStatsBucket.successful_queries).label('successful_queries'),
+        db.func.sum(QueryStatsBucket.status_changes).label('status_changes')
+    ).filter(QueryStatsBucket.bucket_start >= QueryStatsBucket.bucket_for(since)).subquery()
+    credentials = db.session.query(
+        db.func.sum(db.case([(Credential.is_active == True, 1)], else_=0)).label('active'),
+        db.func.sum(db.case([(Credential.available_clause(now), 1)], else_=0)).label('available')
+    ).subquery()
+
+    row = db.session.query(
+        counters.c.active_clients,
+        counters.c.unread_notifications,
+        buckets.c.total_queries,
+        buckets.c.successful_queries,
+        buckets.c.status_changes,
+        credentials.c.active,
+        credentials.c.available
+    ).select_from(counters).join(buckets, db.true()).join(credentials, db.true()).one()
+
+    return {
+        'active_clients': int(row.active_clients or 0),
+        'unread_notifications': int(row.unread_notifications or 0),
+        'total_queries': int(row.total_queries or 0),
+        'successful_queries': int(row.successful_queries or 0),
+        'status_changes': int(row.status_changes or 0),
+        'active_credentials': int(row.active or 0),
+        'available_credentials': int(row.available or 0)
+    }
+
+def _upsert_increment(connection, table, key_column, key, **deltas):
+    """Incrementa colunas de uma linha agregada, criando-a se necessário"""
+    stmt = insert(table).values({key_column: key, **deltas})
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[key_column],
+        set_={column: table.c[column] + stmt.excluded[column] for column in deltas}
+    )
+    connection.execute(stmt)
+
+def _bump_counter(connection, name, delta=1):
+    _upsert_increment(connection, StatsCounter.__table__, 'name', name, value=delta)
+
+def _shift_status(connection, old_status_id, new_status_id):
+    if old_status_id == new_status_id:
+        return
+    if old_status_id is not None:
+        _upsert_increment(connection, StatusCount.__table__, 'status_id', old_status_id, client_count=-1)
+    if new_status_id is not None:
+        _upsert_increment(connection, StatusCount.__table__, 'status_id', new_status_id, client_count=1)
+
+def _shift_unread(connection, client_id, delta):
+    _bump_counter(connection, 'unread_notifications', delta)
+    if client_id is not None:
+        clients = Client.__table__
+        connection.execute(
+            clients.update()
+            .where(clients.c.id == client_id)
+            .values(unread_notifications=db.func.max(clients.c.unread_notifications + delta, 0))
+        )
+
+def _previous(target, attribute):
+    """Valor anterior de um atributo durante o flush"""
+    history = inspect(target).attrs[attribute].history
+    return history.deleted[0] if history.deleted else getattr(target, attribute)
+
+def _status_key(status_id, is_active):
+    # Apenas clientes ativos entram na distribuição
+    return status_id if status_id is not None and is_active is not False else None
+
+@event.listens_for(QueryHistory, 'after_insert')
+def _count_query(mapper, connection, target):
+    timestamp = target.query_timestamp or datetime.utcnow()
+    _upsert_increment(
+        connection, QueryStatsBucket.__table__, 'bucket_start', QueryStatsBucket.bucket_for(timestamp),
+        total_queries=1,
+        successful_queries=1 if target.response_status == 'success' else 0,
+        status_changes=1 if target.status_changed else 0
+    )
+
+    # Resumo do cliente: última verificação, mudanças e último erro
+    clients = Client.__table__
+    summary = {
+        'last_status_check': timestamp,
+        'change_count': clients.c.change_count + (1 if target.status_changed else 0)
+    }
+    if target.response_status != 'success':
+        summary.update(last_error=target.error_message, last_error_at=timestamp)
+    connection.execute(clients.update().where(clients.c.id == target.client_id).values(**summary))
+
+@event.listens_for(Client, 'after_insert')
+def _count_new_client(mapper, connection, target):
+    if target.is_active is not False:
+        _bump_counter(connection, 'active_clients')
+    _shift_status(connection, None, _status_key(target.status_id, target.is_active))
+
+@event.listens_for(Client, 'after_update')
+def _count_client_update(mapper, connection, target):
+    was_active = _previous(target, 'is_active') is not False
+    is_active = target.is_active is not False
+    if was_active != is_active:
+        _bump_counter(connection, 'active_clients', 1 if is_active else -1)
+
+    _shift_status(
+        connection,
+        _status_key(_previous(target, 'status_id'), was_active),
+        _status_key(target.status_id, is_active)
+    )
+
+@event.listens_for(Client, 'after_delete')
+def _count_deleted_client(mapper, connection, target):
+    if target.is_active is not False:
+        _bump_counter(connection, 'active_clients', -1)
+    _shift_status(connection, _status_key(target.status_id, target.is_active), None)
+
+@event.listens_for(Notification, 'after_insert')
+def _count_new_notification(mapper, connection, target):
+    if not target.is_read:
+        _shift_unread(connection, target.client_id, 1)
+
+@event.listens_for(Notification, 'after_update')
+def _count_notification_update(mapper, connection, target):
+    was_read = bool(_previous(target, 'is_read'))
+    if was_read != bool(target.is_read):
+        _shift_unread(connection, target.client_id, -1 if target.is_read else 1)
+
+@event.listens_for(Notification, 'after_delete')
+def _count_deleted_notification(mapper, connection, target):
+    if not target.is_read:
+        _shift_unread(connection, target.client_id, -1)
+
+def rebuild_query_stats():
+    """Recalcula todos os agregados a partir das tabelas base (comando de reparo)"""
+    StatsCounter.query.delete()
+    QueryStatsBucket.query.delete()
+    StatusCount.query.delete()
+
+    db.session.add(StatsCounter(
+        name='active_clients',
+        value=Client.query.filter(Client.is_active == True).count()
+    ))
+    db.session.add(StatsCounter(
+        name='unread_notifications',
+        value=Notification.query.filter(Notification.is_read == False).count()
+    ))
+
+    hour = db.func.strftime('%Y-%m-%d %H:00:00', QueryHistory.query_timestamp)
+    buckets = db.session.query(
+        hour,
+        db.func.count(QueryHistory.id),
+        db.func.sum(db.case([(QueryHistory.response_status == 'success', 1)], else_=0)),
+        db.func.sum(db.case([(QueryHistory.status_changed == True, 1)], else_=0))
+    ).filter(QueryHistory.query_timestamp.isnot(None)).group_by(hour).all()
+
+    for bucket_start, total, successful, changes in buckets:
+        db.session.add(QueryStatsBucket(
+            bucket_start=datetime.strptime(bucket_start, '%Y-%m-%d %H:%M:%S'),
+            total_queries=total,
+            successful_queries=int(successful or 0),
+            status_changes=int(changes or 0)
+        ))
+
+    status_counts = db.session.query(
+        Client.status_id,
+        db.func.count(Client.id)
+    ).filter(
+        Client.is_active == True,
+        Client.status_id.isnot(None)
+    ).group_by(Client.status_id).all()
+
+    for status_id, count in status_counts:
+        db.session.add(StatusCount(status_id=status_id, client_count=count))
+
+    # Resumo por cliente
+    db.session.execute(db.text('''
+        WITH checks AS (
+            SELECT client_id,
+                   MAX(query_timestamp) AS last_check,
+                   SUM(CASE WHEN status_changed THEN 1 ELSE 0 END) AS changes
+            FROM query_history
+            GROUP BY client_id
+        ),
+        errors AS (
+            SELECT client_id, error_message, query_timestamp,
+                   ROW_NUMBER() OVER (
+                       PARTITION BY client_id ORDER BY query_timestamp DESC, id DESC
+                   ) AS position
+            FROM query_history
+            WHERE response_status != 'success'
+        ),
+        unread AS (
+            SELECT client_id, COUNT(*) AS total FROM notifications
+            WHERE client_id IS NOT NULL AND is_read = 0
+            GROUP BY client_id
+        )
+        UPDATE clients SET
+            last_status_check = COALESCE(checks.last_check, clients.last_status_check),
+            change_count = COALESCE(checks.changes, 0),
+            last_error = COALESCE(errors.error_message, clients.last_error),
+            last_error_at = COALESCE(errors.query_timestamp, clients.last_error_at),
+            unread_notifications = COALESCE(unread.total, 0)
+        FROM clients AS c
+        LEFT JOIN checks ON checks.client_id = c.id
+        LEFT JOIN errors ON errors.client_id = c.id AND errors.position = 1
+        LEFT JOIN unread ON unread.client_id = c.id
+        WHERE c.id = clients.id
+    '''))
+
+    db.session.commit()
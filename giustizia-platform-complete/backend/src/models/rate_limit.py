@@ -0,0 +1,258 @@
+import atexit
+import logging
+import threading
+from datetime import datetime, timedelta
+from flask import current_app, has_app_context
+from src.models.user import db
+
+# Intervalo, em segundos, entre gravações do estado em memória no banco
+CHECKPOINT_INTERVAL = 30
+
+RATE_WINDOW = timedelta(minutes=1)
+
+# Peso de cada nova amostra na média móvel do tempo de resposta
+RESPONSE_TIME_WEIGHT = 0.1
+
+logger = logging.getLogger(__name__)
+
+class RateLimitRegistry:
+    """
+    Estado de rate limiting das credenciais em memória
+
+    A janela de um minuto e os contadores de uso ficam aqui, protegidos por
+    um lock, em vez de serem gravados a cada verificação e a cada requisição.
+    O banco recebe um checkpoint a cada CHECKPOINT_INTERVAL segundos: os
+    contadores acumulados (total, sucessos, falhas, tempo médio, último erro)
+    e a janela atual, em uma única transação. Depois de um reinício a janela
+    é retomada a partir do último checkpoint da credencial.
+
+    O checkpoint é feito por uma thread própria, iniciada na primeira
+    requisição registrada, e uma última vez na saída do processo: o fim de
+    uma execução não fica em memória esperando a próxima requisição.
+    """
+
+    def __init__(self, checkpoint_interval: float = CHECKPOINT_INTERVAL):
+        self.checkpoint_interval = checkpoint_interval
+        self._lock = threading.Lock()
+        self._windows = {}  # credential_id -> [início da janela, requisições, limite]
+        self._pending = {}  # credential_id -> acumulado desde o último checkpoint
+        self._saved_windows = {}  # janelas gravadas no último checkpoint
+        self._app = None
+        self._thread = None
+        self._stopped = threading.Event()
+        self._exit_registered = False
+
+    def _window(self, credential, now):
+        """Janela atual da credencial (chamado com o lock)"""
+        window = self._windows.get(credential.id)
+        if window is None:
+            # Primeira vez neste processo: retoma o último checkpoint
+            window = [credential.minute_window_start, credential.requests_this_minute or 0, 0]
+            self._windows[credential.id] = window
+        window[2] = credential.max_requests_per_minute
+        if window[0] is None or now - window[0] >= RATE_WINDOW:
+            window[0] = now
+            window[1] = 0
+        return window
+
+    def can_request(self, credential, now=None) -> bool:
+        """A credencial ainda tem requisições na janela atual (não reserva nada)"""
+        now = now or datetime.utcnow()
+        with self._lock:
+            window = self._window(credential, now)
+            return window[1] < window[2]
+
+    def requests_in_window(self, credential, now=None) -> int:
+        now = now or datetime.utcnow()
+        with self._lock:
+            return self._window(credential, now)[1]
+
+    def saturated_ids(self, now=None):
+        """Credenciais que atingiram o limite na janela atual"""
+        now = now or datetime.utcnow()
+        with self._lock:
+            return [
+                credential_id for credential_id, (start, count, limit) in self._windows.items()
+                if start is not None and now - start < RATE_WINDOW and count >= limit
+            ]
+
+    def record(self, credential, success=True, response_time=None, error_message=None):
+        """Registra uma requisição; o checkpoint periódico leva o acumulado ao banco"""
+        now = datetime.utcnow()
+        self.start()
+        with self._lock:
+            self._window(credential, now)[1] += 1
+            pending = self._pending.setdefault(credential.id, {
+                'total': 0, 'successful': 0, 'failed': 0,
+                'last_used': None, 'last_error': None, 'last_error_at': None,
+                'first_response_time': None, 'decay': 1.0, 'contribution': 0.0
+            })
+            pending['total'] += 1
+            pending['last_used'] = now
+            if success:
+                pending['successful'] += 1
+            else:
+                pending['failed'] += 1
+                pending['last_error'] = error_message
+                pending['last_error_at'] = now
+            if response_time is not None and success:
+                self._add_response_time(pending, response_time)
+
+    def start(self, app=None):
+        """
+        Inicia a thread de checkpoint, se ainda não estiver rodando
+
+        A thread grava fora de requisições, então guarda a aplicação (a
+        informada ou a do contexto atual) para abrir um contexto próprio.
+        """
+        if app is None and has_app_context():
+            app = current_app._get_current_object()
+        with self._lock:
+            if app is not None:
+                self._app = app
+            if self._thread and self._thread.is_alive():
+                return
+            self._stopped.clear()
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+            if not self._exit_registered:
+                atexit.register(self.stop)
+                self._exit_registered = True
+
+    def stop(self):
+        """Para a thread e grava o que ainda está pendente"""
+        self._stopped.set()
+        thread = self._thread
+        if thread and thread.is_alive() and thread is not threading.current_thread():
+            thread.join(self.checkpoint_interval)
+        self._checkpoint_in_context()
+
+    def _run(self):
+        """Grava o checkpoint a cada checkpoint_interval até stop()"""
+        while not self._stopped.wait(self.checkpoint_interval):
+            self._checkpoint_in_context()
+
+    def _checkpoint_in_context(self):
+        if self._app is not None and not has_app_context():
+            with self._app.app_context():
+                return self.checkpoint()
+        return self.checkpoint()
+
+    def _add_response_time(self, pending, response_time):
+        """
+        Acumula a média móvel em forma fechada
+
+        Depois de k amostras, média = média_anterior * decay + contribution.
+        first_response_time é a média começando pela primeira amostra, usada
+        quando a credencial ainda não tinha média gravada (0).
+        """
+        if pending['first_response_time'] is None:
+            pending['first_response_time'] = response_time
+        else:
+            pending['first_response_time'] = (
+                pending['first_response_time'] * (1 - RESPONSE_TIME_WEIGHT) + response_time * RESPONSE_TIME_WEIGHT
+            )
+        pending['decay'] *= 1 - RESPONSE_TIME_WEIGHT
+        pending['contribution'] = (
+            pending['contribution'] * (1 - RESPONSE_TIME_WEIGHT) + response_time * RESPONSE_TIME_WEIGHT
+        )
+
+    def pending_for(self, credential_id):
+        """Acumulado ainda não gravado de uma credencial (cópia)"""
+        with self._lock:
+            pending = self._pending.get(credential_id)
+            return dict(pending) if pending else None
+
+    def reset(self, credential_ids=None):
+        """Zera as janelas (todas ou das credenciais informadas)"""
+        with self._lock:
+            for credential_id in list(self._windows):
+                if credential_ids is None or credential_id in credential_ids:
+                    del self._windows[credential_id]
+
+    def checkpoint(self) -> int:
+        """
+        Grava os acumulados e as janelas em uma transação
+
+        Usa uma conexão própria, sem interferir na sessão da requisição.
+        Se a gravação falhar os acumulados voltam para a próxima tentativa.
+
+        Returns:
+            Número de credenciais gravadas
+        """
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            windows = {credential_id: list(window) for credential_id, window in self._windows.items()}
+
+        # Sem requisições novas e com as janelas já gravadas não há o que escrever
+        if not pending and windows == self._saved_windows:
+            return 0
+
+        credentials = db.Model.metadata.tables['credentials']
+        try:
+            credential_ids = set(windows) | set(pending)
+            with db.engine.begin() as connection:
+                for credential_id in credential_ids:
+                    values = {}
+                    window = windows.get(credential_id)
+                    if window:
+                        values['minute_window_start'] = window[0]
+                        values['requests_this_minute'] = window[1]
+                    totals = pending.get(credential_id)
+                    if totals:
+                        values.update(self._counter_updates(credentials, totals))
+                    connection.execute(
+                        credentials.update().where(credentials.c.id == credential_id).values(**values)
+                    )
+            self._saved_windows = windows
+            return len(credential_ids)
+        except Exception as e:
+            logger.error(f"Erro ao gravar checkpoint de rate limiting: {str(e)}")
+            with self._lock:
+                for credential_id, totals in pending.items():
+                    self._merge_back(credential_id, totals)
+            return 0
+
+    def _counter_updates(self, credentials, totals):
+        """Expressões de UPDATE que somam os acumulados às colunas"""
+        values = {
+            'total_requests': credentials.c.total_requests + totals['total'],
+            'successful_requests': credentials.c.successful_requests + totals['successful'],
+            'failed_requests': credentials.c.failed_requests + totals['failed'],
+            'last_used': totals['last_used'],
+            'updated_at': totals['last_used']
+        }
+        if totals['last_error_at']:
+            values['last_error'] = totals['last_error']
+            values['last_error_at'] = totals['last_error_at']
+        if totals['first_response_time'] is not None:
+            average = credentials.c.average_response_time
+            values['average_response_time'] = db.case(
+                [(db.func.coalesce(average, 0) == 0, totals['first_response_time'])],
+                else_=average * totals['decay'] + totals['contribution']
+            )
+        return values
+
+    def _merge_back(self, credential_id, totals):
+        """Devolve ao acumulado um lote que não foi gravado (chamado com o lock)"""
+        current = self._pending.get(credential_id)
+        if current is None:
+            self._pending[credential_id] = totals
+            return
+        for field in ('total', 'successful', 'failed'):
+            current[field] += totals[field]
+        current['last_error'] = current['last_error'] or totals['last_error']
+        current['last_error_at'] = current['last_error_at'] or totals['last_error_at']
+        if totals['first_response_time'] is not None:
+            # Lote antigo seguido do atual: compõe as duas médias móveis
+            if current['first_response_time'] is None:
+                current['first_response_time'] = totals['first_response_time']
+            else:
+                current['first_response_time'] = (
+                    totals['first_response_time'] * current['decay'] + current['contribution']
+                )
+            current['contribution'] = totals['contribution'] * current['decay'] + current['contribution']
+            current['decay'] *= totals['decay']
+
+# Registro único do processo
+rate_limits = RateLimitRegistry()
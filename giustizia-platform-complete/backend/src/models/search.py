@@ -0,0 +1,70 @@
+import re
+import unicodedata
+from typing import Any, Dict, List, Optional, Tuple
+
+# Marcadores usados para destacar os trechos encontrados
+HIGHLIGHT_START = '<mark>'
+HIGHLIGHT_END = '</mark>'
+
+# Colunas indexadas na busca de clientes, na ordem da tabela FTS
+CLIENT_SEARCH_COLUMNS = ['name', 'process_number', 'process_year', 'email', 'document', 'notes']
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+def build_fts_query(term: str) -> Optional[str]:
+    """
+    Converte o texto digitado em uma consulta FTS5 de prefixo
+
+    Cada palavra vira um termo de prefixo entre aspas ("joa"*), e todos
+    precisam aparecer. Pontuação é descartada, então '12345/2024' busca
+    12345* e 2024*. Retorna None se não sobrar nenhuma palavra.
+    """
+    tokens = _TOKEN_RE.findall(term or '')
+    if not tokens:
+        return None
+    return ' '.join(f'"{token}"*' for token in tokens)
+
+def collect_highlights(row: Dict, columns) -> Dict:
+    """Retorna apenas os campos destacados que contêm algum trecho encontrado"""
+    highlights = {}
+    for column in columns:
+        value = row.get(f'{column}_highlight')
+        if value and HIGHLIGHT_START in value:
+            highlights[column] = value
+    return highlights
+
+def name_tokens(name: str) -> List[str]:
+    """Palavras de um nome sem acentos, pontuação nem maiúsculas"""
+    text = unicodedata.normalize('NFKD', name or '')
+    text = ''.join(char for char in text if not unicodedata.combining(char)).lower()
+    return _TOKEN_RE.findall(text)
+
+def normalize_name(name: str) -> str:
+    """Forma normalizada de um nome de parte ('Àlfa  S.p.A.' -> 'alfa s p a')"""
+    return ' '.join(name_tokens(name))
+
+def extract_parties(payload: Any) -> List[Tuple[str, str, Optional[str]]]:
+    """
+    Extrai as partes da lista 'parti' de um payload da API
+
+    Aceita tanto nomes simples quanto objetos com nome e papel.
+
+    Returns:
+        Lista de tuplas (nome, nome normalizado, papel) sem repetições
+    """
+    if not isinstance(payload, dict) or not isinstance(payload.get('parti'), list):
+        return []
+
+    parties = {}
+    for party in payload['parti']:
+        if isinstance(party, dict):
+            name = party.get('nome') or party.get('denominazione') or party.get('name')
+            role = party.get('ruolo') or party.get('tipo') or party.get('role')
+        else:
+            name, role = party, None
+        if not isinstance(name, str):
+            continue
+        normalized = normalize_name(name)
+        if normalized:
+            parties[(normalized, role)] = (name.strip(), normalized, role)
+    return list(parties.values())
@@ -0,0 +1,90 @@
+from datetime import datetime
+from sqlalchemy.dialects.sqlite import insert
+from src.models.user import db
+from src.models.process_state import canonical_status
+
+# Cache do dicionário (chave normalizada -> id e id -> nome); status nunca mudam de id
+_ids = {}
+_names = {}
+
+class Status(db.Model):
+    """Dicionário de status: cada texto distinto é gravado uma única vez"""
+    __tablename__ = 'statuses'
+
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.Text, nullable=False)
+    normalized = db.Column(db.Text, nullable=False, unique=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<Status {self.id} - {self.name}>'
+
+    @staticmethod
+    def _load():
+        """Recarrega o cache com todo o dicionário (tabela pequena)"""
+        for status in Status.query.all():
+            _ids[status.normalized] = status.id
+            _names[status.id] = status.name
+
+    @staticmethod
+    def id_for(value):
+        """Retorna o id de um status existente, sem criá-lo"""
+        canonical = canonical_status(value)
+        if not canonical:
+            return None
+        if canonical[0] not in _ids:
+            Status._load()
+        return _ids.get(canonical[0])
+
+    @staticmethod
+    def intern(value):
+        """Retorna o id do status, criando a entrada se necessário"""
+        status_id = Status.id_for(value)
+        if status_id is not None or not canonical_status(value):
+            return status_id
+
+        normalized, name = canonical_status(value)
+        db.session.execute(
+            insert(Status.__table__)
+            .values(name=name, normalized=normalized, created_at=datetime.utcnow())
+            .on_conflict_do_nothing(index_elements=['normalized'])
+        )
+        # Não entra no cache até o commit: a transação ainda pode ser desfeita
+        return db.session.query(Status.id).filter(Status.normalized == normalized).scalar()
+
+    @staticmethod
+    def name_for(status_id):
+        """Nome de exibição de um id de status"""
+        if status_id is None:
+            return None
+        if status_id not in _names:
+            Status._load()
+        return _names.get(status_id)
+
+class StatusTransition(db.Model):
+    """Mudanças reais de status de um cliente (tabela apenas acrescentada)"""
+    __tablename__ = 'status_transitions'
+
+    id = db.Column(db.Integer, primary_key=True)
+    client_id = db.Column(db.Integer, db.ForeignKey('clients.id'), nullable=False)
+    from_status_id = db.Column(db.Integer, db.ForeignKey('statuses.id'), nullable=True)
+    to_status_id = db.Column(db.Integer, db.ForeignKey('statuses.id'), nullable=False)
+    changed_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.Index('idx_status_transitions_client', 'client_id', 'changed_at', 'id'),
+    )
+
+    def __repr__(self):
+        return f'<StatusTransition {self.client_id}: {self.from_status_id} -> {self.to_status_id}>'
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'client_id': self.client_id,
+            'from_status_id': self.from_status_id,
+            'from_status': Status.name_for(self.from_status_id),
+            'to_status_id': self.to_status_id,
+            'to_status': Status.name_for(self.to_status_id),
+            'changed_at': self.changed_at.isoformat() if self.changed_at else None
+        }
@@ -4,7 +4,11 @@ from datetime import datetime
 from src.models.client import Client
 from src.models.query_history import QueryHistory
 from src.models.notification import Notification
+from src.models.query_stats import StatsCounter, QueryStatsBucket, StatusCount
+from src.models.status import Status
+from src.models.bulk_actions import client_scope, set_clients_active
 from src.models.user import db
+from src.routes.pagination import keyset_paginate, page_response
 from src.services.giustizia_api import GiustiziaAPIService
 
 clients_bp = Blueprint('clients', __name__)
@@ -14,57 +18,61 @@ giustizia_service = GiustiziaAPIService()
 def get_clients():
     """Lista todos os clientes com filtros opcionais"""
     try:
-        page = request.args.get('page', 1, type=int)
-        per_page = request.args.get('per_page', 50, type=int)
+        cursor = request.args.get('cursor')
+        per_page = min(max(request.args.get('per_page', 50, type=int), 1), 500)
+        include_total = request.args.get('include_total', 'false').lower() == 'true'
         search = request.args.get('search', '')
         status_filter = request.args.get('status', '')
         active_only = request.args.get('active_only', 'true').lower() == 'true'
         
         query = Client.query
         
+        # Status é comparado pelo id do dicionário (igualdade indexada)
+        status_id = Status.id_for(status_filter) if status_filter else None
+        
         # Filtro por status ativo
         if active_only:
             query = query.filter(Client.is_active == True)
         
-        # Filtro de busca
+        # Busca textual: resultados ordenados por relevância, sem cursor
         if search:
-            query = query.filter(
-                db.or_(
-                    Client.name.ilike(f'%{search}%'),
-                    Client.process_number.ilike(f'%{search}%'),
-                    Client.email.ilike(f'%{search}%')
-                )
-            )
+            results = Client.search(search, per_page, active_only)
+            return jsonify({
+                'success': True,
+                'clients': [
+                    dict(client.to_dict(), highlights=highlights)
+                    for client, highlights in results
+                    if not status_filter or client.status_id == status_id
+                ],
+                'pagination': {
+                    'per_page': per_page,
+                    'next_cursor': None,
+                    'prev_cursor': None,
+                    'has_next': False,
+                    'has_prev': False
+                }
+            })
         
-        # Filtro por status
+        # Filtro por status (status desconhecido não tem clientes)
         if status_filter:
-            query = query.filter(Client.current_status.ilike(f'%{status_filter}%'))
+            query = query.filter(Client.status_id == status_id if status_id is not None else db.false())
         
-        # Ordenação
-        query = query.order_by(Client.created_at.desc())
-        
-        # Paginação
-        pagination = query.paginate(
-            page=page, 
-            per_page=per_page, 
-            error_out=False
-        )
+        # Paginação por cursor (nome + id)
+        page = keyset_paginate(query, [Client.name, Client.id], False, cursor, per_page, include_total)
         
-        clients = [client.to_dict() for client in pagination.items]
+        clients = [client.to_dict() for client in page['items']]
         
         return jsonify({
             'success': True,
             'clients': clients,
-            'pagination': {
-                'page': page,
-                'per_page': per_page,
-                'total': pagination.total,
-                'pages': pagination.pages,
-                'has_next': pagination.has_next,
-                'has_prev': pagination.has_prev
-            }
+            'pagination': page_response(page, per_page)
         })
         
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
     except Exception as e:
         return jsonify({
             'success': False,
@@ -86,11 +94,14 @@ def create_client():
                     'error': f'Campo obrigatório: {field}'
                 }), 400
         
-        # Verifica se já existe um cliente com o mesmo processo
-        existing = Client.query.filter_by(
-            process_number=data['process_number'],
-            process_year=data['process_year']
-        ).first()
+        # Verifica se já existe um cliente com o mesmo processo (chave canônica)
+        try:
+            existing = Client.find_by_process(data['process_number'], data['process_year'])
+        except ValueError as e:
+            return jsonify({
+                'success': False,
+                'error': str(e)
+            }), 400
         
         if existing:
             return jsonify({
@@ -105,7 +116,7 @@ def create_client():
             phone=data.get('phone'),
             document_number=data.get('document_number'),
             process_number=data['process_number'],
-            process_year=int(data['process_year']),
+            process_year=data['process_year'],
             notes=data.get('notes')
         )
         
@@ -131,19 +142,19 @@ def get_client(client_id):
     try:
         client = Client.query.get_or_404(client_id)
         
-        # Inclui histórico recente de consultas
-        recent_queries = QueryHistory.query.filter_by(client_id=client_id)\
-            .order_by(QueryHistory.query_timestamp.desc())\
-            .limit(10).all()
-        
-        # Inclui notificações recentes
-        recent_notifications = Notification.query.filter_by(client_id=client_id)\
-            .order_by(Notification.created_at.desc())\
-            .limit(5).all()
-        
+        # Última consulta, último erro e não lidas vêm do resumo na própria linha
         client_data = client.to_dict()
-        client_data['recent_queries'] = [query.to_dict() for query in recent_queries]
-        client_data['recent_notifications'] = [notif.to_dict() for notif in recent_notifications]
+        
+        # Listas recentes incluídas por padrão; include_recent=false dispensa as consultas extras
+        if request.args.get('include_recent', 'true').lower() == 'true':
+            recent_queries = QueryHistory.query.filter_by(client_id=client_id)\
+                .order_by(QueryHistory.query_timestamp.desc())\
+                .limit(10).all()
+            recent_notifications = Notification.query.filter_by(client_id=client_id)\
+                .order_by(Notification.created_at.desc())\
+                .limit(5).all()
+            client_data['recent_queries'] = [query.to_dict() for query in recent_queries]
+            client_data['recent_notifications'] = [notif.to_dict() for notif in recent_notifications]
         
         return jsonify({
             'success': True,
@@ -169,12 +180,27 @@ def update_client(client_id):
             'process_number', 'process_year', 'notes', 'is_active'
         ]
         
+        # Mudança de processo não pode colidir com outro cliente
+        if 'process_number' in data or 'process_year' in data:
+            try:
+                existing = Client.find_by_process(
+                    data.get('process_number', client.process_number),
+                    data.get('process_year', client.process_year)
+                )
+            except ValueError as e:
+                return jsonify({
+                    'success': False,
+                    'error': str(e)
+                }), 400
+            if existing and existing.id != client.id:
+                return jsonify({
+                    'success': False,
+                    'error': 'Já existe um cliente com este número de processo e ano'
+                }), 400
+        
         for field in updatable_fields:
             if field in data:
-                if field == 'process_year':
-                    setattr(client, field, int(data[field]))
-                else:
-                    setattr(client, field, data[field])
+                setattr(client, field, data[field])
         
         client.updated_at = datetime.utcnow()
         db.session.commit()
@@ -215,6 +241,44 @@ def delete_client(client_id):
             'error': str(e)
         }), 500
 
+@clients_bp.route('/clients/bulk', methods=['POST'])
+def bulk_update_clients():
+    """
+    Operação em lote sobre clientes selecionados por ids ou filtros
+    
+    Corpo: {"action": "delete" | "deactivate" | "reactivate", "ids": [...],
+    "filters": {"status", "process_year"}}; sem ids nem filtros é preciso
+    "all": true. "delete" é o mesmo soft delete de DELETE /clients/<id>.
+    """
+    try:
+        data = request.get_json() or {}
+        action = data.get('action')
+        if action not in ('delete', 'deactivate', 'reactivate'):
+            return jsonify({
+                'success': False,
+                'error': "Ação inválida (use 'delete', 'deactivate' ou 'reactivate')"
+            }), 400
+        
+        scope = client_scope(data.get('ids'), data.get('filters'), data.get('all') is True)
+        affected = set_clients_active(scope, action == 'reactivate')
+        
+        return jsonify({
+            'success': True,
+            'action': action,
+            'affected': affected
+        })
+        
+    except (ValueError, TypeError) as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
 @clients_bp.route('/clients/<int:client_id>/query', methods=['POST'])
 def query_client_status(client_id):
     """Consulta o status atual de um cliente específico"""
@@ -256,28 +320,29 @@ def get_client_history(client_id):
     try:
         client = Client.query.get_or_404(client_id)
         
-        page = request.args.get('page', 1, type=int)
-        per_page = request.args.get('per_page', 20, type=int)
+        cursor = request.args.get('cursor')
+        per_page = min(max(request.args.get('per_page', 20, type=int), 1), 500)
+        include_total = request.args.get('include_total', 'false').lower() == 'true'
         
-        pagination = QueryHistory.query.filter_by(client_id=client_id)\
-            .order_by(QueryHistory.query_timestamp.desc())\
-            .paginate(page=page, per_page=per_page, error_out=False)
+        page = keyset_paginate(
+            QueryHistory.query.filter_by(client_id=client_id),
+            [QueryHistory.query_timestamp, QueryHistory.id], True,
+            cursor, per_page, include_total
+        )
         
-        history = [query.to_dict() for query in pagination.items]
+        history = [query.to_dict() for query in page['items']]
         
         return jsonify({
             'success': True,
             'history': history,
-            'pagination': {
-                'page': page,
-                'per_page': per_page,
-                'total': pagination.total,
-                'pages': pagination.pages,
-                'has_next': pagination.has_next,
-                'has_prev': pagination.has_prev
-            }
+            'pagination': page_response(page, per_page)
         })
         
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
     except Exception as e:
         return jsonify({
             'success': False,
@@ -322,32 +387,18 @@ def bulk_query_clients():
 def get_clients_stats():
     """Obtém estatísticas gerais dos clientes"""
     try:
-        total_clients = Client.query.filter_by(is_active=True).count()
-        clients_with_status = Client.query.filter(
-            Client.is_active == True,
-            Client.current_status.isnot(None)
-        ).count()
+        total_clients = StatsCounter.get_all().get('active_clients', 0)
+        
+        # Status mais comuns
+        status_counts = StatusCount.distribution()
+        clients_with_status = sum(count for _, count in status_counts)
         
         # Últimas consultas (últimas 24h)
         from datetime import datetime, timedelta
         yesterday = datetime.utcnow() - timedelta(days=1)
-        recent_queries = QueryHistory.query.filter(
-            QueryHistory.query_timestamp >= yesterday
-        ).count()
-        
-        successful_queries = QueryHistory.query.filter(
-            QueryHistory.query_timestamp >= yesterday,
-            QueryHistory.response_status == 'success'
-        ).count()
-        
-        # Status mais comuns
-        status_counts = db.session.query(
-            Client.current_status,
-            db.func.count(Client.id).label('count')
-        ).filter(
-            Client.is_active == True,
-            Client.current_status.isnot(None)
-        ).group_by(Client.current_status).all()
+        totals_24h = QueryStatsBucket.totals_since(yesterday)
+        recent_queries = totals_24h['total_queries']
+        successful_queries = totals_24h['successful_queries']
         
         return jsonify({
             'success': True,
@@ -487,10 +538,7 @@ def bulk_import_clients():
                     continue
                 
                 # Verifica se já existe
-                existing = Client.query.filter_by(
-                    process_number=process_number,
-                    process_year=process_year
-                ).first()
+                existing = Client.find_by_process(process_number, process_year)
                 
                 if existing:
                     errors.append(f'Linha {index + 2}: Cliente já existe (processo {process_number}/{process_year})')
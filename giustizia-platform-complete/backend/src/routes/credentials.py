@@ -1,6 +1,8 @@
 from flask import Blueprint, request, jsonify
 from datetime import datetime
 from src.models.credential import Credential
+from src.models.query_stats import cached_snapshot
+from src.models.rate_limit import rate_limits
 from src.models.user import db
 from src.services.giustizia_api import GiustiziaAPIService
 
@@ -198,7 +200,7 @@ def get_available_credentials():
         available_credentials = []
         
         for credential in credentials:
-            if credential.can_make_request():
+            if credential.is_available():
                 cred_data = credential.to_dict()
                 cred_data['available'] = True
                 available_credentials.append(cred_data)
@@ -224,45 +226,17 @@ def get_available_credentials():
 def get_credentials_stats():
     """Obtém estatísticas das credenciais"""
     try:
-        total_credentials = Credential.query.count()
-        active_credentials = Credential.query.filter_by(is_active=True).count()
-        
-        # Credenciais disponíveis agora
-        available_now = 0
-        credentials = Credential.query.filter_by(is_active=True).all()
-        for credential in credentials:
-            if credential.can_make_request():
-                available_now += 1
-        
-        # Estatísticas de uso
-        total_requests = db.session.query(
-            db.func.sum(Credential.total_requests)
-        ).scalar() or 0
-        
-        successful_requests = db.session.query(
-            db.func.sum(Credential.successful_requests)
-        ).scalar() or 0
-        
-        failed_requests = db.session.query(
-            db.func.sum(Credential.failed_requests)
-        ).scalar() or 0
-        
-        avg_response_time = db.session.query(
-            db.func.avg(Credential.average_response_time)
-        ).filter(Credential.average_response_time > 0).scalar() or 0
+        # Uma consulta agregada, sem gravar nada, servida de um snapshot curto
+        stats = cached_snapshot('credentials_stats', Credential.pool_stats)
+        total_requests = stats['total_requests']
         
         return jsonify({
             'success': True,
-            'stats': {
-                'total_credentials': total_credentials,
-                'active_credentials': active_credentials,
-                'available_now': available_now,
-                'total_requests': int(total_requests),
-                'successful_requests': int(successful_requests),
-                'failed_requests': int(failed_requests),
-                'success_rate': (successful_requests / total_requests * 100) if total_requests > 0 else 0,
-                'average_response_time': round(float(avg_response_time), 2)
-            }
+            'stats': dict(
+                stats,
+                success_rate=(stats['successful_requests'] / total_requests * 100) if total_requests > 0 else 0,
+                average_response_time=round(stats['average_response_time'], 2)
+            )
         })
         
     except Exception as e:
@@ -282,6 +256,7 @@ def reset_rate_limits():
             credential.minute_window_start = None
         
         db.session.commit()
+        rate_limits.reset({credential.id for credential in credentials})
         
         return jsonify({
             'success': True,
@@ -5,7 +5,12 @@ from src.models.credential import Credential
 from src.models.query_history import QueryHistory
 from src.models.notification import Notification
 from src.models.system_config import SystemConfig
+from src.models.query_stats import QueryStatsBucket, StatusCount, cached_snapshot, overview_totals
+from src.models.bulk_actions import (
+    notification_scope, mark_notifications_read, delete_notifications, set_notifications_severity
+)
 from src.models.user import db
+from src.routes.pagination import keyset_paginate, page_response
 
 dashboard_bp = Blueprint('dashboard', __name__)
 
@@ -13,80 +18,10 @@ dashboard_bp = Blueprint('dashboard', __name__)
 def get_dashboard_overview():
     """Obtém dados gerais para o dashboard"""
     try:
-        # Estatísticas básicas
-        total_clients = Client.query.filter_by(is_active=True).count()
-        total_credentials = Credential.query.filter_by(is_active=True).count()
-        
-        # Credenciais disponíveis agora
-        available_credentials = 0
-        credentials = Credential.query.filter_by(is_active=True).all()
-        for credential in credentials:
-            if credential.can_make_request():
-                available_credentials += 1
-        
-        # Estatísticas das últimas 24 horas
-        yesterday = datetime.utcnow() - timedelta(days=1)
-        
-        queries_24h = QueryHistory.query.filter(
-            QueryHistory.query_timestamp >= yesterday
-        ).count()
-        
-        successful_queries_24h = QueryHistory.query.filter(
-            QueryHistory.query_timestamp >= yesterday,
-            QueryHistory.response_status == 'success'
-        ).count()
-        
-        status_changes_24h = QueryHistory.query.filter(
-            QueryHistory.query_timestamp >= yesterday,
-            QueryHistory.status_changed == True
-        ).count()
-        
-        # Notificações não lidas
-        unread_notifications = Notification.query.filter_by(is_read=False).count()
-        
-        # Últimas mudanças de status
-        recent_changes = db.session.query(QueryHistory, Client).join(Client).filter(
-            QueryHistory.status_changed == True,
-            QueryHistory.query_timestamp >= yesterday
-        ).order_by(QueryHistory.query_timestamp.desc()).limit(10).all()
-        
-        recent_changes_data = []
-        for query, client in recent_changes:
-            recent_changes_data.append({
-                'client_name': client.name,
-                'process_number': client.process_number,
-                'process_year': client.process_year,
-                'previous_status': query.previous_status,
-                'new_status': query.status_result,
-                'timestamp': query.query_timestamp.isoformat()
-            })
-        
-        # Distribuição de status
-        status_distribution = db.session.query(
-            Client.current_status,
-            db.func.count(Client.id).label('count')
-        ).filter(
-            Client.is_active == True,
-            Client.current_status.isnot(None)
-        ).group_by(Client.current_status).all()
-        
+        # Resumo somente leitura, recalculado no máximo uma vez por SNAPSHOT_TTL
         return jsonify({
             'success': True,
-            'overview': {
-                'total_clients': total_clients,
-                'total_credentials': total_credentials,
-                'available_credentials': available_credentials,
-                'queries_24h': queries_24h,
-                'successful_queries_24h': successful_queries_24h,
-                'success_rate_24h': (successful_queries_24h / queries_24h * 100) if queries_24h > 0 else 0,
-                'status_changes_24h': status_changes_24h,
-                'unread_notifications': unread_notifications,
-                'recent_changes': recent_changes_data,
-                'status_distribution': [
-                    {'status': status or 'Sem status', 'count': count}
-                    for status, count in status_distribution
-                ]
-            }
+            'overview': cached_snapshot('dashboard_overview', _build_overview)
         })
         
     except Exception as e:
@@ -95,6 +30,51 @@ def get_dashboard_overview():
             'error': str(e)
         }), 500
 
+def _build_overview():
+    """Monta o resumo do dashboard: um agregado, as últimas mudanças e a distribuição"""
+    yesterday = datetime.utcnow() - timedelta(days=1)
+    
+    # Contadores, credenciais e totais das últimas 24 horas em uma consulta
+    totals = overview_totals(yesterday)
+    queries_24h = totals['total_queries']
+    successful_queries_24h = totals['successful_queries']
+    
+    # Últimas mudanças de status
+    recent_changes = db.session.query(QueryHistory, Client).join(Client).filter(
+        QueryHistory.status_changed == True,
+        QueryHistory.query_timestamp >= yesterday
+    ).order_by(QueryHistory.query_timestamp.desc()).limit(10).all()
+    
+    recent_changes_data = []
+    for query, client in recent_changes:
+        recent_changes_data.append({
+            'client_name': client.name,
+            'process_number': client.process_number,
+            'process_year': client.process_year,
+            'previous_status': query.previous_status,
+            'new_status': query.status_result,
+            'timestamp': query.query_timestamp.isoformat()
+        })
+    
+    # Distribuição de status
+    status_distribution = StatusCount.distribution()
+    
+    return {
+        'total_clients': totals['active_clients'],
+        'total_credentials': totals['active_credentials'],
+        'available_credentials': totals['available_credentials'],
+        'queries_24h': queries_24h,
+        'successful_queries_24h': successful_queries_24h,
+        'success_rate_24h': (successful_queries_24h / queries_24h * 100) if queries_24h > 0 else 0,
+        'status_changes_24h': totals['status_changes'],
+        'unread_notifications': totals['unread_notifications'],
+        'recent_changes': recent_changes_data,
+        'status_distribution': [
+            {'status': status or 'Sem status', 'count': count}
+            for status, count in status_distribution
+        ]
+    }
+
 @dashboard_bp.route('/dashboard/activity', methods=['GET'])
 def get_activity_data():
     """Obtém dados de atividade para gráficos"""
@@ -103,23 +83,15 @@ def get_activity_data():
         start_date = datetime.utcnow() - timedelta(days=days)
         
         # Consultas por dia
-        daily_queries = db.session.query(
-            db.func.date(QueryHistory.query_timestamp).label('date'),
-            db.func.count(QueryHistory.id).label('total'),
-            db.func.sum(db.case([(QueryHistory.response_status == 'success', 1)], else_=0)).label('successful')
-        ).filter(
-            QueryHistory.query_timestamp >= start_date
-        ).group_by(
-            db.func.date(QueryHistory.query_timestamp)
-        ).order_by('date').all()
+        daily_queries = QueryStatsBucket.daily_since(start_date)
         
         activity_data = []
-        for query_data in daily_queries:
+        for date, totals in daily_queries.items():
             activity_data.append({
-                'date': query_data.date.isoformat(),
-                'total_queries': int(query_data.total),
-                'successful_queries': int(query_data.successful or 0),
-                'failed_queries': int(query_data.total) - int(query_data.successful or 0)
+                'date': date.isoformat(),
+                'total_queries': totals['total'],
+                'successful_queries': totals['successful'],
+                'failed_queries': totals['total'] - totals['successful']
             })
         
         # Performance por credencial
@@ -160,8 +132,9 @@ def get_activity_data():
 def get_notifications():
     """Lista notificações com filtros"""
     try:
-        page = request.args.get('page', 1, type=int)
-        per_page = request.args.get('per_page', 20, type=int)
+        cursor = request.args.get('cursor')
+        per_page = min(max(request.args.get('per_page', 20, type=int), 1), 500)
+        include_total = request.args.get('include_total', 'false').lower() == 'true'
         unread_only = request.args.get('unread_only', 'false').lower() == 'true'
         notification_type = request.args.get('type', '')
         
@@ -173,25 +146,24 @@ def get_notifications():
         if notification_type:
             query = query.filter(Notification.notification_type == notification_type)
         
-        pagination = query.order_by(Notification.created_at.desc()).paginate(
-            page=page, per_page=per_page, error_out=False
+        page = keyset_paginate(
+            query, [Notification.created_at, Notification.id], True,
+            cursor, per_page, include_total
         )
         
-        notifications = [notif.to_dict() for notif in pagination.items]
+        notifications = [notif.to_dict() for notif in page['items']]
         
         return jsonify({
             'success': True,
             'notifications': notifications,
-            'pagination': {
-                'page': page,
-                'per_page': per_page,
-                'total': pagination.total,
-                'pages': pagination.pages,
-                'has_next': pagination.has_next,
-                'has_prev': pagination.has_prev
-            }
+            'pagination': page_response(page, per_page)
         })
         
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
     except Exception as e:
         return jsonify({
             'success': False,
@@ -220,21 +192,57 @@ def mark_notification_read(notification_id):
 def mark_all_notifications_read():
     """Marca todas as notificações como lidas"""
     try:
-        unread_notifications = Notification.query.filter_by(is_read=False).all()
+        # Um único UPDATE, sem carregar as notificações
+        marked = mark_notifications_read(notification_scope(select_all=True))
         
-        for notification in unread_notifications:
-            notification.is_read = True
-            notification.read_at = datetime.utcnow()
+        return jsonify({
+            'success': True,
+            'message': f'{marked} notificações marcadas como lidas'
+        })
         
-        db.session.commit()
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@dashboard_bp.route('/notifications/bulk', methods=['POST'])
+def bulk_notifications():
+    """
+    Operação em lote sobre notificações selecionadas por ids ou filtros
+    
+    Corpo: {"action": "mark_read" | "delete" | "set_severity", "ids": [...],
+    "filters": {...}, "severity": ...}; sem ids nem filtros é preciso "all": true.
+    """
+    try:
+        data = request.get_json() or {}
+        action = data.get('action')
+        if action not in ('mark_read', 'delete', 'set_severity'):
+            return jsonify({
+                'success': False,
+                'error': "Ação inválida (use 'mark_read', 'delete' ou 'set_severity')"
+            }), 400
+        
+        scope = notification_scope(data.get('ids'), data.get('filters'), data.get('all') is True)
+        if action == 'mark_read':
+            affected = mark_notifications_read(scope)
+        elif action == 'delete':
+            affected = delete_notifications(scope)
+        else:
+            affected = set_notifications_severity(scope, data.get('severity'))
         
         return jsonify({
             'success': True,
-            'message': f'{len(unread_notifications)} notificações marcadas como lidas'
+            'action': action,
+            'affected': affected
         })
         
+    except (ValueError, TypeError) as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
     except Exception as e:
-        db.session.rollback()
         return jsonify({
             'success': False,
             'error': str(e)
@@ -318,19 +326,15 @@ def get_system_health():
             health_data['database'] = 'error'
             health_data['overall_status'] = 'unhealthy'
         
-        # Verifica credenciais disponíveis
-        available_credentials = 0
-        total_credentials = Credential.query.filter_by(is_active=True).count()
+        # Verifica credenciais disponíveis (agregado somente leitura)
+        pool = Credential.pool_stats()
+        available_credentials = pool['available_now']
+        total_credentials = pool['active_credentials']
         
         if total_credentials == 0:
             health_data['credentials'] = 'warning'
             health_data['overall_status'] = 'degraded'
         else:
-            credentials = Credential.query.filter_by(is_active=True).all()
-            for credential in credentials:
-                if credential.can_make_request():
-                    available_credentials += 1
-            
             if available_credentials == 0:
                 health_data['credentials'] = 'error'
                 health_data['overall_status'] = 'unhealthy'
@@ -0,0 +1,62 @@
+from datetime import datetime
+from src.models.user import db
+from src.models.pagination import decode_cursor, build_page, cached_count
+
+def keyset_paginate(query, sort_columns, descending, cursor=None, per_page=50, include_total=False):
+    """
+    Pagina uma query SQLAlchemy pela chave de ordenação, sem OFFSET
+    
+    Args:
+        query: Query já filtrada (sem ordenação)
+        sort_columns: Colunas da chave de ordenação (a última deve ser única)
+        descending: Se a ordem natural da listagem é decrescente
+        cursor: Cursor opaco recebido da página anterior
+        per_page: Tamanho da página
+        include_total: Se deve incluir o total (calculado com cache)
+    
+    Returns:
+        Dict com items (objetos ORM), next_cursor, prev_cursor e opcionalmente total
+    
+    Raises:
+        ValueError: se o cursor for inválido
+    """
+    total_query = query
+    direction = None
+    
+    if cursor:
+        values, direction = decode_cursor(cursor)
+        if len(values) != len(sort_columns):
+            raise ValueError("Cursor inválido")
+        values = [
+            datetime.fromisoformat(value) if isinstance(column.type, db.DateTime) and value else value
+            for column, value in zip(sort_columns, values)
+        ]
+        key = db.tuple_(*sort_columns)
+        forward = (direction == 'next') != descending
+        query = query.filter(key > db.tuple_(*values) if forward else key < db.tuple_(*values))
+    
+    ascending = descending == (direction == 'prev')
+    query = query.order_by(*[column.asc() if ascending else column.desc() for column in sort_columns])
+    
+    rows = query.limit(per_page + 1).all()
+    page = build_page(rows, per_page, direction, lambda row: [getattr(row, column.key) for column in sort_columns])
+    
+    if include_total:
+        compiled = total_query.statement.compile()
+        cache_key = f'{compiled}:{sorted(compiled.params.items())}'
+        page['total'] = cached_count(cache_key, total_query.count)
+    
+    return page
+
+def page_response(page, per_page):
+    """Metadados de paginação devolvidos pelas rotas"""
+    pagination = {
+        'per_page': per_page,
+        'next_cursor': page['next_cursor'],
+        'prev_cursor': page['prev_cursor'],
+        'has_next': page['next_cursor'] is not None,
+        'has_prev': page['prev_cursor'] is not None
+    }
+    if 'total' in page:
+        pagination['total'] = page['total']
+    return pagination
@@ -0,0 +1,192 @@
+import glob
+import json
+import logging
+import os
+from datetime import datetime
+from typing import Dict, List, Optional
+from models.database import Database
+
+# Tabelas exportadas de forma incremental: tabela -> (coluna de data da partição, SELECT)
+INCREMENTAL_TABLES = {
+    'query_history': ('query_timestamp', '''
+        SELECT qh.id, qh.client_id, qh.credential_id, qh.process_number, qh.process_year,
+               qh.status_id, s.name AS status_name, qh.success, qh.error, qh.has_changes,
+               qh.payload_hash, qh.query_timestamp
+        FROM query_history qh
+        LEFT JOIN statuses s ON s.id = qh.status_id
+        WHERE qh.id > ?
+        ORDER BY qh.id
+        LIMIT ?
+    '''),
+    'status_transitions': ('changed_at', '''
+        SELECT t.id, t.client_id, t.from_status_id, f.name AS from_status,
+               t.to_status_id, s.name AS to_status, t.changed_at
+        FROM status_transitions t
+        LEFT JOIN statuses f ON f.id = t.from_status_id
+        LEFT JOIN statuses s ON s.id = t.to_status_id
+        WHERE t.id > ?
+        ORDER BY t.id
+        LIMIT ?
+    ''')
+}
+
+# Agregados pequenos, regravados por completo a cada exportação
+AGGREGATE_TABLES = {
+    'daily_query_stats': 'SELECT * FROM daily_query_stats ORDER BY day',
+    'credential_query_stats': 'SELECT * FROM credential_query_stats ORDER BY credential_id',
+    'status_counts': '''
+        SELECT c.status_id, s.name AS status_name, c.client_count
+        FROM status_counts c
+        LEFT JOIN statuses s ON s.id = c.status_id
+        ORDER BY c.status_id
+    '''
+}
+
+# Colunas booleanas gravadas como 0/1 no SQLite
+BOOLEAN_COLUMNS = ('success', 'has_changes')
+
+WATERMARK_FILE = '_watermark.json'
+
+class AnalyticsExportJob:
+    """
+    Exportação incremental para Parquet, para análises fora do banco
+
+    O histórico de consultas e as transições de status são gravados em
+    arquivos particionados por dia (<tabela>/day=YYYY-MM-DD/part-*.parquet)
+    a partir do último id exportado, guardado em _watermark.json. A marca é
+    atualizada a cada lote, então uma execução interrompida continua de onde
+    parou. Os agregados são regravados inteiros em aggregates/.
+    """
+
+    def __init__(self, db: Database, export_dir: str = 'analytics', batch_size: int = 50000):
+        self.db = db
+        self.export_dir = export_dir
+        if not os.path.isabs(export_dir):
+            self.export_dir = os.path.join(os.path.dirname(os.path.abspath(db.db_path)), export_dir)
+        self.batch_size = batch_size
+        self.logger = logging.getLogger(__name__)
+
+    @classmethod
+    def from_settings(cls, db: Database) -> 'AnalyticsExportJob':
+        """Cria o job com o diretório configurado nas settings"""
+        settings = db.get_settings()
+        return cls(db, export_dir=settings.get('analytics_export_dir', 'analytics'))
+
+    def run(self) -> Dict:
+        """
+        Executa a exportação
+
+        Returns:
+            Dict com as linhas exportadas por tabela e a marca d'água final
+        """
+        import pandas as pd
+
+        self.logger.info(f"Iniciando exportação analítica em {self.export_dir}")
+        watermark = self._load_watermark()
+        exported = {}
+
+        for table, (date_column, sql) in INCREMENTAL_TABLES.items():
+            exported[table] = 0
+            while True:
+                rows = self._fetch(sql, (watermark.get(table, 0), self.batch_size))
+                if not rows:
+                    break
+                self._write_partitions(pd.DataFrame(rows), table, date_column)
+                exported[table] += len(rows)
+                watermark[table] = rows[-1]['id']
+                self._save_watermark(watermark)
+                if len(rows) < self.batch_size:
+                    break
+
+        for table, sql in AGGREGATE_TABLES.items():
+            frame = pd.DataFrame(self._fetch(sql))
+            self._write_file(frame, os.path.join(self.export_dir, 'aggregates', f'{table}.parquet'))
+            exported[table] = len(frame)
+
+        result = {'exported_rows': exported, 'watermark': watermark}
+        self.logger.info(f"Exportação analítica concluída: {result}")
+        return result
+
+    def _fetch(self, sql: str, params: tuple = ()) -> List[Dict]:
+        """Lê um lote em uma conexão curta, para não segurar o banco"""
+        with self.db.get_connection() as conn:
+            return [dict(row) for row in conn.execute(sql, params).fetchall()]
+
+    def _write_partitions(self, frame, table: str, date_column: str):
+        """Grava um lote em um arquivo por dia, nomeado pelo intervalo de ids"""
+        import pandas as pd
+
+        frame[date_column] = pd.to_datetime(frame[date_column], errors='coerce')
+        for column in BOOLEAN_COLUMNS:
+            if column in frame:
+                frame[column] = frame[column].astype(bool)
+        # Ids opcionais continuam inteiros (com nulos) em vez de virar float
+        for column in frame.columns:
+            if column.endswith('_id'):
+                frame[column] = frame[column].astype('Int64')
+        days = frame[date_column].dt.strftime('%Y-%m-%d').fillna('unknown')
+        for day, part in frame.groupby(days):
+            directory = os.path.join(self.export_dir, table, f'day={day}')
+            name = f"part-{part['id'].iloc[0]:012d}-{part['id'].iloc[-1]:012d}.parquet"
+            self._write_file(part, os.path.join(directory, name))
+
+    def _write_file(self, frame, path: str):
+        """Grava via arquivo temporário para leitores nunca verem arquivos pela metade"""
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temporary = f'{path}.tmp'
+        frame.to_parquet(temporary, index=False)
+        os.replace(temporary, path)
+
+    def _load_watermark(self) -> Dict:
+        path = os.path.join(self.export_dir, WATERMARK_FILE)
+        if not os.path.exists(path):
+            return {}
+        with open(path, encoding='utf-8') as watermark:
+            return json.load(watermark)
+
+    def _save_watermark(self, watermark: Dict):
+        os.makedirs(self.export_dir, exist_ok=True)
+        path = os.path.join(self.export_dir, WATERMARK_FILE)
+        with open(f'{path}.tmp', 'w', encoding='utf-8') as output:
+            json.dump(dict(watermark, updated_at=datetime.utcnow().isoformat()), output)
+        os.replace(f'{path}.tmp', path)
+
+def read_export(export_dir: str, dataset: str, start: Optional[str] = None, end: Optional[str] = None,
+                columns: Optional[List[str]] = None):
+    """
+    Lê um conjunto exportado com memory map, sem tocar no banco
+
+    Args:
+        export_dir: Diretório da exportação
+        dataset: 'query_history', 'status_transitions' ou um agregado
+        start: Primeiro dia incluído (YYYY-MM-DD), apenas para conjuntos particionados
+        end: Dia final exclusivo (YYYY-MM-DD)
+        columns: Colunas a carregar (todas se None)
+
+    Returns:
+        DataFrame com as linhas, vazio se nada foi exportado
+    """
+    import pandas as pd
+
+    if dataset in AGGREGATE_TABLES:
+        path = os.path.join(export_dir, 'aggregates', f'{dataset}.parquet')
+        if not os.path.exists(path):
+            return pd.DataFrame(columns=columns)
+        return pd.read_parquet(path, columns=columns, memory_map=True)
+
+    if dataset not in INCREMENTAL_TABLES:
+        raise ValueError(f"Conjunto desconhecido: {dataset}")
+
+    files = []
+    for directory in sorted(glob.glob(os.path.join(export_dir, dataset, 'day=*'))):
+        day = os.path.basename(directory)[len('day='):]
+        if (start and day < start) or (end and day >= end):
+            continue
+        files.extend(sorted(glob.glob(os.path.join(directory, '*.parquet'))))
+
+    if not files:
+        return pd.DataFrame(columns=columns)
+    return pd.concat(
+        [pd.read_parquet(path, columns=columns, memory_map=True) for path in files],
+        ignore_index=True
+    )
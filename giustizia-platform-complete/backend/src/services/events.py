@@ -0,0 +1,74 @@
+import json
+import threading
+import time
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+
+class EventBus:
+    """
+    Barramento de eventos em memória para o stream SSE
+
+    Mantém os últimos eventos em um buffer circular para que um cliente que
+    reconecta com Last-Event-ID receba o que perdeu. Os ids têm o formato
+    '<boot>:<seq>': depois de um reinício do servidor, ids antigos não casam
+    e o cliente é avisado para recarregar tudo.
+    """
+
+    def __init__(self, buffer_size: int = 1000):
+        self.boot = str(int(time.time()))
+        self._events = deque(maxlen=buffer_size)
+        self._seq = 0
+        self._condition = threading.Condition()
+
+    def publish(self, event_type: str, data: Dict) -> str:
+        """Publica um evento e acorda os assinantes"""
+        with self._condition:
+            self._seq += 1
+            event = {'id': f'{self.boot}:{self._seq}', 'seq': self._seq, 'type': event_type, 'data': data}
+            self._events.append(event)
+            self._condition.notify_all()
+            return event['id']
+
+    def _parse(self, last_event_id: Optional[str]) -> Optional[int]:
+        """Seq do último evento recebido, ou None se o id não for deste boot"""
+        if not last_event_id:
+            return 0
+        boot, _, seq = last_event_id.partition(':')
+        if boot != self.boot or not seq.isdigit():
+            return None
+        return int(seq)
+
+    def events_after(self, last_event_id: Optional[str]) -> Tuple[List[Dict], bool]:
+        """
+        Eventos posteriores ao id informado
+
+        Returns:
+            Tupla (eventos, reset). reset é True quando o id é de outro boot ou
+            já saiu do buffer: o cliente perdeu eventos e deve recarregar.
+        """
+        seq = self._parse(last_event_id)
+        with self._condition:
+            if seq is None or seq > self._seq:
+                return [], True
+            oldest = self._events[0]['seq'] if self._events else self._seq + 1
+            if seq + 1 < oldest:
+                return [], True
+            return [event for event in self._events if event['seq'] > seq], False
+
+    def wait(self, last_event_id: str, timeout: float) -> List[Dict]:
+        """Bloqueia até haver eventos depois do id ou até o timeout"""
+        seq = self._parse(last_event_id) or 0
+        with self._condition:
+            self._condition.wait_for(lambda: self._seq > seq, timeout)
+            return [event for event in self._events if event['seq'] > seq]
+
+    @property
+    def last_event_id(self) -> str:
+        return f'{self.boot}:{self._seq}'
+
+def format_sse(event: Dict) -> str:
+    """Serializa um evento no formato text/event-stream"""
+    return f"id: {event['id']}\nevent: {event['type']}\ndata: {json.dumps(event['data'], default=str)}\n\n"
+
+# Barramento único do processo (servidor com um worker)
+event_bus = EventBus()
@@ -3,7 +3,7 @@ import json
 import time
 import logging
 from datetime import datetime
-from typing import Dict, List, Optional, Tuple
+from typing import Callable, Dict, List, Optional, Tuple
 
 class GiustiziaAPI:
     """
@@ -253,14 +253,18 @@ class GiustiziaAPI:
                 'message': f'Erro ao testar credenciais: {str(e)}'
             }
     
-    def batch_query(self, queries: List[Dict], credentials: List[Dict]) -> List[Dict]:
+    def batch_query(self, queries: List[Dict], credentials: List[Dict],
+                    on_result: Optional[Callable[[Dict], None]] = None,
+                    should_stop: Optional[Callable[[], bool]] = None) -> List[Dict]:
         """
         Executa múltiplas consultas usando pool de credenciais
         
         Args:
             queries: Lista de dicionários com process_number, process_year, client_id
             credentials: Lista de credenciais disponíveis
-            
+            on_result: Chamado com cada resultado assim que ele fica pronto
+            should_stop: Consultado antes de cada consulta; True interrompe o lote
+                        
         Returns:
             Lista com resultados das consultas
         """
@@ -268,6 +272,8 @@ class GiustiziaAPI:
         credential_index = 0
         
         for query in queries:
+            if should_stop and should_stop():
+                break
             if not credentials:
                 results.append({
                     'success': False,
@@ -276,6 +282,8 @@ class GiustiziaAPI:
                     'process_number': query.get('process_number'),
                     'process_year': query.get('process_year')
                 })
+                if on_result:
+                    on_result(results[-1])
                 continue
             
             # Usar credencial em rotação
@@ -288,11 +296,16 @@ class GiustiziaAPI:
                 credential['token']
             )
             
-            # Adicionar informações do cliente
+            # Adicionar informações do cliente (respostas de erro não trazem o processo)
+            result.setdefault('process_number', query['process_number'])
+            result.setdefault('process_year', query['process_year'])
             result['client_id'] = query.get('client_id')
             result['client_name'] = query.get('client_name')
+            result['credential_id'] = credential.get('id')
             
             results.append(result)
+            if on_result:
+                on_result(result)
             
             # Próxima credencial
             credential_index += 1
@@ -0,0 +1,64 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+class IdempotencyStore:
+    """
+    Respostas de POSTs guardadas por Idempotency-Key
+
+    Repetir a requisição com a mesma chave devolve a resposta original em vez
+    de executar de novo. A chave vale para um único corpo: reutilizá-la com
+    outro conteúdo é rejeitado. Enquanto a primeira requisição não termina,
+    as repetições recebem 'in_progress'.
+    """
+
+    def __init__(self, ttl: float = 86400, max_entries: int = 10000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: 'OrderedDict[str, Dict]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def begin(self, key: str, fingerprint: str) -> Tuple[str, Optional[Dict]]:
+        """
+        Registra o início de uma requisição
+
+        Returns:
+            Tupla (estado, resposta): 'new' (executar), 'replay' (devolver a
+            resposta guardada), 'in_progress' ou 'mismatch' (corpo diferente)
+        """
+        with self._lock:
+            self._expire()
+            entry = self._entries.get(key)
+            if entry is None:
+                self._entries[key] = {'fingerprint': fingerprint, 'response': None, 'created': time.monotonic()}
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+                return 'new', None
+            if entry['fingerprint'] != fingerprint:
+                return 'mismatch', None
+            if entry['response'] is None:
+                return 'in_progress', None
+            return 'replay', entry['response']
+
+    def complete(self, key: str, response: Dict):
+        """Guarda a resposta (status, corpo e cabeçalhos) para as repetições"""
+        with self._lock:
+            if key in self._entries:
+                self._entries[key]['response'] = response
+
+    def abandon(self, key: str):
+        """Descarta a chave (erro do servidor): uma nova tentativa executa de novo"""
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def _expire(self):
+        limit = time.monotonic() - self.ttl
+        while self._entries:
+            key, entry = next(iter(self._entries.items()))
+            if entry['created'] >= limit:
+                break
+            del self._entries[key]
+
+# Armazenamento único do processo (servidor com um worker)
+idempotency_store = IdempotencyStore()
@@ -0,0 +1,278 @@
+import logging
+import queue
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+
+class Job:
+    """
+    Execução assíncrona de consultas (manual ou em lote)
+
+    Guarda o progresso e o resultado de cada item na ordem em que ficam
+    prontos; leitores acompanham a lista por offset.
+    """
+
+    FINISHED = ('completed', 'failed', 'cancelled')
+
+    def __init__(self, kind: str, params: Dict):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.params = params
+        self.status = 'queued'
+        self.total = 0
+        self.successful = 0
+        self.failed = 0
+        self.changes = 0
+        self.results: List[Dict] = []
+        self.message = None
+        self.created_at = datetime.now()
+        self.started_at = None
+        self.finished_at = None
+        self._started = None
+        self._cancel = threading.Event()
+        self._condition = threading.Condition()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancel.is_set()
+
+    @property
+    def finished(self) -> bool:
+        return self.status in self.FINISHED
+
+    def start(self, total: int):
+        """Marca o início do processamento com o total de itens"""
+        with self._condition:
+            self.status = 'running'
+            self.total = total
+            self.started_at = datetime.now()
+            self._started = time.monotonic()
+            self._condition.notify_all()
+
+    def add_result(self, item: Dict):
+        """Registra o resultado de um item e acorda os leitores"""
+        with self._condition:
+            self.results.append(item)
+            if item.get('success'):
+                self.successful += 1
+            else:
+                self.failed += 1
+            # Mudanças vistas por outra execução já foram contadas (e notificadas) por ela
+            if item.get('has_changes') and not item.get('shared_from'):
+                self.changes += 1
+            self._condition.notify_all()
+
+    def cancel(self):
+        """Pede o cancelamento; o item em andamento termina antes"""
+        self._cancel.set()
+
+    def finish(self, status: str, message: str = None):
+        with self._condition:
+            self.status = status
+            self.message = message
+            self.finished_at = datetime.now()
+            self._condition.notify_all()
+
+    def results_after(self, offset: int, timeout: float) -> Tuple[List[Dict], bool]:
+        """
+        Resultados a partir do offset, esperando até o timeout se ainda não há
+
+        Returns:
+            Tupla (resultados, terminado)
+        """
+        with self._condition:
+            self._condition.wait_for(lambda: len(self.results) > offset or self.finished, timeout)
+            return self.results[offset:], self.finished
+
+    def eta_seconds(self) -> Optional[float]:
+        """Tempo restante estimado pela média por item até agora"""
+        done = len(self.results)
+        if self.status != 'running' or not done:
+            return None
+        elapsed = time.monotonic() - self._started
+        return round(elapsed / done * (self.total - done), 1)
+
+    def to_dict(self) -> Dict:
+        return {
+            'id': self.id,
+            'kind': self.kind,
+            'status': self.status,
+            'cancel_requested': self.cancelled,
+            'total': self.total,
+            'done': len(self.results),
+            'successful': self.successful,
+            'failed': self.failed,
+            'changes': self.changes,
+            'eta_seconds': self.eta_seconds(),
+            'message': self.message,
+            'created_at': self.created_at.isoformat(),
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
+
+class JobManager:
+    """
+    Fila de jobs executados um de cada vez em uma thread própria
+
+    Os jobs disputam as mesmas credenciais e o mesmo limite da API, então
+    rodam em sequência, na ordem de chegada. Os jobs terminados mais antigos
+    são descartados além de max_finished.
+    """
+
+    def __init__(self, max_finished: int = 100):
+        self.max_finished = max_finished
+        self._jobs: 'OrderedDict[str, Job]' = OrderedDict()
+        self._targets: Dict[str, Callable[[Job], Dict]] = {}
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self.logger = logging.getLogger(__name__)
+
+    def submit(self, kind: str, params: Dict, target: Callable[[Job], Dict]) -> Job:
+        """
+        Enfileira um job
+
+        Args:
+            kind: Tipo do job ('manual', 'bulk')
+            params: Parâmetros expostos na consulta do job
+            target: Função que executa o job; retorna dict com success e message
+        """
+        job = Job(kind, params)
+        with self._lock:
+            self._jobs[job.id] = job
+            self._targets[job.id] = target
+            self._prune()
+            if not self._thread or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._worker, daemon=True)
+                self._thread.start()
+        self._queue.put(job)
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self._jobs.get(job_id)
+
+    def find_covering(self, client_ids: Optional[List[int]]) -> Optional[Job]:
+        """Job na fila ou em execução que já consulta todos os clientes pedidos"""
+        with self._lock:
+            jobs = list(self._jobs.values())
+        for job in reversed(jobs):
+            if job.finished or job.cancelled:
+                continue
+            covered = job.params.get('client_ids')
+            if covered is None or (client_ids is not None and set(client_ids) <= set(covered)):
+                return job
+        return None
+
+    def list(self) -> List[Dict]:
+        """Jobs mais recentes primeiro"""
+        with self._lock:
+            jobs = list(self._jobs.values())
+        return [job.to_dict() for job in reversed(jobs)]
+
+    def _worker(self):
+        while True:
+            job = self._queue.get()
+            target = self._targets.pop(job.id, None)
+            if job.cancelled or target is None:
+                job.finish('cancelled', 'Cancelado antes de iniciar')
+                continue
+            try:
+                result = target(job)
+                if job.cancelled:
+                    job.finish('cancelled', result.get('message'))
+                else:
+                    job.finish('completed' if result.get('success') else 'failed', result.get('message'))
+            except Exception as e:
+                self.logger.error(f"Erro no job {job.id}: {str(e)}")
+                job.finish('failed', str(e))
+
+    def _prune(self):
+        finished = [job_id for job_id, job in self._jobs.items() if job.finished]
+        for job_id in finished[:max(len(finished) - self.max_finished, 0)]:
+            del self._jobs[job_id]
+
+class Claim:
+    """Processo reservado por uma execução; guarda o resultado quando sai"""
+
+    def __init__(self, run_id: str):
+        self.run_id = run_id
+        self.result: Optional[Dict] = None
+        self.resolved_at = None
+        self._done = threading.Event()
+
+    def resolve(self, result: Optional[Dict]):
+        self.result = result
+        self.resolved_at = time.monotonic()
+        self._done.set()
+
+    def wait(self, timeout: float = None) -> Optional[Dict]:
+        self._done.wait(timeout)
+        return self.result
+
+    @property
+    def shareable(self) -> bool:
+        """Pendente, ou concluído com sucesso"""
+        return not self._done.is_set() or bool(self.result and self.result.get('success'))
+
+class RunCoordinator:
+    """
+    Evita consultar o mesmo processo em execuções sobrepostas
+
+    Cada execução (diária, manual ou em lote) reserva os processos que vai
+    consultar. Uma execução que começa enquanto outra está em andamento
+    consulta apenas os processos livres e reaproveita os resultados da outra
+    para os demais, esperando pelos que ainda estão pendentes. Resultados
+    bem-sucedidos continuam reaproveitáveis por result_ttl segundos.
+    """
+
+    def __init__(self, result_ttl: float = 600):
+        self.result_ttl = result_ttl
+        self._claims: Dict[str, Claim] = {}
+        self._lock = threading.Lock()
+
+    def claim(self, run_id: str, keys: List[str]) -> Tuple[List[str], Dict[str, Claim]]:
+        """
+        Reserva os processos livres
+
+        Returns:
+            Tupla (chaves reservadas para esta execução, {chave: reserva de outra execução})
+        """
+        own, shared = [], {}
+        with self._lock:
+            self._expire()
+            for key in keys:
+                claim = self._claims.get(key)
+                if claim and claim.run_id != run_id and claim.shareable:
+                    shared[key] = claim
+                else:
+                    self._claims[key] = Claim(run_id)
+                    own.append(key)
+        return own, shared
+
+    def resolve(self, run_id: str, key: str, result: Dict):
+        with self._lock:
+            claim = self._claims.get(key)
+        if claim and claim.run_id == run_id:
+            claim.resolve(result)
+
+    def release(self, run_id: str):
+        """Libera as reservas não concluídas de uma execução (fim ou cancelamento)"""
+        with self._lock:
+            pending = [claim for claim in self._claims.values()
+                       if claim.run_id == run_id and claim.resolved_at is None]
+        for claim in pending:
+            claim.resolve(None)
+
+    def _expire(self):
+        limit = time.monotonic() - self.result_ttl
+        expired = [key for key, claim in self._claims.items()
+                   if claim.resolved_at is not None and claim.resolved_at < limit]
+        for key in expired:
+            del self._claims[key]
+
+# Fila e coordenador únicos do processo (servidor com um worker)
+job_manager = JobManager()
+run_coordinator = RunCoordinator()
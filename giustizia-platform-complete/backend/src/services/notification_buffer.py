@@ -0,0 +1,143 @@
+import json
+import logging
+import os
+import threading
+import time
+from typing import Dict, List, Optional
+from models.database import Database
+from .events import event_bus
+
+# Tentativas de gravar um lote antes de desistir dele
+MAX_FLUSH_ATTEMPTS = 5
+
+# Espera antes da primeira nova tentativa (dobra a cada falha)
+RETRY_DELAY = 1.0
+
+# Arquivo JSONL, ao lado do banco, com os lotes que esgotaram as tentativas
+DEAD_LETTER_FILE = 'notifications.dead-letter.jsonl'
+
+class NotificationBuffer:
+    """
+    Acumula as notificações de uma execução e grava em lote
+
+    Uma execução que detecta milhares de mudanças grava tudo em poucas
+    transações em vez de uma por notificação. Nenhuma notificação espera mais
+    que max_delay segundos para ficar visível: uma thread grava o lote quando
+    a mais antiga atinge esse prazo, ou antes, quando o lote chega a
+    max_batch. Os assinantes do stream SSE são avisados logo após a gravação,
+    já com os ids.
+
+    Se a gravação falha, o lote volta para a frente da fila e é tentado de
+    novo, com espera crescente, até max_attempts vezes; depois disso vai
+    para o arquivo de dead letters em vez de ser descartado.
+    """
+
+    def __init__(self, db: Database, max_delay: float = 1.0, max_batch: int = 500,
+                 max_attempts: int = MAX_FLUSH_ATTEMPTS, dead_letter_path: Optional[str] = None):
+        self.db = db
+        self.max_delay = max_delay
+        self.max_batch = max_batch
+        self.max_attempts = max_attempts
+        self.dead_letter_path = dead_letter_path or os.path.join(
+            os.path.dirname(os.path.abspath(db.db_path)), DEAD_LETTER_FILE
+        )
+        self.logger = logging.getLogger(__name__)
+        self._items: List[Dict] = []
+        self._oldest = None
+        self._attempts = 0
+        self._retry_at = 0.0
+        self._condition = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._thread = None
+
+    def add(self, notification: Dict):
+        """Enfileira uma notificação para a próxima gravação"""
+        with self._condition:
+            if not self._items:
+                self._oldest = time.monotonic()
+            self._items.append(notification)
+            # Depois de uma falha, o lote cheio espera a próxima tentativa
+            full = len(self._items) >= self.max_batch and time.monotonic() >= self._retry_at
+            if not self._thread or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+            self._condition.notify_all()
+
+        if full:
+            self.flush()
+
+    def flush(self) -> int:
+        """
+        Grava o que está pendente em uma transação e publica os eventos
+
+        Returns:
+            Número de notificações gravadas (0 se a gravação falhou)
+        """
+        # Um lote por vez, para os eventos saírem na ordem de gravação
+        with self._flush_lock:
+            with self._condition:
+                items, self._items = self._items, []
+                oldest, self._oldest = self._oldest, None
+            if not items:
+                return 0
+
+            try:
+                ids = self.db.create_notifications(items)
+            except Exception as e:
+                self._retry_or_dead_letter(items, oldest, e)
+                return 0
+
+            with self._condition:
+                self._attempts = 0
+                self._retry_at = 0.0
+
+            for notification, notification_id in zip(items, ids):
+                event_bus.publish('notification', dict(notification, id=notification_id))
+            event_bus.publish('unread_count', {'unread': self.db.get_unread_count()})
+            return len(items)
+
+    def _retry_or_dead_letter(self, items: List[Dict], oldest: float, error: Exception):
+        """Devolve o lote à frente da fila ou, esgotadas as tentativas, grava em dead letters"""
+        with self._condition:
+            self._attempts += 1
+            attempts = self._attempts
+            if attempts < self.max_attempts:
+                self._items[:0] = items
+                self._oldest = oldest if not self._oldest else min(oldest, self._oldest)
+                self._retry_at = time.monotonic() + RETRY_DELAY * 2 ** (attempts - 1)
+                self._condition.notify_all()
+            else:
+                self._attempts = 0
+                self._retry_at = 0.0
+
+        if attempts < self.max_attempts:
+            self.logger.error(
+                f"Erro ao gravar {len(items)} notificações (tentativa {attempts} de "
+                f"{self.max_attempts}): {str(error)}"
+            )
+            return
+
+        self.logger.error(
+            f"Erro ao gravar {len(items)} notificações após {attempts} tentativas, "
+            f"enviando para {self.dead_letter_path}: {str(error)}"
+        )
+        try:
+            with open(self.dead_letter_path, 'a', encoding='utf-8') as file:
+                for notification in items:
+                    file.write(json.dumps(notification, ensure_ascii=False, default=str) + '\n')
+        except Exception as e:
+            # Último recurso: o conteúdo fica no log
+            self.logger.error(f"Erro ao gravar dead letters: {str(e)}")
+            for notification in items:
+                self.logger.error(f"Notificação não gravada: {json.dumps(notification, ensure_ascii=False, default=str)}")
+
+    def _run(self):
+        """Grava o lote quando a notificação mais antiga atinge max_delay (ou na próxima tentativa)"""
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: self._items)
+                remaining = max(self._oldest + self.max_delay, self._retry_at) - time.monotonic()
+                if remaining > 0:
+                    self._condition.wait(remaining)
+                    continue
+            self.flush()
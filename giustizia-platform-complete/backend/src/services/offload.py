@@ -0,0 +1,52 @@
+from typing import Callable, Iterable, Iterator
+
+# Trabalho bloqueante fora do loop do gevent
+#
+# Com o worker gevent, as rotas de stream (SSE e NDJSON) esperam eventos sem
+# ocupar uma thread por assinante. Em troca, chamadas que não cedem o loop
+# (pandas, pyarrow, openpyxl, lotes longos no SQLite) travariam todas as
+# conexões: essas vão para o threadpool nativo do hub. Fora do gevent (testes,
+# manage.py, servidor de desenvolvimento) as funções rodam direto.
+
+def _threadpool():
+    """Threadpool nativo do hub, ou None quando o processo não usa gevent"""
+    try:
+        from gevent import get_hub, monkey
+    except ImportError:
+        return None
+    if not monkey.is_module_patched('threading'):
+        return None
+    return get_hub().threadpool
+
+def run_blocking(function: Callable, *args, **kwargs):
+    """Executa a função em uma thread nativa e espera o resultado sem travar o loop"""
+    pool = _threadpool()
+    if pool is None:
+        return function(*args, **kwargs)
+    return pool.apply(function, args, kwargs)
+
+def iterate_blocking(iterable: Iterable) -> Iterator:
+    """
+    Percorre um iterável bloqueante (ex.: lotes de uma exportação) no threadpool
+
+    Cada next() roda em uma thread nativa; entre um item e outro o loop fica
+    livre. Se o cliente desconecta, o iterável é fechado (o gerador do XLSX
+    remove o arquivo temporário).
+    """
+    iterator = iter(iterable)
+    pool = _threadpool()
+    if pool is None:
+        yield from iterator
+        return
+
+    done = object()
+    try:
+        while True:
+            item = pool.apply(next, (iterator, done))
+            if item is done:
+                return
+            yield item
+    finally:
+        close = getattr(iterator, 'close', None)
+        if close:
+            pool.apply(close)
@@ -0,0 +1,77 @@
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+class ResponseCache:
+    """
+    Cache LRU de respostas GET, uma entrada por URL
+
+    Cada entrada guarda a versão (ETag) dos dados com que foi gerada; uma
+    leitura com outra versão é um miss e a nova resposta substitui a antiga.
+    Assim qualquer escrita nas tabelas da rota invalida exatamente as URLs
+    que dependem delas, sem varredura. O tamanho é limitado em entradas e em
+    bytes; as menos usadas saem primeiro.
+    """
+
+    def __init__(self, max_entries: int = 512, max_bytes: int = 32 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries: 'OrderedDict[str, Tuple[str, bytes, str]]' = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self.evictions = 0
+
+    def get(self, url: str, version: str) -> Optional[Tuple[bytes, str]]:
+        """Corpo e mimetype guardados para a URL, se gerados com esta versão"""
+        with self._lock:
+            entry = self._entries.get(url)
+            if entry is None:
+                self.misses += 1
+                return None
+            if entry[0] != version:
+                self.misses += 1
+                self.stale += 1
+                return None
+            self._entries.move_to_end(url)
+            self.hits += 1
+            return entry[1], entry[2]
+
+    def put(self, url: str, version: str, body: bytes, mimetype: str):
+        if len(body) > self.max_bytes // 4:
+            return
+        with self._lock:
+            previous = self._entries.pop(url, None)
+            if previous:
+                self._bytes -= len(previous[1])
+            self._entries[url] = (version, body, mimetype)
+            self._bytes += len(body)
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                _, (_, evicted, _) = self._entries.popitem(last=False)
+                self._bytes -= len(evicted)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_entries': self.max_entries,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'stale': self.stale,
+                'evictions': self.evictions,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0
+            }
+
+# Cache único do processo (servidor com um worker)
+response_cache = ResponseCache()
@@ -0,0 +1,339 @@
+import glob
+import gzip
+import json
+import logging
+import os
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, List, Set
+from models.database import Database
+
+# Sufixo dos arquivos de um lote ainda não confirmado no banco
+STAGING_SUFFIX = '.partial'
+
+class HistoryRetentionJob:
+    """
+    Retenção, compactação e arquivamento do histórico de consultas
+
+    Linhas mais novas que retention_days ficam intactas. Nas mais antigas
+    só as transições de status (e as linhas com mudança detectada) são
+    mantidas; o restante é gravado em arquivos JSON Lines comprimidos,
+    particionados por dia, e removido em lotes pequenos para não segurar
+    o lock de escrita. Os totais diários das linhas removidas continuam
+    disponíveis em archived_query_stats.
+
+    Cada lote é gravado primeiro com o sufixo .partial e só recebe o nome
+    final depois que a remoção das linhas é confirmada. Uma execução
+    interrompida é retomada sem duplicar o arquivo: um .partial cujas linhas
+    ainda estão no banco é descartado (o lote será arquivado de novo), e um
+    cujas linhas já foram removidas é apenas renomeado.
+
+    Depois da remoção, as cadeias de snapshots e os blobs de payload que só
+    as linhas arquivadas referenciavam também são removidos.
+    """
+
+    def __init__(self, db: Database, retention_days: int = 90, archive_dir: str = 'archive',
+                 batch_size: int = 500, pause_seconds: float = 0.05, change_log_days: int = 30):
+        self.db = db
+        self.retention_days = retention_days
+        self.change_log_days = change_log_days
+        self.archive_dir = archive_dir
+        if not os.path.isabs(archive_dir):
+            self.archive_dir = os.path.join(os.path.dirname(os.path.abspath(db.db_path)), archive_dir)
+        self.batch_size = batch_size
+        self.pause_seconds = pause_seconds
+        self.logger = logging.getLogger(__name__)
+
+    @classmethod
+    def from_settings(cls, db: Database) -> 'HistoryRetentionJob':
+        """Cria o job com a política configurada nas settings"""
+        settings = db.get_settings()
+        return cls(
+            db,
+            retention_days=int(settings.get('history_retention_days', 90)),
+            archive_dir=settings.get('history_archive_dir', 'archive'),
+            change_log_days=int(settings.get('change_log_retention_days', 30))
+        )
+
+    def run(self, vacuum: bool = False) -> Dict:
+        """
+        Executa a retenção
+
+        Args:
+            vacuum: Se deve executar VACUUM no final para devolver o espaço ao disco
+
+        Returns:
+            Dict com linhas arquivadas, bytes gravados no arquivo e bytes recuperados
+        """
+        cutoff = (datetime.utcnow() - timedelta(days=self.retention_days)).strftime('%Y-%m-%d %H:%M:%S')
+        self.logger.info(f"Iniciando retenção do histórico anterior a {cutoff}")
+
+        free_before = self._free_bytes()
+        size_before = os.path.getsize(self.db.db_path)
+
+        # Lotes de uma execução anterior interrompida
+        self._recover_staged()
+
+        archived_rows = 0
+        archive_bytes = 0
+        archived_hashes = set()
+        last_id = 0
+
+        while True:
+            ids = self._compactable_ids(cutoff, last_id)
+            if not ids:
+                break
+            last_id = ids[-1]
+
+            rows = self._archive_batch(ids)
+            staged = self._write_archive(rows)
+            try:
+                self._delete_batch(rows)
+            except Exception:
+                for path in staged:
+                    os.remove(path)
+                raise
+            archive_bytes += self._finalize(staged)
+            archived_rows += len(rows)
+            archived_hashes.update(row['payload_hash'] for row in rows if row.get('payload_hash'))
+
+            # Libera o lock de escrita entre os lotes
+            time.sleep(self.pause_seconds)
+
+        pruned = self._prune_payloads(archived_hashes)
+
+        # Consumidores do feed mais atrasados que isso precisam recarregar tudo
+        pruned_changes = self.db.prune_change_log(self.change_log_days)
+
+        if vacuum:
+            self.db.vacuum()
+            bytes_reclaimed = size_before - os.path.getsize(self.db.db_path)
+        else:
+            bytes_reclaimed = self._free_bytes() - free_before
+
+        result = {
+            'cutoff': cutoff,
+            'archived_rows': archived_rows,
+            'archive_bytes': archive_bytes,
+            'bytes_reclaimed': max(bytes_reclaimed, 0),
+            'pruned_snapshots': pruned['snapshots'],
+            'pruned_blobs': pruned['blobs'],
+            'pruned_changes': pruned_changes,
+            'vacuumed': vacuum
+        }
+        self.logger.info(f"Retenção concluída: {result}")
+        return result
+
+    def _compactable_ids(self, cutoff: str, after_id: int) -> List[int]:
+        """
+        Próximo lote (ids > after_id) de linhas antigas que não são transição de status
+
+        Uma linha com sucesso é transição quando seu status difere do da
+        consulta com sucesso anterior do mesmo processo. Remover as demais
+        não muda a anterior de nenhuma linha mantida, então os lotes podem
+        ser calculados um de cada vez.
+        """
+        with self.db.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT qh.id FROM query_history qh
+                WHERE qh.id > ?
+                  AND qh.query_timestamp < ?
+                  AND NOT qh.has_changes
+                  AND (qh.success = FALSE OR qh.status_id IS (
+                      SELECT p.status_id FROM query_history p
+                      WHERE p.client_id IS qh.client_id
+                        AND p.process_number = qh.process_number
+                        AND p.process_year = qh.process_year
+                        AND p.success = TRUE
+                        AND (p.query_timestamp < qh.query_timestamp
+                             OR (p.query_timestamp = qh.query_timestamp AND p.id < qh.id))
+                      ORDER BY p.query_timestamp DESC, p.id DESC
+                      LIMIT 1
+                  ))
+                ORDER BY qh.id
+                LIMIT ?
+            ''', (after_id, cutoff, self.batch_size))
+            return [row[0] for row in cursor.fetchall()]
+
+    def _archive_batch(self, ids: List[int]) -> List[Dict]:
+        """Carrega as linhas de um lote para arquivamento"""
+        with self.db.get_connection() as conn:
+            cursor = conn.cursor()
+            placeholders = ', '.join('?' * len(ids))
+            # O nome do status vai junto para o arquivo ser legível sem o dicionário
+            cursor.execute(f'''
+                SELECT qh.*, s.name AS status_name FROM query_history qh
+                LEFT JOIN statuses s ON s.id = qh.status_id
+                WHERE qh.id IN ({placeholders})
+            ''', ids)
+            return [dict(row) for row in cursor.fetchall()]
+
+    def _write_archive(self, rows: List[Dict]) -> List[str]:
+        """
+        Grava o lote em arquivos .partial, um por dia, nomeados pela faixa de ids
+
+        Returns:
+            Caminhos dos arquivos gravados
+        """
+        by_day = defaultdict(list)
+        for row in rows:
+            by_day[str(row['query_timestamp'])[:10]].append(row)
+
+        first_id, last_id = rows[0]['id'], rows[-1]['id']
+        staged = []
+        for day, day_rows in by_day.items():
+            year, month, _ = day.split('-')
+            directory = os.path.join(self.archive_dir, 'query_history', year, month)
+            os.makedirs(directory, exist_ok=True)
+            path = os.path.join(directory, f'{day}.{first_id}-{last_id}.jsonl.gz{STAGING_SUFFIX}')
+
+            with gzip.open(path, 'wt', encoding='utf-8') as archive:
+                for row in day_rows:
+                    archive.write(json.dumps(row, ensure_ascii=False, default=str) + '\n')
+            staged.append(path)
+
+        return staged
+
+    def _finalize(self, staged: List[str]) -> int:
+        """Dá o nome final aos arquivos de um lote já removido do banco; retorna os bytes"""
+        written = 0
+        for path in staged:
+            final_path = path[:-len(STAGING_SUFFIX)]
+            os.replace(path, final_path)
+            written += os.path.getsize(final_path)
+        return written
+
+    def _recover_staged(self):
+        """Conclui ou descarta os arquivos .partial de uma execução interrompida"""
+        pattern = os.path.join(self.archive_dir, 'query_history', '*', '*', f'*{STAGING_SUFFIX}')
+        for path in sorted(glob.glob(pattern)):
+            try:
+                with gzip.open(path, 'rt', encoding='utf-8') as archive:
+                    ids = [json.loads(line)['id'] for line in archive if line.strip()]
+            except (OSError, EOFError, ValueError):
+                # Gravação interrompida no meio: as linhas continuam no banco
+                ids = None
+
+            if ids is None or self._any_present(ids):
+                os.remove(path)
+                self.logger.info(f"Arquivo de lote não confirmado descartado: {path}")
+            else:
+                self._finalize([path])
+                self.logger.info(f"Arquivo de lote confirmado recuperado: {path}")
+
+    def _any_present(self, ids: List[int]) -> bool:
+        with self.db.get_connection() as conn:
+            return conn.execute(
+                'SELECT EXISTS (SELECT 1 FROM query_history WHERE id IN (SELECT value FROM json_each(?)))',
+                (json.dumps(ids),)
+            ).fetchone()[0] == 1
+
+    def _delete_batch(self, rows: List[Dict]):
+        """Remove um lote já arquivado e guarda seus totais diários"""
+        with self.db.get_connection() as conn:
+            cursor = conn.cursor()
+            for row in rows:
+                success = 1 if row['success'] else 0
+                cursor.execute('''
+                    INSERT INTO archived_query_stats
+                    (day, credential_id, total_queries, successful_queries, failed_queries)
+                    VALUES (?, ?, 1, ?, ?)
+                    ON CONFLICT(day, credential_id) DO UPDATE SET
+                        total_queries = total_queries + 1,
+                        successful_queries = successful_queries + excluded.successful_queries,
+                        failed_queries = failed_queries + excluded.failed_queries
+                ''', (str(row['query_timestamp'])[:10], row.get('credential_id') or 0, success, 1 - success))
+
+            placeholders = ', '.join('?' * len(rows))
+            cursor.execute(
+                f'DELETE FROM query_history WHERE id IN ({placeholders})',
+                [row['id'] for row in rows]
+            )
+            conn.commit()
+
+    def _prune_payloads(self, archived_hashes: Set[str]) -> Dict:
+        """
+        Remove snapshots e blobs que nenhuma linha restante do histórico referencia
+
+        Uma cadeia (keyframe e seus deltas) é removida inteira quando nenhum dos
+        seus snapshots é referenciado pelo histórico e ela não é a cadeia mais
+        recente do processo, que serve de base para o próximo snapshot. Os
+        blobs candidatos são os keyframes removidos e os payloads das linhas
+        arquivadas; só saem os que nada mais referencia.
+
+        Returns:
+            Dict com o número de snapshots e de blobs removidos
+        """
+        candidates = set(archived_hashes)
+        pruned = {'snapshots': 0, 'blobs': 0}
+        last_id = 0
+
+        while True:
+            with self.db.get_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    SELECT k.id FROM payload_snapshots k
+                    WHERE k.keyframe_id IS NULL AND k.id > ?
+                    ORDER BY k.id
+                    LIMIT ?
+                ''', (last_id, self.batch_size))
+                keyframes = [row[0] for row in cursor.fetchall()]
+                if not keyframes:
+                    break
+                last_id = keyframes[-1]
+
+                cursor.execute('''
+                    SELECT k.id, k.payload_hash FROM payload_snapshots k
+                    WHERE k.id IN (SELECT value FROM json_each(?))
+                      AND EXISTS (
+                          SELECT 1 FROM payload_snapshots n
+                          WHERE n.process_number = k.process_number AND n.process_year = k.process_year
+                            AND n.keyframe_id IS NULL AND n.id > k.id
+                      )
+                      AND NOT EXISTS (
+                          SELECT 1 FROM payload_snapshots s
+                          JOIN query_history qh ON qh.payload_hash = s.payload_hash
+                          WHERE s.id = k.id OR s.keyframe_id = k.id
+                      )
+                ''', (json.dumps(keyframes),))
+                dead = cursor.fetchall()
+                if dead:
+                    dead_ids = json.dumps([row['id'] for row in dead])
+                    cursor.execute('''
+                        DELETE FROM payload_snapshots
+                        WHERE id IN (SELECT value FROM json_each(?))
+                           OR keyframe_id IN (SELECT value FROM json_each(?))
+                    ''', (dead_ids, dead_ids))
+                    pruned['snapshots'] += cursor.rowcount
+                    candidates.update(row['payload_hash'] for row in dead)
+                    conn.commit()
+
+            time.sleep(self.pause_seconds)
+
+        candidates = sorted(candidates)
+        for i in range(0, len(candidates), self.batch_size):
+            with self.db.get_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    DELETE FROM payload_blobs
+                    WHERE hash IN (SELECT value FROM json_each(?))
+                      AND NOT EXISTS (
+                          SELECT 1 FROM payload_snapshots s
+                          WHERE s.payload_hash = payload_blobs.hash AND s.keyframe_id IS NULL
+                      )
+                      AND NOT EXISTS (SELECT 1 FROM query_history qh WHERE qh.payload_hash = payload_blobs.hash)
+                      AND NOT EXISTS (SELECT 1 FROM process_state ps WHERE ps.payload_hash = payload_blobs.hash)
+                ''', (json.dumps(candidates[i:i + self.batch_size]),))
+                pruned['blobs'] += cursor.rowcount
+                conn.commit()
+            time.sleep(self.pause_seconds)
+
+        return pruned
+
+    def _free_bytes(self) -> int:
+        """Bytes em páginas livres do arquivo SQLite"""
+        with self.db.get_connection() as conn:
+            page_size = conn.execute('PRAGMA page_size').fetchone()[0]
+            return conn.execute('PRAGMA freelist_count').fetchone()[0] * page_size
@@ -3,8 +3,14 @@ import time
 import threading
 import logging
 from datetime import datetime, timedelta
-from typing import List, Dict, Callable
+from typing import List, Dict, Callable, Optional
 from .giustizia_api import GiustiziaAPI
+from .retention import HistoryRetentionJob
+from .analytics_export import AnalyticsExportJob
+from .events import event_bus
+from .offload import run_blocking
+from .jobs import Job, run_coordinator
+from .notification_buffer import NotificationBuffer
 from models.database import Database
 
 class QueryScheduler:
@@ -27,6 +33,10 @@ class QueryScheduler:
         self.batch_size = 10
         self.max_concurrent_queries = 5
         
+        # Notificações das execuções gravadas em lote
+        self.notifications = NotificationBuffer(db)
+        self.set_notification_delay(db.get_settings().get('notification_flush_seconds', '1'))
+        
     def start(self):
         """Inicia o scheduler"""
         if self.running:
@@ -63,19 +73,29 @@ class QueryScheduler:
         # Carregar configurações do banco
         settings = self.db.get_settings()
         schedule_time = settings.get('query_time', self.default_schedule_time)
+        retention_time = settings.get('retention_time', '03:00')
+        export_time = settings.get('analytics_export_time', '02:00')
         
         # Agendar consulta diária
-        schedule.every().day.at(schedule_time).do(self.run_daily_queries)
+        schedule.every().day.at(schedule_time).do(self.run_daily_queries).tag('daily-queries')
+        
+        # Agendar retenção do histórico
+        schedule.every().day.at(retention_time).do(self.run_history_retention).tag('history-retention')
+        
+        # Agendar exportação analítica (antes da retenção, para exportar as linhas ainda no banco)
+        schedule.every().day.at(export_time).do(self.run_analytics_export).tag('analytics-export')
         
         self.logger.info(f"Consultas agendadas para {schedule_time} todos os dias")
+        self.logger.info(f"Retenção do histórico agendada para {retention_time} todos os dias")
+        self.logger.info(f"Exportação analítica agendada para {export_time} todos os dias")
     
     def run_daily_queries(self):
         """Executa consultas diárias para todos os clientes"""
         try:
             self.logger.info("Iniciando consultas diárias")
             
-            # Buscar todos os clientes ativos
-            clients = self.db.get_all_clients()
+            # Buscar todos os clientes ativos, por prioridade
+            clients = self.db.get_active_clients()
             if not clients:
                 self.logger.info("Nenhum cliente encontrado")
                 return
@@ -91,53 +111,59 @@ class QueryScheduler:
                 )
                 return
             
-            # Preparar consultas
-            queries = []
-            for client in clients:
-                queries.append({
-                    'client_id': client['id'],
-                    'client_name': client['name'],
-                    'process_number': client['process_number'],
-                    'process_year': client['process_year']
-                })
+            # Preparar consultas (uma por processo)
+            queries = self._build_queries(clients)
             
             # Executar consultas em lotes
             total_queries = len(queries)
             successful_queries = 0
             failed_queries = 0
             changes_detected = 0
+            run_id = f'daily-{int(time.time())}'
             
             self.logger.info(f"Processando {total_queries} consultas")
+            event_bus.publish('run_started', {'run_id': run_id, 'kind': 'daily', 'total': total_queries})
             
-            for i in range(0, len(queries), self.batch_size):
-                batch = queries[i:i + self.batch_size]
-                
-                self.logger.info(f"Processando lote {i//self.batch_size + 1} ({len(batch)} consultas)")
+            stats = {'done': 0, 'successful': 0, 'failed': 0, 'changes': 0}
+            
+            def handle_result(result):
+                stats['done'] += 1
                 
-                # Executar lote
-                results = self.api.batch_query(batch, credentials)
+                # Resultados de outra execução já foram gravados por ela. Falhas
+                # também vão para o histórico: atualizam last_status_check e
+                # last_error do cliente
+                if not result.get('shared_from'):
+                    self._save_query_result(result)
                 
-                # Processar resultados
-                for result in results:
-                    if result.get('success'):
-                        successful_queries += 1
-                        
-                        # Salvar resultado no histórico
-                        self._save_query_result(result)
-                        
-                        # Verificar mudanças
-                        if result.get('has_changes'):
-                            changes_detected += 1
-                            self._handle_status_change(result)
-                    else:
-                        failed_queries += 1
-                        self.logger.error(f"Falha na consulta: {result.get('error')}")
+                if result.get('success'):
+                    stats['successful'] += 1
+                    
+                    # Verificar mudanças
+                    if result.get('has_changes') and not result.get('shared_from'):
+                        stats['changes'] += 1
+                        self._handle_status_change(result)
+                else:
+                    stats['failed'] += 1
+                    self.logger.error(f"Falha na consulta: {result.get('error')}")
                 
-                # Pausa entre lotes
-                time.sleep(5)
+                if stats['done'] % self.batch_size == 0 or stats['done'] == total_queries:
+                    event_bus.publish('run_progress', dict(stats, run_id=run_id, total=total_queries))
+            
+            self._execute_queries(run_id, queries, credentials, handle_result, batch_pause=5)
+            successful_queries = stats['successful']
+            failed_queries = stats['failed']
+            changes_detected = stats['changes']
             
             # Criar relatório final
             self._create_daily_report(total_queries, successful_queries, failed_queries, changes_detected)
+            self.notifications.flush()
+            event_bus.publish('run_finished', {
+                'run_id': run_id,
+                'total': total_queries,
+                'successful': successful_queries,
+                'failed': failed_queries,
+                'changes': changes_detected
+            })
             
             self.logger.info(f"Consultas diárias concluídas: {successful_queries}/{total_queries} sucessos")
             
@@ -149,12 +175,17 @@ class QueryScheduler:
                 f'Erro inesperado: {str(e)}'
             )
     
-    def run_manual_query(self, client_ids: List[int] = None):
+    def run_manual_query(self, client_ids: List[int] = None, job: Optional[Job] = None):
         """
         Executa consulta manual para clientes específicos ou todos
         
+        Cada resultado é gravado assim que chega. Com um job, o progresso e o
+        resultado de cada item são registrados nele e o pedido de cancelamento
+        interrompe a execução antes da próxima consulta.
+        
         Args:
             client_ids: Lista de IDs dos clientes (None para todos)
+            job: Job assíncrono que acompanha a execução
         """
         try:
             self.logger.info("Iniciando consulta manual")
@@ -180,43 +211,56 @@ class QueryScheduler:
                     'message': 'Nenhuma credencial ativa encontrada'
                 }
             
-            # Preparar e executar consultas
-            queries = []
-            for client in clients:
-                queries.append({
-                    'client_id': client['id'],
-                    'client_name': client['name'],
-                    'process_number': client['process_number'],
-                    'process_year': client['process_year']
-                })
-            
-            results = self.api.batch_query(queries, credentials)
+            # Preparar e executar consultas (uma por processo)
+            queries = self._build_queries(clients)
+            run_id = job.id if job else f'manual-{int(time.time())}'
+            if job:
+                job.start(len(queries))
+            event_bus.publish('run_started', {'run_id': run_id, 'kind': 'manual', 'total': len(queries)})
             
-            # Processar resultados
-            successful = 0
-            failed = 0
-            changes = 0
+            stats = {'total': len(queries), 'done': 0, 'successful': 0, 'failed': 0, 'changes': 0}
             
-            for result in results:
-                if result.get('success'):
-                    successful += 1
+            def handle_result(result):
+                stats['done'] += 1
+                if not result.get('shared_from'):
                     self._save_query_result(result)
-                    
-                    if result.get('has_changes'):
-                        changes += 1
+                
+                if result.get('success'):
+                    stats['successful'] += 1
+                    if result.get('has_changes') and not result.get('shared_from'):
+                        stats['changes'] += 1
                         self._handle_status_change(result)
                 else:
-                    failed += 1
+                    stats['failed'] += 1
+                
+                if job:
+                    job.add_result({
+                        'client_id': result.get('client_id'),
+                        'client_name': result.get('client_name'),
+                        'process_number': result.get('process_number'),
+                        'process_year': result.get('process_year'),
+                        'success': bool(result.get('success')),
+                        'status': result.get('status'),
+                        'has_changes': bool(result.get('has_changes')),
+                        'error': result.get('error'),
+                        'shared_from': result.get('shared_from')
+                    })
+                event_bus.publish('run_progress', dict(stats, run_id=run_id))
+            
+            self._execute_queries(
+                run_id, queries, credentials, handle_result,
+                should_stop=(lambda: job.cancelled) if job else None
+            )
             
+            self.notifications.flush()
+            event_bus.publish('run_finished', dict(stats, run_id=run_id))
+            stats.pop('done')
+            cancelled = job is not None and job.cancelled
+            summary = f"{stats['successful']} sucessos, {stats['failed']} falhas, {stats['changes']} mudanças detectadas"
             return {
                 'success': True,
-                'message': f'Consulta concluída: {successful} sucessos, {failed} falhas, {changes} mudanças detectadas',
-                'stats': {
-                    'total': len(queries),
-                    'successful': successful,
-                    'failed': failed,
-                    'changes': changes
-                }
+                'message': f'Consulta cancelada: {summary}' if cancelled else f'Consulta concluída: {summary}',
+                'stats': stats
             }
             
         except Exception as e:
@@ -226,11 +270,92 @@ class QueryScheduler:
                 'message': f'Erro na consulta: {str(e)}'
             }
     
+    def _build_queries(self, clients: List[Dict]) -> List[Dict]:
+        """Monta as consultas de uma execução sem repetir processos"""
+        queries = {}
+        for client in clients:
+            key = client.get('process_key') or f"{client['process_number']}/{client['process_year']}"
+            if key in queries:
+                self.logger.warning(
+                    f"Processo {key} duplicado (clientes {queries[key]['client_id']} e {client['id']}); "
+                    "consultado uma única vez"
+                )
+                continue
+            queries[key] = {
+                'client_id': client['id'],
+                'client_name': client['name'],
+                'process_number': client['process_number'],
+                'process_year': client['process_year'],
+                'process_key': key
+            }
+        return list(queries.values())
+    
+    def _execute_queries(self, run_id: str, queries: List[Dict], credentials: List[Dict],
+                         on_result: Callable[[Dict], None],
+                         should_stop: Optional[Callable[[], bool]] = None, batch_pause: float = 0):
+        """
+        Executa as consultas de uma execução sem repetir as de execuções simultâneas
+        
+        Processos reservados por outra execução em andamento (ou concluídos por
+        ela há pouco) não são consultados de novo: o resultado dela é repassado
+        a on_result com shared_from. Se a outra execução não obtiver o
+        resultado (falha ou cancelamento), o processo é consultado aqui.
+        
+        Args:
+            run_id: Identificador desta execução
+            queries: Consultas montadas por _build_queries
+            credentials: Credenciais ativas
+            on_result: Chamado com cada resultado, próprio ou compartilhado
+            should_stop: True interrompe antes da próxima consulta
+            batch_pause: Pausa em segundos entre lotes de batch_size consultas (0 = lote único)
+        """
+        by_key = {query['process_key']: query for query in queries}
+        key_by_client = {query['client_id']: query['process_key'] for query in queries}
+        
+        def resolve(result):
+            run_coordinator.resolve(run_id, key_by_client.get(result.get('client_id')), result)
+            on_result(result)
+        
+        try:
+            remaining = list(by_key)
+            while remaining:
+                own, shared = run_coordinator.claim(run_id, remaining)
+                if shared:
+                    self.logger.info(f"{len(shared)} processos já em consulta por outra execução; reaproveitando resultados")
+                
+                step = self.batch_size if batch_pause else max(len(own), 1)
+                for i in range(0, len(own), step):
+                    if should_stop and should_stop():
+                        return
+                    batch = [by_key[key] for key in own[i:i + step]]
+                    self.api.batch_query(batch, credentials, on_result=resolve, should_stop=should_stop)
+                    if batch_pause and i + step < len(own):
+                        time.sleep(batch_pause)
+                
+                remaining = []
+                for key, claim in shared.items():
+                    if should_stop and should_stop():
+                        return
+                    result = claim.wait(3600)
+                    if result and result.get('success'):
+                        query = by_key[key]
+                        on_result(dict(
+                            result,
+                            client_id=query['client_id'],
+                            client_name=query['client_name'],
+                            shared_from=claim.run_id
+                        ))
+                    else:
+                        remaining.append(key)
+        finally:
+            run_coordinator.release(run_id)
+    
     def _save_query_result(self, result: Dict):
         """Salva resultado da consulta no histórico"""
         try:
             self.db.save_query_history({
                 'client_id': result.get('client_id'),
+                'credential_id': result.get('credential_id'),
                 'process_number': result.get('process_number'),
                 'process_year': result.get('process_year'),
                 'status': result.get('status'),
@@ -256,6 +381,7 @@ class QueryScheduler:
                 'status_change',
                 f'Mudança Detectada - {client_name}',
                 f'O processo {process_number}/{process_year} teve mudança de status: {new_status}',
+                client_id=result.get('client_id'),
                 client_name=client_name,
                 process_number=f'{process_number}/{process_year}'
             )
@@ -268,13 +394,22 @@ class QueryScheduler:
         except Exception as e:
             self.logger.error(f"Erro ao processar mudança de status: {str(e)}")
     
+    def set_notification_delay(self, seconds):
+        """Prazo máximo, em segundos, até uma notificação de execução ficar visível"""
+        try:
+            self.notifications.max_delay = min(max(float(seconds), 0.0), 60.0)
+        except (TypeError, ValueError):
+            self.logger.warning(f"notification_flush_seconds inválido: {seconds}; usando 1s")
+            self.notifications.max_delay = 1.0
+    
     def _create_notification(self, type: str, title: str, message: str, **kwargs):
-        """Cria uma notificação no sistema"""
+        """Cria uma notificação no sistema (gravada no próximo lote do buffer)"""
         try:
-            self.db.create_notification({
+            self.notifications.add({
                 'type': type,
                 'title': title,
                 'message': message,
+                'client_id': kwargs.get('client_id'),
                 'client_name': kwargs.get('client_name'),
                 'process_number': kwargs.get('process_number'),
                 'read': False,
@@ -333,14 +468,37 @@ class QueryScheduler:
         except Exception as e:
             self.logger.error(f"Erro ao criar relatório diário: {str(e)}")
     
+    def run_history_retention(self):
+        """Executa a retenção e o arquivamento do histórico de consultas"""
+        try:
+            result = run_blocking(HistoryRetentionJob.from_settings(self.db).run)
+            self.logger.info(
+                f"Retenção: {result['archived_rows']} linhas arquivadas, "
+                f"{result['bytes_reclaimed']} bytes recuperados"
+            )
+            return result
+        except Exception as e:
+            self.logger.error(f"Erro na retenção do histórico: {str(e)}")
+            return None
+    
+    def run_analytics_export(self):
+        """Exporta histórico, transições e agregados para Parquet"""
+        try:
+            result = run_blocking(AnalyticsExportJob.from_settings(self.db).run)
+            self.logger.info(f"Exportação analítica: {result['exported_rows']}")
+            return result
+        except Exception as e:
+            self.logger.error(f"Erro na exportação analítica: {str(e)}")
+            return None
+    
     def update_schedule(self, new_time: str):
         """Atualiza o horário do agendamento"""
         try:
-            # Limpar agendamentos existentes
-            schedule.clear()
+            # Limpar agendamento existente das consultas diárias
+            schedule.clear('daily-queries')
             
             # Configurar novo horário
-            schedule.every().day.at(new_time).do(self.run_daily_queries)
+            schedule.every().day.at(new_time).do(self.run_daily_queries).tag('daily-queries')
             
             # Salvar configuração
             self.db.update_settings({'query_time': new_time})
@@ -353,7 +511,8 @@ class QueryScheduler:
     def get_next_run_time(self) -> str:
         """Retorna o próximo horário de execução"""
         try:
-            jobs = schedule.jobs
+            # Só as consultas diárias (retenção e exportação também estão em schedule.jobs)
+            jobs = [job for job in schedule.jobs if 'daily-queries' in job.tags]
             if jobs:
                 next_run = min(job.next_run for job in jobs)
                 return next_run.strftime('%d/%m/%Y às %H:%M')
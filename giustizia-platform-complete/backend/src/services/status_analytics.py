@@ -0,0 +1,84 @@
+from datetime import datetime
+from typing import Dict, Optional
+from models.database import Database
+
+def time_in_status(db: Database, since: Optional[datetime] = None,
+                   client_id: Optional[int] = None) -> Dict:
+    """
+    Distribuição do tempo que os processos passaram em cada status
+
+    Calculado apenas a partir de status_transitions: cada transição abre um
+    intervalo que termina na transição seguinte do mesmo cliente (ou agora,
+    para o status atual). Intervalos são recortados em `since`.
+
+    Args:
+        db: Banco de dados
+        since: Considera apenas o tempo a partir desta data (todo o período se None)
+        client_id: Restringe a um cliente (todos se None)
+
+    Returns:
+        Dicionário com o período analisado e as estatísticas por status, em dias
+    """
+    import pandas as pd
+
+    now = pd.Timestamp(datetime.utcnow().replace(microsecond=0))
+    start = pd.Timestamp(since) if since else None
+    result = {
+        'since': start.isoformat() if start is not None else None,
+        'until': now.isoformat(),
+        'statuses': []
+    }
+
+    transitions = db.get_status_transitions(client_id)
+    if not transitions:
+        return result
+
+    df = pd.DataFrame(transitions, columns=['id', 'client_id', 'to_status_id', 'to_status', 'changed_at'])
+    df['changed_at'] = pd.to_datetime(df['changed_at'], errors='coerce')
+    df = df.dropna(subset=['changed_at']).sort_values(['client_id', 'changed_at', 'id'])
+
+    # O intervalo de cada status termina na próxima transição do mesmo cliente
+    df['ended_at'] = df.groupby('client_id')['changed_at'].shift(-1)
+    df['ongoing'] = df['ended_at'].isna()
+    df['ended_at'] = df['ended_at'].fillna(now)
+
+    if start is not None:
+        df = df[df['ended_at'] > start].copy()
+        df['changed_at'] = df['changed_at'].clip(lower=start)
+    if df.empty:
+        return result
+
+    df['days'] = (df['ended_at'] - df['changed_at']).dt.total_seconds() / 86400
+
+    grouped = df.groupby(['to_status_id', 'to_status'], dropna=False)
+    summary = grouped['days'].agg(
+        intervals='size',
+        total_days='sum',
+        mean_days='mean',
+        median_days='median',
+        p90_days=lambda days: days.quantile(0.9),
+        max_days='max'
+    )
+    summary['ongoing'] = grouped['ongoing'].sum()
+    summary['clients'] = grouped['client_id'].nunique()
+    summary = summary.reset_index().sort_values('total_days', ascending=False)
+
+    day_columns = ['total_days', 'mean_days', 'median_days', 'p90_days', 'max_days']
+    summary[day_columns] = summary[day_columns].round(2)
+
+    result['statuses'] = [
+        {
+            'status_id': int(row.to_status_id),
+            'status': row.to_status,
+            'intervals': int(row.intervals),
+            'clients': int(row.clients),
+            'ongoing': int(row.ongoing),
+            'total_days': float(row.total_days),
+            'mean_days': float(row.mean_days),
+            'median_days': float(row.median_days),
+            'p90_days': float(row.p90_days),
+            'max_days': float(row.max_days)
+        }
+        for row in summary.itertuples(index=False)
+    ]
+    return result
@@ -0,0 +1,66 @@
+import csv
+import io
+import os
+import re
+import tempfile
+from typing import Iterable, Iterator, List
+
+# Tamanho dos blocos lidos do arquivo XLSX pronto
+XLSX_CHUNK_SIZE = 64 * 1024
+
+# Caracteres de controle que o formato XLSX não aceita em células
+_XLSX_ILLEGAL_CHARACTERS = re.compile(r'[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+def csv_chunks(columns: List[str], batches: Iterable[List[tuple]]) -> Iterator[str]:
+    """
+    Gera o CSV um lote por vez (cabeçalho no primeiro bloco)
+
+    Começa com BOM para o Excel reconhecer o arquivo como UTF-8.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    buffer.write('\ufeff')
+    writer.writerow(columns)
+    for rows in batches:
+        writer.writerows(rows)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+def xlsx_chunks(columns: List[str], batches: Iterable[List[tuple]], title: str = 'export') -> Iterator[bytes]:
+    """
+    Gera o XLSX com o openpyxl em modo write-only e envia o arquivo em blocos
+
+    No modo write-only as linhas vão para um arquivo temporário à medida que
+    são adicionadas, então a memória não cresce com a exportação. O XLSX é um
+    zip que só fica completo no fim, por isso o envio começa depois de a
+    planilha ser gravada; o arquivo temporário é removido em seguida.
+    """
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet(title)
+    sheet.append(columns)
+    for rows in batches:
+        for row in rows:
+            sheet.append([_xlsx_value(value) for value in row])
+
+    handle, path = tempfile.mkstemp(suffix='.xlsx')
+    os.close(handle)
+    try:
+        workbook.save(path)
+        with open(path, 'rb') as file:
+            while True:
+                chunk = file.read(XLSX_CHUNK_SIZE)
+                if not chunk:
+                    break
+                yield chunk
+    finally:
+        os.remove(path)
+
+def _xlsx_value(value):
+    if isinstance(value, str):
+        return _XLSX_ILLEGAL_CHARACTERS.sub('', value)
+    return value
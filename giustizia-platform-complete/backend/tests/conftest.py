@@ -0,0 +1,31 @@
+import os
+import sys
+
+import pytest
+
+# Os módulos da aplicação são importados a partir de src, como em main.py
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from models.database import Database
+
+@pytest.fixture
+def db(tmp_path):
+    """Banco SQLite novo, em um diretório temporário"""
+    return Database(str(tmp_path / 'giustizia.db'))
+
+@pytest.fixture
+def make_client(db):
+    """Cria clientes com números de processo distintos"""
+    counter = {'next': 0}
+
+    def create(**overrides):
+        counter['next'] += 1
+        data = {
+            'name': f"Cliente {counter['next']}",
+            'process_number': str(1000 + counter['next']),
+            'process_year': 2023
+        }
+        data.update(overrides)
+        return db.create_client(data)
+
+    return create
@@ -0,0 +1,96 @@
+def aggregate_state(db):
+    """Agregados do dashboard e resumo dos clientes, em forma comparável"""
+    with db.get_connection() as conn:
+        return {
+            'counters': dict(conn.execute('SELECT name, value FROM stats_counters').fetchall()),
+            'daily': [tuple(row) for row in conn.execute('''
+                SELECT day, total_queries, successful_queries, failed_queries, changes_detected
+                FROM daily_query_stats ORDER BY day
+            ''')],
+            'credentials': [tuple(row) for row in conn.execute('''
+                SELECT credential_id, total_queries, successful_queries, failed_queries
+                FROM credential_query_stats ORDER BY credential_id
+            ''')],
+            'statuses': [tuple(row) for row in conn.execute('''
+                SELECT status_id, client_count FROM status_counts
+                WHERE client_count != 0 ORDER BY status_id
+            ''')],
+            'clients': [tuple(row) for row in conn.execute('''
+                SELECT id, status_id, change_count, unread_notifications, last_error
+                FROM clients ORDER BY id
+            ''')]
+        }
+
+def save_query(db, client_id, status=None, success=True, has_changes=False, error=None, credential_id=1):
+    db.save_query_history({
+        'client_id': client_id,
+        'credential_id': credential_id,
+        'process_number': '1',
+        'process_year': 2023,
+        'status': status,
+        'success': success,
+        'error': error,
+        'has_changes': has_changes
+    })
+
+def test_incremental_aggregates_match_rebuild(db, make_client):
+    clients = [make_client() for _ in range(4)]
+
+    save_query(db, clients[0], 'In corso', has_changes=True)
+    save_query(db, clients[0], 'Sentenza', has_changes=True, credential_id=2)
+    save_query(db, clients[1], 'In corso')
+    save_query(db, clients[2], success=False, error='Timeout na consulta')
+    save_query(db, clients[3], 'Sentenza', has_changes=True)
+
+    notification_ids = [
+        db.create_notification({'type': 'status_change', 'title': 't', 'message': 'm', 'client_id': client_id})
+        for client_id in clients + clients[:2]
+    ]
+    db.mark_notification_read(notification_ids[0])
+    db.delete_notification(notification_ids[1])
+    db.delete_notification(notification_ids[4])
+    db.mark_notifications_read(filters={'client_id': clients[1]})
+    db.delete_client(clients[3])
+
+    incremental = aggregate_state(db)
+    assert db.rebuild_aggregates()
+    assert aggregate_state(db) == incremental
+
+def test_dashboard_stats_read_counters(db, make_client):
+    client_id = make_client()
+    make_client()
+    save_query(db, client_id, 'In corso', has_changes=True)
+    db.create_notification({'type': 'status_change', 'title': 't', 'message': 'm', 'client_id': client_id})
+
+    stats = db.get_dashboard_stats()
+
+    assert stats['total_clients'] == 2
+    assert stats['changes_detected'] == 1
+    assert stats['unread_notifications'] == 1
+    assert stats['status_distribution'] == [{'status': 'In corso', 'count': 1}]
+
+def test_dashboard_stats_empty(db):
+    assert db.get_dashboard_stats() == {
+        'total_clients': 0,
+        'queries_today': 0,
+        'changes_detected': 0,
+        'unread_notifications': 0,
+        'status_distribution': []
+    }
+
+def test_credential_stats_single_aggregate(db, make_client):
+    first = db.create_credential({'name': 'a', 'uuid': 'uuid-a', 'token': 'token-a'})
+    db.create_credential({'name': 'b', 'uuid': 'uuid-b', 'token': 'token-b'})
+    client_id = make_client()
+    save_query(db, client_id, 'In corso', credential_id=first)
+    save_query(db, client_id, 'In corso', credential_id=first)
+    save_query(db, client_id, success=False, error='Timeout na consulta', credential_id=first)
+
+    stats = db.get_credential_stats()
+
+    assert stats['total_credentials'] == 2
+    assert stats['active_credentials'] == 2
+    assert stats['total_queries'] == 3
+    assert stats['successful_queries'] == 2
+    assert stats['failed_queries'] == 1
+    assert stats['success_rate'] == 66.67
@@ -0,0 +1,32 @@
+import pytest
+
+def test_deactivate_and_reactivate_by_filter(db, make_client):
+    old = [make_client(process_year=2020) for _ in range(2)]
+    recent = make_client()
+
+    assert db.set_clients_active(False, filters={'process_year': 2020}) == 2
+    # Já desativados não contam de novo
+    assert db.set_clients_active(False, ids=old) == 0
+    assert [client['id'] for client in db.get_active_clients()] == [recent]
+    # Desativar não remove o cliente dos totais
+    assert db.get_dashboard_stats()['total_clients'] == 3
+
+    assert db.set_clients_active(True, ids=[old[0]]) == 1
+    assert sorted(client['id'] for client in db.get_active_clients()) == sorted([old[0], recent])
+
+def test_set_priority_orders_active_clients(db, make_client):
+    first = make_client(name='A')
+    second = make_client(name='B')
+    third = make_client(name='C')
+
+    assert db.set_clients_priority(5, ids=[third]) == 1
+    assert db.set_clients_priority(5, ids=[second, third]) == 1
+    assert [client['id'] for client in db.get_active_clients()] == [second, third, first]
+
+def test_bulk_scope_requires_selection(db, make_client):
+    make_client()
+    with pytest.raises(ValueError):
+        db.set_clients_active(False)
+    with pytest.raises(ValueError):
+        db.set_clients_priority('alta', select_all=True)
+    assert db.set_clients_active(False, select_all=True) == 1
@@ -0,0 +1,53 @@
+import json
+
+from services.notification_buffer import NotificationBuffer
+
+def notification(title):
+    return {'type': 'status_change', 'title': title, 'message': 'm'}
+
+def stored_titles(db):
+    with db.get_connection() as conn:
+        return [row['title'] for row in conn.execute('SELECT title FROM notifications ORDER BY id')]
+
+def failing(db, monkeypatch, times):
+    """Faz create_notifications falhar nas primeiras chamadas"""
+    create = db.create_notifications
+    calls = {'count': 0}
+
+    def create_notifications(items):
+        calls['count'] += 1
+        if calls['count'] <= times:
+            raise RuntimeError('database is locked')
+        return create(items)
+
+    monkeypatch.setattr(db, 'create_notifications', create_notifications)
+
+def test_failed_flush_keeps_batch_for_retry(db, tmp_path, monkeypatch):
+    failing(db, monkeypatch, times=1)
+    buffer = NotificationBuffer(db, max_delay=60, dead_letter_path=str(tmp_path / 'dead.jsonl'))
+    buffer.add(notification('a'))
+    buffer.add(notification('b'))
+
+    assert buffer.flush() == 0
+    assert stored_titles(db) == []
+
+    buffer.add(notification('c'))
+    assert buffer.flush() == 3
+    assert stored_titles(db) == ['a', 'b', 'c']
+    assert not (tmp_path / 'dead.jsonl').exists()
+
+def test_exhausted_batch_goes_to_dead_letter(db, tmp_path, monkeypatch):
+    failing(db, monkeypatch, times=2)
+    dead_letter = tmp_path / 'dead.jsonl'
+    buffer = NotificationBuffer(db, max_delay=60, max_attempts=2, dead_letter_path=str(dead_letter))
+    buffer.add(notification('a'))
+
+    assert buffer.flush() == 0
+    assert buffer.flush() == 0
+    assert buffer.flush() == 0
+    assert [json.loads(line)['title'] for line in dead_letter.read_text().splitlines()] == ['a']
+
+    # Depois do dead letter, as tentativas recomeçam para os próximos lotes
+    buffer.add(notification('b'))
+    assert buffer.flush() == 1
+    assert stored_titles(db) == ['b']
@@ -0,0 +1,59 @@
+import hashlib
+
+from models.database import SNAPSHOT_KEYFRAME_INTERVAL
+
+def make_payload(version):
+    """Payload grande com pequenas mudanças por versão (deltas compensam)"""
+    return {
+        'risultati': [{
+            'numero': '1234',
+            'anno': '2023',
+            'stato': f'Stato {version}',
+            'eventi': [
+                {'data': f'2023-01-{day:02d}', 'descrizione': hashlib.sha256(str(day).encode()).hexdigest()}
+                for day in range(1, 29)
+            ]
+                      + [{'data': '2023-02-01', 'descrizione': f'Evento {index}'} for index in range(version)]
+        }]
+    }
+
+def store_versions(db, count):
+    with db.get_connection() as conn:
+        cursor = conn.cursor()
+        for version in range(count):
+            db._store_snapshot(cursor, '1234', 2023, make_payload(version))
+        conn.commit()
+        return [dict(row) for row in cursor.execute('SELECT * FROM payload_snapshots ORDER BY id')]
+
+def test_delta_chain_round_trip(db):
+    count = SNAPSHOT_KEYFRAME_INTERVAL + 5
+    snapshots = store_versions(db, count)
+
+    assert len(snapshots) == count
+    # Deltas entre keyframes e um novo keyframe ao atingir o intervalo
+    assert snapshots[0]['chain_length'] == 0 and snapshots[0]['keyframe_id'] is None
+    assert snapshots[1]['keyframe_id'] == snapshots[0]['id'] and snapshots[1]['delta'] is not None
+    assert snapshots[SNAPSHOT_KEYFRAME_INTERVAL]['chain_length'] == 0
+
+    with db.get_connection() as conn:
+        cursor = conn.cursor()
+        for version, snapshot in enumerate(snapshots):
+            assert db._reconstruct_snapshot(cursor, snapshot) == make_payload(version)
+
+def test_unchanged_payload_is_not_stored_again(db):
+    with db.get_connection() as conn:
+        cursor = conn.cursor()
+        first = db._store_snapshot(cursor, '1234', 2023, make_payload(1))
+        second = db._store_snapshot(cursor, '1234', 2023, make_payload(1))
+        conn.commit()
+        assert first == second
+        assert cursor.execute('SELECT COUNT(*) FROM payload_snapshots').fetchone()[0] == 1
+
+def test_chain_lookup_uses_keyframe_index(db):
+    store_versions(db, 3)
+    with db.get_connection() as conn:
+        plan = ' '.join(row[-1] for row in conn.execute('''
+            EXPLAIN QUERY PLAN
+            SELECT codec, delta FROM payload_snapshots WHERE keyframe_id = ? AND id <= ? ORDER BY id
+        ''', (1, 3)))
+    assert 'idx_payload_snapshots_keyframe' in plan
@@ -0,0 +1,66 @@
+import os
+import sys
+import time
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip('flask_sqlalchemy')
+
+# Os modelos ORM importam a partir do pacote src
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from flask import Flask
+from src.models.user import db
+from src.models import credential  # noqa: F401 (registra a tabela credentials)
+from src.models.rate_limit import RateLimitRegistry
+
+@pytest.fixture
+def app(tmp_path):
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{tmp_path / 'orm.db'}"
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        credentials = db.Model.metadata.tables['credentials']
+        db.session.execute(credentials.insert().values(
+            id=1, name='c', uuid='uuid', token='token', device_name='iPhone',
+            device_width='375', device_height='812', max_requests_per_minute=60,
+            total_requests=0, successful_requests=0, failed_requests=0, average_response_time=0.0
+        ))
+        db.session.commit()
+    return app
+
+def stored_counters(app):
+    with app.app_context():
+        credentials = db.Model.metadata.tables['credentials']
+        return db.session.execute(db.select([
+            credentials.c.total_requests, credentials.c.failed_requests, credentials.c.requests_this_minute
+        ])).one()
+
+def test_pending_counters_reach_database_without_another_record(app):
+    registry = RateLimitRegistry(checkpoint_interval=0.05)
+    row = SimpleNamespace(id=1, minute_window_start=None, requests_this_minute=0, max_requests_per_minute=60)
+    with app.app_context():
+        registry.record(row, success=True, response_time=0.2)
+        registry.record(row, success=False, error_message='HTTP 503')
+
+    # Nenhuma nova chamada a record(): a thread de checkpoint grava sozinha
+    deadline = time.monotonic() + 5
+    while tuple(stored_counters(app)) != (2, 1, 2) and time.monotonic() < deadline:
+        time.sleep(0.05)
+    registry.stop()
+
+    assert tuple(stored_counters(app)) == (2, 1, 2)
+    assert registry.pending_for(1) is None
+
+def test_stop_flushes_pending_counters(app):
+    registry = RateLimitRegistry(checkpoint_interval=3600)
+    row = SimpleNamespace(id=1, minute_window_start=None, requests_this_minute=0, max_requests_per_minute=60)
+    with app.app_context():
+        registry.record(row, success=True)
+
+    registry.stop()
+
+    assert tuple(stored_counters(app)) == (1, 0, 1)
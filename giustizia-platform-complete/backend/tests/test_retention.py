@@ -0,0 +1,119 @@
+import glob
+import gzip
+import hashlib
+import json
+import os
+
+import pytest
+
+from services.retention import HistoryRetentionJob, STAGING_SUFFIX
+
+def payload(version):
+    """Payloads sem partes em comum: cada um vira um keyframe"""
+    return {'risultati': [{'stato': f'Stato {version}', 'hash': hashlib.sha256(str(version).encode()).hexdigest() * 8}]}
+
+def save(db, client_id, status, success=True, raw_data=None, days_ago=200):
+    db.save_query_history({
+        'client_id': client_id,
+        'credential_id': 1,
+        'process_number': '1234',
+        'process_year': 2023,
+        'status': status,
+        'success': success,
+        'error': None if success else 'Timeout na consulta',
+        'raw_data': raw_data
+    })
+    with db.get_connection() as conn:
+        conn.execute(
+            "UPDATE query_history SET query_timestamp = DATETIME('now', ?) WHERE id = (SELECT MAX(id) FROM query_history)",
+            (f'-{days_ago} days',)
+        )
+        conn.commit()
+
+def history_ids(db):
+    with db.get_connection() as conn:
+        return [row[0] for row in conn.execute('SELECT id FROM query_history ORDER BY id')]
+
+def archived_ids(job):
+    ids = []
+    for path in glob.glob(os.path.join(job.archive_dir, 'query_history', '*', '*', '*.jsonl.gz')):
+        with gzip.open(path, 'rt', encoding='utf-8') as archive:
+            ids.extend(json.loads(line)['id'] for line in archive)
+    return sorted(ids)
+
+@pytest.fixture
+def history(db, make_client):
+    """Histórico antigo: A, A, falha, A, B, B e uma consulta recente"""
+    client_id = make_client()
+    for index, (status, success) in enumerate([('A', True), ('A', True), (None, False), ('A', True), ('B', True), ('B', True)]):
+        save(db, client_id, status, success, days_ago=200 - index)
+    save(db, client_id, 'B', days_ago=1)
+    return history_ids(db)
+
+@pytest.fixture
+def job(db, tmp_path):
+    return HistoryRetentionJob(db, retention_days=90, archive_dir=str(tmp_path / 'archive'),
+                               batch_size=2, pause_seconds=0)
+
+def test_archives_and_deletes_non_transitions(db, job, history):
+    result = job.run()
+
+    # Mantidas: primeira A, primeira B e a recente
+    assert history_ids(db) == [history[0], history[4], history[6]]
+    assert result['archived_rows'] == 4
+    assert archived_ids(job) == [history[1], history[2], history[3], history[5]]
+    assert not glob.glob(os.path.join(job.archive_dir, '**', f'*{STAGING_SUFFIX}'), recursive=True)
+
+    with db.get_connection() as conn:
+        archived = conn.execute('SELECT SUM(total_queries), SUM(failed_queries) FROM archived_query_stats').fetchone()
+    assert tuple(archived) == (4, 1)
+
+    # Uma nova execução não encontra nada e não duplica o arquivo
+    assert job.run()['archived_rows'] == 0
+    assert archived_ids(job) == [history[1], history[2], history[3], history[5]]
+
+def test_rerun_after_crash_before_delete_does_not_duplicate(db, job, history, monkeypatch):
+    original_delete = job._delete_batch
+    monkeypatch.setattr(job, '_delete_batch', lambda rows: (_ for _ in ()).throw(RuntimeError('database is locked')))
+    with pytest.raises(RuntimeError):
+        job.run()
+    assert history_ids(db) == history
+
+    monkeypatch.setattr(job, '_delete_batch', original_delete)
+    job.run()
+    assert archived_ids(job) == [history[1], history[2], history[3], history[5]]
+
+def test_rerun_after_crash_before_rename_recovers_staged_file(db, job, history, monkeypatch):
+    monkeypatch.setattr(job, '_finalize', lambda staged: (_ for _ in ()).throw(RuntimeError('interrompido')))
+    with pytest.raises(RuntimeError):
+        job.run()
+    # O primeiro lote já saiu do banco e só existe no arquivo .partial
+    staged = glob.glob(os.path.join(job.archive_dir, '**', f'*{STAGING_SUFFIX}'), recursive=True)
+    assert staged and archived_ids(job) == []
+
+    monkeypatch.undo()
+    job.run()
+    assert archived_ids(job) == [history[1], history[2], history[3], history[5]]
+    assert not glob.glob(os.path.join(job.archive_dir, '**', f'*{STAGING_SUFFIX}'), recursive=True)
+
+def test_prunes_payloads_only_archived_rows_reference(db, job, make_client):
+    client_id = make_client()
+    for version in range(4):
+        save(db, client_id, 'A', raw_data=payload(version), days_ago=200 - version)
+    save(db, client_id, 'A', raw_data=payload(4), days_ago=1)
+
+    with db.get_connection() as conn:
+        assert conn.execute('SELECT COUNT(*) FROM payload_snapshots').fetchone()[0] == 5
+
+    result = job.run()
+
+    # Só a primeira linha (transição) e a recente ficam; suas cadeias e blobs também
+    remaining = history_ids(db)
+    assert len(remaining) == 2 and result['archived_rows'] == 3
+    assert result['pruned_snapshots'] == 3
+    assert result['pruned_blobs'] == 3
+    with db.get_connection() as conn:
+        hashes = [row[0] for row in conn.execute('SELECT payload_hash FROM query_history ORDER BY id')]
+        assert conn.execute('SELECT COUNT(*) FROM payload_blobs').fetchone()[0] == 2
+    assert db.get_payload(hashes[0]) == payload(0)
+    assert db.get_payload(hashes[1]) == payload(4)
@@ -0,0 +1,30 @@
+import pytest
+
+pytest.importorskip('schedule')
+pytest.importorskip('requests')
+
+from services.scheduler import QueryScheduler
+
+def http_error(*args, **kwargs):
+    """Resposta de query_process para um erro HTTP do upstream (sem dados do processo)"""
+    return {'success': False, 'error': 'Erro HTTP 503', 'status_code': 503}
+
+@pytest.fixture
+def scheduler(db):
+    db.create_credential({'name': 'Principal', 'uuid': 'uuid-1', 'token': 'token'})
+    scheduler = QueryScheduler(db)
+    scheduler.api.query_process = http_error
+    return scheduler
+
+def test_failed_query_updates_client_summary(db, make_client, scheduler):
+    client_id = make_client()
+
+    result = scheduler.run_manual_query([client_id])
+
+    assert result['stats']['failed'] == 1
+    client = db.get_client(client_id)
+    assert client['last_error'] == 'Erro HTTP 503'
+    assert client['last_error_at'] is not None
+    assert client['last_status_check'] is not None
+    history = db.get_query_history(client_id)
+    assert len(history) == 1 and not history[0]['success']